@@ -0,0 +1,589 @@
+"""Headless admin commands for bulk maintenance.
+
+Usage:
+    python admin_cli.py create-assessments assessments.jsonl
+    python admin_cli.py schedule-tests tests.jsonl
+    python admin_cli.py edit-questions edits.jsonl
+    python admin_cli.py import-csv questions.csv
+    python admin_cli.py import-jobs feed.csv
+    python admin_cli.py delete jobs --ids-file stale_jobs.txt
+    python admin_cli.py delete assessments 4 5 6
+    python admin_cli.py generate assessments generated.jsonl
+    python admin_cli.py backfill-order-fields
+
+Inputs are JSON lines, one item per line:
+
+* create-assessments: ``{"id": "4", "title": ..., "category": ..., "durationMinutes": 60,
+  "questions": [{"text": ..., "options": [a, b, c, d], "correct": "B", "concept": ...,
+  "difficulty": "Easy", "section": ...}]}``
+* schedule-tests: ``{"title": ..., "category": ..., "description": ..., "startTime": ISO,
+  "endTime": ISO, "durationMinutes": 30, "topics": "Python, SQL", "isPublished": false,
+  "publishAt": ISO, "questions": [...]}``, optionally with an ``id``
+* edit-questions: ``{"collection": "assessments", "id": "4", "question": "q_4_2",
+  "set": {"difficulty": "Hard"}}``, ``{..., "question": "q_4_3", "delete": true}`` or
+  ``{"collection": ..., "id": ..., "add": {question}}``
+* generate: an assessment or test as above, without ``questions`` but with
+  ``"quotas": "10 Medium Python, 5 Hard SQL"`` and optionally a ``"seed"``;
+  the questions are drawn from the bank (see generator)
+
+Documents are built with the same schemas the pages use (see schemas) and
+credentials are found the same way as in the app (see firebase_client).
+
+Items are committed in chunks of ``--chunk-size``, one BatchWriter per chunk,
+by ``--workers`` chunks in parallel. Finished items are appended to a
+checkpoint file (``<input>.<command>.checkpoint`` unless ``--checkpoint`` is
+given), so an interrupted run resumes where it stopped when started again
+with the same arguments; ``--restart`` ignores the checkpoint. Give tests an
+``id`` to make re-running a partly committed chunk safe. import-csv and
+import-jobs need no checkpoint: re-running them replaces the same question
+lists and skips postings already imported.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import schemas
+from bank import BANK_COLLECTIONS
+from bank_stats import queue_pending
+from data_layer import MAX_GET_ALL, DataLayer
+from firebase_client import client_from_environment
+from generator import QuotaIndex, number_questions, parse_quotas
+from jobs import DEFAULT_BATCH_SIZE, DEFAULT_MAX_RATE, JobIndex, import_jobs, read_feed
+from question_store import QuestionStore, is_subcollection, new_question_id, questions_path, storage_mode
+
+# Fields the paged listings order by; Firestore leaves documents without them out of ordered queries
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_WORKERS = 4
+EDIT_FIELDS = ('text', 'options', 'concept', 'difficulty', 'section')
+TRUE_WORDS = ('true', 'yes', '1')
+FALSE_WORDS = ('false', 'no', '0')
+
+
+class Checkpoint:
+    """Keys of finished items, one JSON string per line in ``path``."""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                # A line cut short by an interruption is simply not done
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line))
+                    except ValueError:
+                        pass
+        self._file = open(path, 'a')
+
+    def mark(self, keys):
+        with self._lock:
+            self._file.writelines(json.dumps(key) + "\n" for key in keys)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done.update(keys)
+
+    def close(self):
+        self._file.close()
+
+
+class RunReport:
+    def __init__(self):
+        self.items = 0
+        self.done = 0
+        self.resumed = 0  # finished by an earlier run
+        self.errors = []  # (where, message)
+        self.failed_chunks = []  # (first key, exception)
+        self._lock = threading.Lock()
+
+    def error(self, where, message):
+        with self._lock:
+            self.errors.append((where, message))
+
+    def ok(self):
+        return not (self.errors or self.failed_chunks)
+
+
+def run_chunks(items, commit_chunk, report, checkpoint=None, workers=DEFAULT_WORKERS,
+               chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None):
+    """Commit ``items`` (``(key, item)`` pairs) with ``commit_chunk(chunk)``, ``workers`` chunks at a time.
+
+    Chunks are checkpointed as they finish; a failing chunk is reported and
+    left for the next run without stopping the others.
+    """
+    report.items += len(items)
+    if checkpoint is not None:
+        report.resumed += sum(1 for key, _ in items if key in checkpoint.done)
+        items = [(key, item) for key, item in items if key not in checkpoint.done]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='admin-cli') as pool:
+        futures = {pool.submit(commit_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                future.result()
+            except Exception as e:  # the rest of the run goes on; the chunk is retried next time
+                report.failed_chunks.append((chunk[0][0], e))
+                continue
+            if checkpoint is not None:
+                checkpoint.mark([key for key, _ in chunk])
+            report.done += len(chunk)
+            if on_progress:
+                on_progress(report.done, len(items))
+
+
+# Parsing
+
+def parse_time(value, name):
+    """ISO time; times without an offset are local, as in the page's date and time inputs."""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be an ISO time string")
+    value = value.strip()
+    # Python 3.10 (runtime.txt) does not accept the UTC designator Z
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(value).astimezone()
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO time, not {value!r}") from None
+
+
+def parse_int(value, name, default):
+    if value is None:
+        return default
+    # JSON true/false are ints to Python
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            number = float(value)
+            if number.is_integer():
+                return int(number)
+        except ValueError:
+            pass
+    raise ValueError(f"{name} must be a whole number")
+
+
+def parse_bool(value, name, default):
+    """``true``/``false`` as JSON booleans or strings; ``bool("false")`` would be True."""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in TRUE_WORDS + FALSE_WORDS:
+        return value.strip().lower() in TRUE_WORDS
+    raise ValueError(f"{name} must be true or false")
+
+
+def parse_list(value, name, allow_str=False):
+    if value is None:
+        return []
+    if isinstance(value, list) or (allow_str and isinstance(value, str)):
+        return value
+    raise ValueError(f"{name} must be a list" + (" or a comma-separated string" if allow_str else ""))
+
+
+def parse_question(row, question_id, section):
+    if not isinstance(row, dict):
+        raise ValueError("each question must be a JSON object")
+    options = parse_list(row.get('options'), "options")
+    try:
+        q = schemas.question(str(row.get('id') or question_id), row.get('text', ''), options,
+                             row.get('correct', row.get('correctOptionIndex')), row.get('concept', ''),
+                             row.get('difficulty', ''), row.get('section', section))
+    except (ValueError, TypeError):
+        raise ValueError("correct_answer must be A, B, C or D")
+    errors = schemas.question_errors(q)
+    if errors:
+        raise ValueError("; ".join(errors))
+    return q
+
+
+def parse_assessment(row):
+    doc_id = str(row.get('id') or '').strip()
+    if not doc_id or not row.get('title'):
+        raise ValueError("id and title are required")
+    category = row.get('category', schemas.ASSESSMENT_CATEGORIES[0])
+    questions = [parse_question(q, f'q_{doc_id}_{i}', category)
+                 for i, q in enumerate(parse_list(row.get('questions'), "questions"), 1)]
+    duration = parse_int(row.get('durationMinutes'), "durationMinutes", 60)
+    return doc_id, schemas.assessment(row['title'], category, duration), questions
+
+
+def parse_test(row, data, now):
+    if not row.get('title') or not row.get('startTime') or not row.get('endTime'):
+        raise ValueError("title, startTime and endTime are required")
+    category = row.get('category', schemas.TEST_CATEGORIES[0])
+    test = schemas.upcoming_test(row['title'], category, row.get('description', ''),
+                                 parse_time(row['startTime'], "startTime"), parse_time(row['endTime'], "endTime"),
+                                 parse_int(row.get('durationMinutes'), "durationMinutes", 30),
+                                 parse_list(row.get('topics'), "topics", allow_str=True),
+                                 parse_bool(row.get('isPublished'), "isPublished", True),
+                                 publish_at=parse_time(row.get('publishAt'), "publishAt"))
+    questions = [parse_question(q, schemas.upcoming_question_id(i, now), category)
+                 for i, q in enumerate(parse_list(row.get('questions'), "questions"), 1)]
+    doc_id = str(row.get('id') or '').strip() or data.new_document_id('upcoming_tests')
+    return doc_id, test, questions
+
+
+def parse_generated(row, collection, index, data, now):
+    """An assessment or test whose questions are drawn from ``index`` by the row's quotas."""
+    quotas = parse_list(row.get('quotas'), "quotas", allow_str=True)
+    quotas = parse_quotas(", ".join(map(str, quotas)) if isinstance(quotas, list) else quotas)
+    if not isinstance(row.get('seed'), (int, str, type(None))):
+        raise ValueError("seed must be a number or a string")
+    row = {**row, 'questions': []}
+    if collection == 'assessments':
+        doc_id, parent, _ = parse_assessment(row)
+    else:
+        row.setdefault('topics', list(dict.fromkeys(quota.name for quota in quotas)))
+        row.setdefault('isPublished', False)
+        doc_id, parent, _ = parse_test(row, data, now)
+    return doc_id, parent, number_questions(collection, doc_id, index.sample(quotas, seed=row.get('seed')), now)
+
+
+def read_items(path, parse, report):
+    """``(key, parsed)`` for every valid line of the JSON-lines file ``path``; bad lines go to ``report``."""
+    items = []
+    with open(path, 'rb') as f:
+        for line, row in read_feed(f, 'jsonl'):
+            if isinstance(row, Exception):
+                report.error(f"line {line}", f"invalid JSON: {row}")
+                continue
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("each line must be a JSON object")
+                items.append((f"line {line}", parse(row)))
+            except ValueError as e:
+                report.error(f"line {line}", str(e))
+    return items
+
+
+# Chunk commits
+
+def create_chunk(store, collection, dry_run):
+    """Commit function creating (or replacing) one chunk of ``(doc_id, parent_data, questions)`` items."""
+    data = store.data
+
+    def commit(chunk):
+        previous = data.get_documents(collection, {doc_id for _, (doc_id, _, _) in chunk})
+        existing = {doc_id: parent for doc_id, parent in previous.items() if parent is not None}
+        before = store.load_many(collection, existing)
+        change = Counter()
+        with data.batch_writer(dry_run=dry_run, before_flush=queue_pending(collection, change)) as writer:
+            for _, (doc_id, parent_data, questions) in chunk:
+                change.update(store.queue_create(writer, collection, doc_id, parent_data, questions,
+                                                 previous=existing.get(doc_id), before=before.get(doc_id, [])))
+                # A later line for the same ID replaces this one
+                existing[doc_id], before[doc_id] = store.created_parent(parent_data), questions
+    return commit
+
+
+def added_question_id(collection, doc_id, questions):
+    """ID for a question added to ``collection/doc_id``, in the form the pages give it."""
+    if collection != 'upcoming_tests':
+        return new_question_id(f'q_{doc_id}', questions)
+    used = {q.get('id') for q in questions}
+    n = len(questions) + 1
+    while schemas.upcoming_question_id(n) in used:
+        n += 1
+    return schemas.upcoming_question_id(n)
+
+
+def apply_edit(questions, edit, collection, doc_id, section):
+    """Apply one edit line to ``questions`` of ``collection/doc_id`` in place."""
+    if 'add' in edit:
+        if not isinstance(edit['add'], dict):
+            raise ValueError("add must be a question object")
+        questions.append(parse_question(edit['add'], added_question_id(collection, doc_id, questions), section))
+        return
+    index = next((i for i, q in enumerate(questions) if q.get('id') == edit.get('question')), None)
+    if index is None:
+        raise ValueError(f"question {edit.get('question')} not found")
+    if parse_bool(edit.get('delete'), "delete", False):
+        del questions[index]
+        return
+    changes = edit.get('set') or {}
+    if not isinstance(changes, dict):
+        raise ValueError("set must be an object of fields")
+    unknown = set(changes) - set(EDIT_FIELDS) - {'correct', 'correctOptionIndex'}
+    if unknown:
+        raise ValueError(f"cannot set {', '.join(sorted(unknown))}")
+    updated = {**questions[index], **{k: v for k, v in changes.items() if k in EDIT_FIELDS}}
+    if 'correct' in changes or 'correctOptionIndex' in changes:
+        updated['correct'] = changes.get('correct', changes.get('correctOptionIndex'))
+    else:
+        updated['correct'] = updated.get('correctOptionIndex')
+    questions[index] = parse_question(updated, updated['id'], updated.get('section', section))
+
+
+def edit_chunk(store, report, dry_run):
+    """Commit function applying the edits of one chunk of ``((collection, doc_id), [(line, edit)])`` items."""
+    data = store.data
+
+    def commit(chunk):
+        for collection in BANK_COLLECTIONS:
+            edits = {doc_id: lines for _, ((c, doc_id), lines) in chunk if c == collection}
+            if not edits:
+                continue
+            parents = data.get_documents(collection, edits)
+            existing = {doc_id: parent for doc_id, parent in parents.items() if parent is not None}
+            loaded = store.load_many(collection, existing)
+            nested = [doc_id for doc_id, parent in existing.items() if is_subcollection(parent)]
+            listed = data.gather(lambda doc_id=doc_id: data.list_collection(questions_path(collection, doc_id))
+                                 for doc_id in nested)
+            current = dict(zip(nested, listed))
+            change = Counter()
+            with data.batch_writer(dry_run=dry_run, before_flush=queue_pending(collection, change)) as writer:
+                for doc_id, lines in edits.items():
+                    parent = existing.get(doc_id)
+                    if parent is None:
+                        for line, _ in lines:
+                            report.error(line, f"{collection}/{doc_id} not found")
+                        continue
+                    questions = list(loaded[doc_id])
+                    for line, edit in lines:
+                        try:
+                            apply_edit(questions, edit, collection, doc_id, parent.get('category', ''))
+                        except ValueError as e:
+                            report.error(line, str(e))
+                    change.update(store.replace_questions(writer, collection, doc_id, parent, questions,
+                                                          current=current.get(doc_id)))
+    return commit
+
+
+def delete_chunk(store, collection, report, dry_run):
+    """Commit function deleting one chunk of document IDs (with their questions in the bank)."""
+    data = store.data
+
+    def commit(chunk):
+        ids = [doc_id for _, doc_id in chunk]
+        change = Counter()
+        with data.batch_writer(dry_run=dry_run, before_flush=queue_pending(collection, change)) as writer:
+            if collection not in BANK_COLLECTIONS:
+                for doc_id in ids:
+                    writer.delete(collection, doc_id)
+                return
+            parents = data.get_documents(collection, ids)
+            existing = {doc_id: parent for doc_id, parent in parents.items() if parent is not None}
+            loaded = store.load_many(collection, existing)
+            for doc_id in ids:
+                if doc_id not in existing:
+                    report.error(doc_id, f"{collection}/{doc_id} not found")
+                    continue
+                change.update(store.queue_delete(writer, collection, doc_id, existing[doc_id], loaded[doc_id]))
+    return commit
+
+
+# Commands
+
+def cmd_create_assessments(args, store, report, checkpoint):
+    items = read_items(args.input, parse_assessment, report)
+    run_chunks(items, create_chunk(store, 'assessments', args.dry_run), report, checkpoint,
+               workers=args.workers, chunk_size=args.chunk_size, on_progress=progress)
+
+
+def cmd_schedule_tests(args, store, report, checkpoint):
+    now = datetime.now()
+    items = read_items(args.input, lambda row: parse_test(row, store.data, now), report)
+    run_chunks(items, create_chunk(store, 'upcoming_tests', args.dry_run), report, checkpoint,
+               workers=args.workers, chunk_size=args.chunk_size, on_progress=progress)
+
+
+def cmd_edit_questions(args, store, report, checkpoint):
+    def parse(row):
+        collection = row.get('collection', 'assessments')
+        if collection not in BANK_COLLECTIONS:
+            raise ValueError(f"collection must be one of {', '.join(BANK_COLLECTIONS)}")
+        if not row.get('id') or not ('add' in row or row.get('question')):
+            raise ValueError("id and question (or add) are required")
+        return collection, str(row['id']), row
+
+    # Every edit of a document commits together, in file order
+    by_parent = {}
+    for line, (collection, doc_id, edit) in read_items(args.input, parse, report):
+        by_parent.setdefault((collection, doc_id), []).append((line, edit))
+    items = [(f"{collection}/{doc_id}", ((collection, doc_id), lines))
+             for (collection, doc_id), lines in by_parent.items()]
+    run_chunks(items, edit_chunk(store, report, args.dry_run), report, checkpoint,
+               workers=args.workers, chunk_size=args.chunk_size, on_progress=progress)
+
+
+def cmd_delete(args, store, report, checkpoint):
+    ids = list(args.ids)
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            ids += [line.strip() for line in f if line.strip()]
+    ids = list(dict.fromkeys(ids))
+    run_chunks([(doc_id, doc_id) for doc_id in ids], delete_chunk(store, args.collection, report, args.dry_run),
+               report, checkpoint, workers=args.workers, chunk_size=args.chunk_size, on_progress=progress)
+
+
+def cmd_generate(args, store, report, checkpoint):
+    now = datetime.now()
+    # Everything is drawn before the first commit, so generated documents never feed later draws
+    index = QuotaIndex(store)
+    items = read_items(args.input, lambda row: parse_generated(row, args.collection, index, store.data, now), report)
+    run_chunks(items, create_chunk(store, args.collection, args.dry_run), report, checkpoint,
+               workers=args.workers, chunk_size=args.chunk_size, on_progress=progress)
+
+
+def cmd_import_csv(args, store, report, checkpoint):
+    from csv_ingest import ingest_csv
+    duplicates = None
+    if args.skip_duplicates:
+        from dedup import DuplicateIndex
+        duplicates = DuplicateIndex(store)
+    result = ingest_csv(args.input, store, duplicates=duplicates, skip_duplicates=args.skip_duplicates,
+                        dry_run=args.dry_run)
+    report.items, report.done = result.rows, result.valid_rows
+    for line, message in result.errors:
+        report.error(f"line {line}", message)
+    for assessment_id in result.missing:
+        report.error(assessment_id, f"assessment {assessment_id} doesn't exist; create it first")
+    print(f"{len(result.updated):,} assessments updated, {result.skipped_duplicates:,} duplicate rows skipped")
+
+
+def cmd_import_jobs(args, store, report, checkpoint):
+    data = store.data
+    with open(args.input, 'rb') as f:
+        result = import_jobs(f, data, JobIndex(data), dry_run=args.dry_run, batch_size=args.batch_size,
+                             max_rate=args.max_rate)
+    report.items, report.done = result.rows, len(result.added)
+    for line, message in result.errors:
+        report.error(f"line {line}", message)
+    print(f"{len(result.added):,} postings added, {len(result.duplicates):,} duplicates skipped")
+
+
+def posted_timestamp(job):
+    """``timestamp`` for a job missing it, from its ``postedDate``; None when that does not parse."""
+    try:
+        return datetime.strptime(job.get('postedDate', ''), "%d %b %Y").astimezone()
+    except (TypeError, ValueError):
+        return None
+
+
+def cmd_backfill_order_fields(args, store, report, checkpoint):
+    data = store.data
+    verb = 'would be ' if args.dry_run else ''
+    with data.batch_writer(dry_run=args.dry_run) as writer:
+        undated = []
+        for job in data.iter_documents('jobs'):
+            report.items += 1
+            if job.get('timestamp') is not None:
+                continue
+            timestamp = posted_timestamp(job)
+            if timestamp is None:
+                undated.append(job['id'])
+                continue
+            writer.update('jobs', job['id'], {'timestamp': timestamp})
+            report.done += 1
+            print(f"jobs/{job['id']}: timestamp {verb}backfilled from postedDate")
+        # Creation times are metadata, read in batches only for jobs without a usable postedDate
+        jobs = data.db.collection('jobs')
+        for i in range(0, len(undated), MAX_GET_ALL):
+            for doc in data.db.get_all([jobs.document(job_id) for job_id in undated[i:i + MAX_GET_ALL]]):
+                if doc.exists:
+                    writer.update('jobs', doc.id, {'timestamp': doc.create_time})
+                    report.done += 1
+                    print(f"jobs/{doc.id}: timestamp {verb}backfilled from its creation time")
+    # A test's start cannot be guessed; list them to be fixed by hand
+    for test in data.list_summaries('upcoming_tests', ['title', 'startTime']):
+        report.items += 1
+        if test.get('startTime') is None:
+            report.error(f"upcoming_tests/{test['id']}",
+                         f"'{test.get('title', '')}' has no startTime, so it is not listed; "
+                         "set one in the Firebase console or schedule the test again")
+
+
+def progress(done, total):
+    print(f"{done:,} of {total:,} items committed", end="\r", file=sys.stderr)
+
+
+COMMANDS = {
+    'create-assessments': (cmd_create_assessments, "create or replace assessments with their questions"),
+    'schedule-tests': (cmd_schedule_tests, "schedule upcoming tests with their questions"),
+    'edit-questions': (cmd_edit_questions, "update, delete or add questions of existing documents"),
+    'import-csv': (cmd_import_csv, "replace assessment questions from an upload CSV"),
+    'import-jobs': (cmd_import_jobs, "import a CSV or JSON-lines job feed, skipping duplicates"),
+    'delete': (cmd_delete, "delete documents (with their questions) by ID"),
+    'generate': (cmd_generate, "create assessments or tests with questions drawn from the bank by quotas"),
+    'backfill-order-fields': (cmd_backfill_order_fields,
+                              "give old jobs the field their listing is ordered by; list tests without one"),
+}
+CHECKPOINTED = {'create-assessments', 'schedule-tests', 'edit-questions', 'delete', 'generate'}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        sub = commands.add_parser(name, help=help_text)
+        if name == 'delete':
+            sub.add_argument("collection", choices=list(BANK_COLLECTIONS) + ['jobs'])
+            sub.add_argument("ids", nargs="*")
+            sub.add_argument("--ids-file", help="file with one document ID per line")
+        elif name != 'backfill-order-fields':
+            if name == 'generate':
+                sub.add_argument("collection", choices=BANK_COLLECTIONS)
+            sub.add_argument("input")
+        sub.add_argument("--dry-run", action="store_true", help="check the input without writing")
+        if name in CHECKPOINTED:
+            sub.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="chunks committed in parallel")
+            sub.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="items per chunk")
+            sub.add_argument("--checkpoint", help="defaults to <input>.<command>.checkpoint")
+            sub.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+        if name == 'import-csv':
+            sub.add_argument("--skip-duplicates", action="store_true",
+                             help="drop rows duplicating a question already in the bank")
+        if name == 'import-jobs':
+            sub.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+            sub.add_argument("--max-rate", type=float, default=DEFAULT_MAX_RATE, help="writes per second")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handler, _ = COMMANDS[args.command]
+    # No caching: each chunk must see the commits before it
+    store = QuestionStore(DataLayer(client_from_environment(), ttl=0), mode=storage_mode())
+
+    checkpoint = None
+    if args.command in CHECKPOINTED and not args.dry_run:
+        source = getattr(args, 'input', None) or args.ids_file
+        path = args.checkpoint or (f"{source}.{args.command}.checkpoint" if source else None)
+        if path:
+            checkpoint = Checkpoint(path, restart=args.restart)
+
+    report = RunReport()
+    try:
+        handler(args, store, report, checkpoint)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    if args.command in CHECKPOINTED:
+        # End the progress line
+        print(file=sys.stderr)
+
+    for where, message in report.errors:
+        print(f"{where}: {message}")
+    for first, error in report.failed_chunks:
+        print(f"chunk starting at {first} failed: {error}")
+    verb = "checked" if args.dry_run else "committed"
+    resumed = f" ({report.resumed:,} already done by an earlier run)" if report.resumed else ""
+    print(f"{report.items:,} items: {report.done:,} {verb}{resumed}, {len(report.errors):,} errors, "
+          f"{len(report.failed_chunks):,} failed chunks")
+    if report.failed_chunks:
+        print("Run the same command again to retry the failed chunks.")
+    return 0 if report.ok() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,19 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pandas as pd
+import tempfile
+import time
+import uuid
 from datetime import datetime, timedelta
-import os
-import json
+from firebase_client import resolve_credentials, create_client
+from data_layer import DataLayer, cache_settings
+from live_mirror import LiveMirror, live_mirror_enabled
+from local_snapshot import LocalSnapshot, local_snapshot_path, sync_interval
+from bank import index_max_age
+from question_store import ConcurrentEditError, QuestionStore, storage_mode, new_question_id
+import schemas
+from tracing import TracedClient, Tracer, trace_log_path
+from startup import StartupReport, preload, warm_up
+# pandas and the modules built on it (csv_ingest, dedup, bulk_editor, question_table)
+# are imported by the pages that use them, keeping them off the cold-start path
 
 # Page config
 st.set_page_config(
@@ -13,55 +22,264 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize Firebase Admin (only once)
+# Created by the first run in this process; times the cold-start phases
 @st.cache_resource
-def init_firebase():
-    cred_dict = None
-    
-    # 1. Check for Local File FIRST (Avoids Streamlit Secrets warning when running locally)
-    if os.path.exists("firebase-admin-key.json"):
-        with open("firebase-admin-key.json") as f:
-            cred_dict = json.load(f)
-            
-    # 2. Try Env Var
-    elif "FIREBASE_SERVICE_ACCOUNT" in os.environ:
-        cred_dict = json.loads(os.environ["FIREBASE_SERVICE_ACCOUNT"])
+def init_startup():
+    return StartupReport()
 
-    # 3. Try Streamlit Secrets (for Cloud deployment only)
-    else:
-        try:
-            if "firebase" in st.secrets:
-                cred_dict = dict(st.secrets["firebase"])
-        except:
-            pass
+startup = init_startup()
+
+# One tracer per process; spans also go to INTELLITRAIN_TRACE_LOG when set
+@st.cache_resource
+def init_tracer():
+    return Tracer(log_path=trace_log_path())
+
+# The one Firestore client of this process (only once)
+@st.cache_resource
+def init_firebase():
+    # Local key file, then FIREBASE_SERVICE_ACCOUNT, then Streamlit secrets
+    with startup.phase('credentials'):
+        cred_dict = resolve_credentials(st.secrets)
 
     if not cred_dict:
         st.error("❌ Firebase credentials missing!")
         st.info("Please ensure `firebase-admin-key.json` exists in this folder.")
         st.stop()
 
-    # Initialize Firebase Admin (only once)
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
+    # Use the specific database name 'intellitrain'; every call is traced
+    with startup.phase('client'):
+        db = TracedClient(create_client(cred_dict), init_tracer())
+    # Connect while the first page renders
+    warm_up(db, startup)
+    return db
+
+# Fields fetched by listing views; full question arrays load on demand
+ASSESSMENT_SUMMARY_FIELDS = ['title', 'category', 'durationMinutes', 'questionCount']
+ARCHIVED_TEST_FIELDS = ['title', 'category', 'endTime', 'questionCount']
+
+# Shared across reruns and sessions; writes below go through it so it can invalidate
+@st.cache_resource
+def init_data_layer():
+    ttl, size = cache_settings()
+    db = init_firebase()
+    with startup.phase('data_layer'):
+        # Opt-in: one set of snapshot listeners per process feeds every session;
+        # otherwise an on-disk snapshot, served at once and synced in the background
+        if live_mirror_enabled():
+            mirror = LiveMirror(db).start()
+        elif local_snapshot_path():
+            mirror = LocalSnapshot(db, local_snapshot_path(), interval=sync_interval()).start()
+        else:
+            mirror = None
+        return DataLayer(db, ttl=ttl, maxsize=size, mirror=mirror)
+
+data = init_data_layer()
+# Reads follow each document's layout; new documents use the configured one
+store = QuestionStore(data, mode=storage_mode())
+
+# Publishes due drafts and archives expired tests, at most once a minute per process
+@st.cache_resource
+def init_scheduler():
+    from scheduler import Scheduler
+    return Scheduler(QuestionStore(init_data_layer(), mode=storage_mode()))
+
+# Built on first search, then kept in sync by the writes made through `data` and rescanned
+# every INTELLITRAIN_INDEX_MAX_AGE seconds for writes made elsewhere
+@st.cache_resource
+def init_search_index():
+    from search_index import SearchIndex
+    return SearchIndex(QuestionStore(init_data_layer()), max_age=index_max_age())
+
+# Fingerprints of every question, used to catch duplicates before they are written
+@st.cache_resource
+def init_duplicate_index():
+    from dedup import DuplicateIndex
+    return DuplicateIndex(QuestionStore(init_data_layer()), max_age=index_max_age())
+
+# One categorical row per question of the bank, kept in sync by the writes made through `data`
+@st.cache_resource
+def init_bank_frame():
+    from bank_frame import BankFrame
+    return BankFrame(QuestionStore(init_data_layer()), max_age=index_max_age())
+
+# Normalized links and company + title of every posting, for bulk job imports
+@st.cache_resource
+def init_job_index():
+    from jobs import JobIndex
+    return JobIndex(init_data_layer())
+
+# Questions of the bank bucketed by concept, section and difficulty, for quota-based generation
+@st.cache_resource
+def init_quota_index():
+    from generator import QuotaIndex
+    return QuotaIndex(QuestionStore(init_data_layer()), max_age=index_max_age())
 
-    # Use the specific database name 'intellitrain'
-    from google.cloud import firestore as google_firestore
-    from google.oauth2 import service_account
+PAGE_SIZES = [10, 25, 50, 100]
+SEARCH_LIMIT = 50
+COLLECTION_LABELS = {'assessments': "Assessments", 'upcoming_tests': "Upcoming Tests"}
+CSV_PREVIEW_ROWS = 100
+QUESTION_PAGE_SIZES = [10, 25, 50, 100]
+TABLE_MODE = "Table (paginated)"
+LIST_MODE = "Full list"
+# Exports larger than this are spooled to a temporary file instead of memory
+EXPORT_SPOOL_BYTES = 16 * 1024 * 1024
+
+def paged_listing(key, path, order_field, descending=False, fields=None):
+    """Render page-size and prev/next controls and return the current page of ``path``."""
+    page_size = st.selectbox("Items per page", PAGE_SIZES, key=f"{key}_page_size")
+    # Stack of start cursors, one per visited page; reset when the page size changes
+    state_key = f"{key}_cursors_{page_size}"
+    cursors = st.session_state.setdefault(state_key, [None])
+    
+    rows, next_cursor = data.query_page(path, order_field, descending=descending,
+                                        page_size=page_size, cursor=cursors[-1], fields=fields)
+    
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    if col_prev.button("⬅️ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_info.caption(f"Page {len(cursors)}")
+    if col_next.button("Next ➡️", key=f"{key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    
+    return rows
+
+def render_grid_editor(collection, doc_id, parent):
+    """Stage question edits in a table and commit the diff in one guarded batch."""
+    from bulk_editor import (ANSWERS, DIFFICULTIES, commit_diff, compute_diff,
+                             frame_to_questions, load_baseline, questions_to_frame)
     
-    google_creds = service_account.Credentials.from_service_account_info(cred_dict)
-    return google_firestore.Client(
-        credentials=google_creds, 
-        project=google_creds.project_id, 
-        database='intellitrain'
+    state_key = f"grid_baseline_{collection}_{doc_id}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = load_baseline(store, collection, doc_id)
+    baseline = st.session_state[state_key]
+    
+    st.caption("Edit cells, add rows at the bottom, delete rows with the row checkbox, "
+               "and change `position` to reorder. Nothing is saved until you commit.")
+    edited = st.data_editor(
+        questions_to_frame(baseline.questions),
+        num_rows="dynamic",
+        hide_index=True,
+        key=f"grid_{collection}_{doc_id}",
+        column_config={
+            'id': st.column_config.TextColumn("ID", disabled=True),
+            'position': st.column_config.NumberColumn("Position", step=1),
+            'correct': st.column_config.SelectboxColumn("Correct", options=ANSWERS),
+            'difficulty': st.column_config.SelectboxColumn("Difficulty", options=DIFFICULTIES),
+        },
     )
+    
+    edited_questions, errors = frame_to_questions(edited, f'q_{doc_id}', parent.get('category', ''))
+    diff = compute_diff(baseline.questions, edited_questions)
+    for error in errors:
+        st.error(error)
+    st.info(f"Staged changes: {diff.summary()}")
+    
+    col_commit, col_reload = st.columns(2)
+    if col_commit.button("💾 Commit changes", disabled=not diff or bool(errors), key=f"commit_{state_key}"):
+        try:
+            commit_diff(data, collection, doc_id, baseline, diff)
+        except ConcurrentEditError:
+            st.error("❌ Someone else changed this assessment since you loaded it. "
+                     "Reload to get the latest version, then re-apply your edits.")
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            del st.session_state[state_key]
+            st.session_state.pop(f"grid_{collection}_{doc_id}", None)
+            st.success(f"✅ Committed: {diff.summary()}")
+            st.rerun()
+    if col_reload.button("🔄 Reload / discard changes", key=f"reload_{state_key}"):
+        del st.session_state[state_key]
+        st.session_state.pop(f"grid_{collection}_{doc_id}", None)
+        st.rerun()
+
+def widget_snapshot():
+    return {k: v for k, v in st.session_state.items()
+            if isinstance(v, (str, int, float, bool, type(None))) and not k.startswith('_trace')}
+
+def triggering_action():
+    """Keys of the widgets whose value changed since this session's previous rerun."""
+    current = widget_snapshot()
+    previous = st.session_state.get('_trace_widgets')
+    st.session_state['_trace_widgets'] = current
+    if previous is None:
+        return "load"
+    changed = sorted(k for k, v in current.items() if k in previous and previous[k] != v)
+    return ", ".join(changed) if changed else "rerun"
+
+def render_cost_panel(cost):
+    """Compact sidebar summary of the Firestore calls this rerun made."""
+    import pandas as pd
+    
+    summary = cost.as_dict()
+    st.sidebar.caption(f"Rerun #{summary['rerun']} · {summary['page']} · {summary['action']}")
+    col1, col2, col3 = st.sidebar.columns(3)
+    col1.metric("Reads", summary['reads'])
+    col2.metric("Writes", summary['writes'] + summary['deletes'])
+    col3.metric("Calls", summary['calls'])
+    other_ms = max(summary['elapsed_ms'] - summary['firestore_ms'] - summary['decode_ms'], 0)
+    st.sidebar.caption(f"⏱️ {summary['elapsed_ms']:.0f} ms total: {summary['firestore_ms']:.0f} ms Firestore, "
+                       f"{summary['decode_ms']:.0f} ms decoding, {other_ms:.0f} ms app & rendering")
+    if summary['collections']:
+        st.sidebar.dataframe(pd.DataFrame.from_dict(summary['collections'], orient='index'))
+
+def render_question_table(key, questions):
+    """Filterable table of ``questions`` showing one page; widget count does not grow with the list."""
+    from question_table import FILTER_COLUMNS, display_frame, filter_frame, filter_options, page_count, page_slice
+    
+    frame = display_frame(questions)
+    options = filter_options(frame)
+    
+    filter_cols = st.columns(len(FILTER_COLUMNS))
+    selected = {column: col.multiselect(column, options[column], key=f"{key}_filter_{column}")
+                for col, column in zip(filter_cols, FILTER_COLUMNS)}
+    matching = filter_frame(frame, selected)
+    
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    page_size = col_size.selectbox("Rows per page", QUESTION_PAGE_SIZES, key=f"{key}_rows")
+    pages = page_count(len(matching), page_size)
+    # Filters or page size may shrink the page count below the current page
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page_number = col_page.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    col_info.caption(f"{len(matching):,} of {len(frame):,} questions · page {page_number} of {pages}")
+    
+    st.dataframe(page_slice(matching, page_number, page_size), hide_index=True)
 
-db = init_firebase()
+def generate_from_quotas(collection, doc_id, parent_data, quota_text, seed):
+    """Create ``collection/doc_id`` from the quotas typed in a form; returns the document ID or None."""
+    from generator import generate, parse_quotas
+    try:
+        quotas = parse_quotas(quota_text)
+        doc_id, questions = generate(store, init_quota_index(), collection, doc_id, parent_data, quotas,
+                                     seed=seed.strip() or None)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return None
+    st.success(f"✅ Created with {len(questions)} questions: " + ", ".join(str(q) for q in quotas))
+    return doc_id
 
 # Sidebar
 st.sidebar.title("🎓 IntelliTrain Admin")
 st.sidebar.markdown("---")
-page = st.sidebar.radio("Navigation", ["📋 View Assessments", "➕ Add Assessment", "⏰ Upcoming Tests", "✏️ Edit Questions", "📊 Upload CSV", "💼 Manage Jobs"])
+page = st.sidebar.radio("Navigation", ["📋 View Assessments", "➕ Add Assessment", "⏰ Upcoming Tests", "✏️ Edit Questions", "📊 Upload CSV", "💼 Manage Jobs", "🔎 Search Questions", "🧭 Question Explorer", "📈 Bank Statistics", "📦 Export Data"], key="page")
+# The full list creates several elements per question; the table only renders one page
+question_display = st.sidebar.radio("Question display", [TABLE_MODE, LIST_MODE], key="question_display")
+show_costs = st.sidebar.checkbox("📈 Show Firestore costs", key="trace_panel")
+if st.sidebar.button("🔄 Rebuild question indexes", key="rebuild_indexes",
+                     help="Rescan the bank for search, duplicate checks, the explorer and generation, "
+                          "e.g. after changes made outside the panel"):
+    for view in (init_search_index(), init_duplicate_index(), init_bank_frame(), init_quota_index()):
+        view.expire()
+    st.sidebar.success("✅ Indexes will be rebuilt on next use")
+
+# Everything below is attributed to this page and the widgets that triggered the rerun
+tracer = init_tracer()
+session_id = st.session_state.setdefault('_trace_session', uuid.uuid4().hex[:8])
+tracer.begin_rerun(session_id, page, triggering_action())
 
 # Main content
 st.title("IntelliTrain Assessment Manager")
@@ -69,26 +287,39 @@ st.title("IntelliTrain Assessment Manager")
 if page == "📋 View Assessments":
     st.header("All Assessments")
     
-    # Fetch assessments from Firestore
-    assessments_ref = db.collection('assessments')
-    docs = assessments_ref.stream()
-    
-    assessments = []
-    for doc in docs:
-        data = doc.to_dict()
-        data['id'] = doc.id
-        assessments.append(data)
+    # Fetch one page of summary fields only; questions load when an assessment is opened
+    assessments = paged_listing("view_assessments", 'assessments', '__name__',
+                                fields=ASSESSMENT_SUMMARY_FIELDS)
     
     if assessments:
+        # Opened assessments are read together: one get_all, subcollections listed concurrently
+        opened = [a['id'] for a in assessments if st.session_state.get(f"show_questions_{a['id']}")]
+        # Documents written before questionCount existed are counted from their questions
+        # until `migrate_questions.py --backfill-counts` has run
+        uncounted = [a['id'] for a in assessments if 'questionCount' not in a]
+        opened_questions = store.load_many('assessments',
+                                           data.get_documents('assessments', list(dict.fromkeys(opened + uncounted))))
+        
         for assessment in assessments:
-            with st.expander(f"📝 {assessment['title']} ({len(assessment.get('questions', []))} questions)"):
+            q_count = assessment.get('questionCount', len(opened_questions.get(assessment['id']) or []))
+            with st.expander(f"📝 {assessment.get('title')} ({q_count} questions)"):
                 col1, col2, col3 = st.columns(3)
-                col1.metric("Category", assessment['category'])
-                col2.metric("Duration", f"{assessment['durationMinutes']} mins")
-                col3.metric("Questions", len(assessment.get('questions', [])))
+                col1.metric("Category", assessment.get('category'))
+                col2.metric("Duration", f"{assessment.get('durationMinutes')} mins")
+                col3.metric("Questions", q_count)
+                
+                if not st.checkbox("Show questions", key=f"show_questions_{assessment['id']}"):
+                    continue
                 
                 st.subheader("Questions:")
-                for i, q in enumerate(assessment.get('questions', []), 1):
+                questions = opened_questions.get(assessment['id'])
+                if questions is None:
+                    # Ticked during this rerun
+                    questions = store.load('assessments', assessment['id'])
+                if question_display == TABLE_MODE:
+                    render_question_table(f"view_questions_{assessment['id']}", questions)
+                    continue
+                for i, q in enumerate(questions, 1):
                     st.markdown(f"**Q{i}:** {q['text']}")
                     st.write(f"Options: {', '.join(q['options'])}")
                     st.write(f"✅ Correct: {q['options'][q['correctOptionIndex']]}")
@@ -103,7 +334,7 @@ elif page == "➕ Add Assessment":
     with st.form("new_assessment"):
         assessment_id = st.text_input("Assessment ID", placeholder="e.g., 4")
         title = st.text_input("Title", placeholder="e.g., Python Programming Test")
-        category = st.selectbox("Category", ["Technical", "Aptitude", "Reasoning", "Verbal"])
+        category = st.selectbox("Category", schemas.ASSESSMENT_CATEGORIES)
         duration = st.number_input("Duration (minutes)", min_value=10, max_value=180, value=60)
         
         st.subheader("Add Questions")
@@ -125,53 +356,60 @@ elif page == "➕ Add Assessment":
             difficulty = st.selectbox(f"Difficulty", ["Easy", "Medium", "Hard"], key=f"diff_{i}")
             section = st.text_input(f"Section", value=category, key=f"section_{i}")
             
-            questions.append({
-                'id': f'q_{assessment_id}_{i+1}',
-                'text': q_text,
-                'options': [opt1, opt2, opt3, opt4],
-                'correctOptionIndex': ord(correct) - ord('A'),
-                'concept': concept,
-                'difficulty': difficulty,
-                'section': section
-            })
+            questions.append(schemas.question(f'q_{assessment_id}_{i+1}', q_text, [opt1, opt2, opt3, opt4],
+                                              correct, concept, difficulty, section))
         
         submitted = st.form_submit_button("Create Assessment")
         
         if submitted:
             if assessment_id and title:
-                assessment_data = {
-                    'title': title,
-                    'category': category,
-                    'durationMinutes': duration,
-                    'questions': questions
-                }
+                assessment_data = schemas.assessment(title, category, duration)
                 
-                db.collection('assessments').document(assessment_id).set(assessment_data)
+                store.create('assessments', assessment_id, assessment_data, questions)
                 st.success(f"✅ Assessment '{title}' created successfully!")
                 st.balloons()
             else:
                 st.error("Please fill in Assessment ID and Title")
+    
+    with st.expander("🎲 Generate from Quotas"):
+        st.caption("Draw questions at random from the whole bank, e.g. `10 Medium Python, 5 Hard SQL, 5 Easy Aptitude`. "
+                   "Names are concepts, or sections when no concept matches. The same seed gives the same questions.")
+        with st.form("generate_assessment"):
+            g_id = st.text_input("Assessment ID", placeholder="e.g., 5", key="gen_assessment_id")
+            g_title = st.text_input("Title", placeholder="e.g., Mixed Practice Test", key="gen_title")
+            g_cat = st.selectbox("Category", schemas.ASSESSMENT_CATEGORIES, key="gen_category")
+            g_dur = st.number_input("Duration (minutes)", min_value=10, max_value=180, value=60, key="gen_duration")
+            g_quotas = st.text_area("Quotas", placeholder="10 Medium Python, 5 Hard SQL, 5 Easy Aptitude",
+                                    key="gen_quotas")
+            g_seed = st.text_input("Seed (optional)", key="gen_seed")
+            
+            if st.form_submit_button("Generate Assessment"):
+                if g_id and g_title:
+                    if generate_from_quotas('assessments', g_id, schemas.assessment(g_title, g_cat, g_dur),
+                                            g_quotas, g_seed):
+                        st.balloons()
+                else:
+                    st.error("Please fill in Assessment ID and Title")
 
 elif page == "⏰ Upcoming Tests":
     st.header("Schedule Upcoming Tests")
     
-    tab1, tab2 = st.tabs(["📅 View Scheduled", "➕ Schedule New"])
+    # Expired tests leave the listing and due drafts go live before it is read
+    scheduled = init_scheduler().run_if_due()
+    if scheduled:
+        st.toast(f"⏰ Scheduler: {scheduled.summary()}")
+    for test_id, error in (scheduled.failed if scheduled else []):
+        st.warning(f"⚠️ Test {test_id} could not be archived and will be retried: {error}")
+    
+    tab1, tab2, tab3 = st.tabs(["📅 View Scheduled", "➕ Schedule New", "🗄️ Archived"])
     
     with tab1:
-        st.subheader("Currently Scheduled Tests")
-        upcoming_ref = db.collection('upcoming_tests')
-        docs = upcoming_ref.stream()
-        
-        upcoming_tests = []
-        for doc in docs:
-            t_data = doc.to_dict()
-            t_data['id'] = doc.id
-            upcoming_tests.append(t_data)
+        st.subheader("Active and Upcoming Tests")
+        # Ordered by startTime on the server, one page at a time
+        upcoming_tests = paged_listing("upcoming_tests", 'upcoming_tests', 'startTime')
         
         if upcoming_tests:
-            # Sort by startTime for view
-            upcoming_tests.sort(key=lambda x: x.get('startTime', datetime.now()))
-            
+            questions_by_test = store.load_many('upcoming_tests', {t['id']: t for t in upcoming_tests})
             for test in upcoming_tests:
                 start = test.get('startTime')
                 end = test.get('endTime')
@@ -184,18 +422,27 @@ elif page == "⏰ Upcoming Tests":
                     col1, col2 = st.columns(2)
                     col1.write(f"**Category:** {test.get('category')}")
                     col1.write(f"**Duration:** {test.get('durationMinutes')} mins")
-                    col1.write(f"**Status:** {'🟢 Published' if test.get('isPublished') else '🔴 Draft'}")
+                    publish_at = test.get('publishAt')
+                    status = '🟢 Published' if test.get('isPublished') else '🔴 Draft'
+                    if not test.get('isPublished') and hasattr(publish_at, 'astimezone'):
+                        status += f" (publishes {publish_at.astimezone().strftime('%d %b, %H:%M')})"
+                    col1.write(f"**Status:** {status}")
                     
                     col2.write(f"**Starts:** {start_str}")
                     col2.write(f"**Ends:** {end_str}")
                     
                     st.divider()
-                    st.write(f"**Questions ({len(test.get('questions', []))})**")
-                    for i, q in enumerate(test.get('questions', []), 1):
-                        st.write(f"{i}. {q['text']}")
+                    test_questions = questions_by_test[test['id']]
+                    st.write(f"**Questions ({len(test_questions)})**")
+                    if question_display == TABLE_MODE:
+                        if st.checkbox("Show questions", key=f"show_test_questions_{test['id']}"):
+                            render_question_table(f"test_questions_{test['id']}", test_questions)
+                    else:
+                        for i, q in enumerate(test_questions, 1):
+                            st.write(f"{i}. {q['text']}")
                     
                     if st.button(f"🗑️ Delete {test['title']}", key=f"del_test_{test['id']}"):
-                        db.collection('upcoming_tests').document(test['id']).delete()
+                        store.delete('upcoming_tests', test['id'], test, test_questions)
                         st.success("Test deleted!")
                         st.rerun()
         else:
@@ -206,7 +453,7 @@ elif page == "⏰ Upcoming Tests":
         
         with st.form("schedule_test"):
             t_title = st.text_input("Test Title", placeholder="e.g., Weekly Technical Sprint")
-            t_cat = st.selectbox("Category", ["Technical", "General"])
+            t_cat = st.selectbox("Category", schemas.TEST_CATEGORIES)
             t_desc = st.text_area("Description", placeholder="What is this test about?")
             
             c1, c2 = st.columns(2)
@@ -219,6 +466,11 @@ elif page == "⏰ Upcoming Tests":
             t_dur = st.number_input("Duration (Minutes)", min_value=1, value=30)
             t_topics = st.text_input("Topics (comma separated)", placeholder="Python, SQL, Logic")
             t_pub = st.checkbox("Publish Immediately", value=True)
+            t_auto = st.checkbox("Auto-publish the draft at a set time", value=False,
+                                 help="Unticked, a draft stays a draft until published by hand")
+            p1, p2 = st.columns(2)
+            p_date = p1.date_input("Auto-publish on", value=datetime.now().date())
+            p_time = p2.time_input("Auto-publish at", value=datetime.now().time())
             
             st.divider()
             st.subheader("Add Questions")
@@ -239,15 +491,8 @@ elif page == "⏰ Upcoming Tests":
                 uconcept = st.text_input(f"Concept", key=f"upcoming_concept_{i}")
                 udiff = st.selectbox(f"Difficulty", ["Easy", "Medium", "Hard"], key=f"upcoming_diff_{i}")
                 
-                upcoming_questions.append({
-                    'id': f'uq_{i+1}_{datetime.now().strftime("%Y%m%d%H%M")}',
-                    'text': uq_text,
-                    'options': [uo1, uo2, uo3, uo4],
-                    'correctOptionIndex': ord(ucorrect) - ord('A'),
-                    'concept': uconcept,
-                    'difficulty': udiff,
-                    'section': t_cat
-                })
+                upcoming_questions.append(schemas.question(schemas.upcoming_question_id(i + 1), uq_text,
+                                                           [uo1, uo2, uo3, uo4], ucorrect, uconcept, udiff, t_cat))
             
             t_submit = st.form_submit_button("Schedule Test & Add Questions")
             
@@ -257,131 +502,182 @@ elif page == "⏰ Upcoming Tests":
                     start_dt = datetime.combine(s_date, s_time).astimezone()
                     end_dt = datetime.combine(e_date, e_time).astimezone()
                     
-                    new_test_data = {
-                        "title": t_title,
-                        "category": t_cat,
-                        "description": t_desc,
-                        "startTime": start_dt,
-                        "endTime": end_dt,
-                        "durationMinutes": int(t_dur),
-                        "topics": [t.strip() for t in t_topics.split(",") if t.strip()],
-                        "questions": upcoming_questions,
-                        "isPublished": t_pub
-                    }
+                    publish_at = datetime.combine(p_date, p_time).astimezone() if t_auto else None
+                    
+                    new_test_data = schemas.upcoming_test(
+                        t_title, t_cat, t_desc, start_dt, end_dt, t_dur, t_topics, t_pub,
+                        publish_at=publish_at)
                     
-                    db.collection('upcoming_tests').add(new_test_data)
+                    store.create('upcoming_tests', None, new_test_data, upcoming_questions)
                     st.success(f"✅ Test '{t_title}' has been scheduled!")
                     st.balloons()
                     st.rerun()
                 else:
                     st.error("Title is required!")
+        
+        with st.expander("🎲 Generate from Quotas"):
+            st.caption("Draw the questions at random from the whole bank, e.g. `10 Medium Python, 5 Hard SQL`. "
+                       "The test is saved as a draft; its topics are the quota names.")
+            with st.form("generate_test"):
+                g_title = st.text_input("Test Title", key="gen_test_title")
+                g_cat = st.selectbox("Category", schemas.TEST_CATEGORIES, key="gen_test_category")
+                g_desc = st.text_area("Description", key="gen_test_desc")
+                
+                c1, c2 = st.columns(2)
+                g_s_date = c1.date_input("Start Date", value=datetime.now().date(), key="gen_test_s_date")
+                g_s_time = c1.time_input("Start Time", value=datetime.now().time(), key="gen_test_s_time")
+                g_e_date = c2.date_input("End Date", value=datetime.now().date(), key="gen_test_e_date")
+                g_e_time = c2.time_input("End Time", value=(datetime.now() + timedelta(hours=2)).time(),
+                                         key="gen_test_e_time")
+                
+                g_dur = st.number_input("Duration (Minutes)", min_value=1, value=30, key="gen_test_duration")
+                g_quotas = st.text_area("Quotas", placeholder="10 Medium Python, 5 Hard SQL", key="gen_test_quotas")
+                g_seed = st.text_input("Seed (optional)", key="gen_test_seed")
+                
+                if st.form_submit_button("Generate Draft Test"):
+                    if g_title:
+                        from generator import parse_quotas
+                        try:
+                            topics = list(dict.fromkeys(q.name for q in parse_quotas(g_quotas)))
+                        except ValueError:
+                            topics = []
+                        test_data = schemas.upcoming_test(
+                            g_title, g_cat, g_desc, datetime.combine(g_s_date, g_s_time).astimezone(),
+                            datetime.combine(g_e_date, g_e_time).astimezone(), g_dur, topics, False)
+                        generate_from_quotas('upcoming_tests', None, test_data, g_quotas, g_seed)
+                    else:
+                        st.error("Title is required!")
+    
+    with tab3:
+        st.subheader("Archived Tests")
+        st.caption("Tests are archived here, with their questions, once their end time has passed.")
+        # Most recently ended first
+        archived_tests = paged_listing("archived_tests", 'archived_tests', 'endTime', descending=True,
+                                       fields=ARCHIVED_TEST_FIELDS)
+        for test in archived_tests:
+            end = test.get('endTime')
+            end_str = end.astimezone().strftime("%d %b %Y, %H:%M") if hasattr(end, 'astimezone') else str(end)
+            st.write(f"📦 **{test.get('title')}** ({test.get('category')}) · ended {end_str} · "
+                     f"{test.get('questionCount', '?')} questions")
+        if not archived_tests:
+            st.info("No archived tests yet.")
 
 elif page == "✏️ Edit Questions":
     st.header("Edit Existing Questions")
     
-    # Fetch assessments
-    assessments_ref = db.collection('assessments')
-    docs = assessments_ref.stream()
-    
-    assessment_titles = {}
-    for doc in docs:
-        data = doc.to_dict()
-        assessment_titles[doc.id] = data['title']
+    # Fetch titles only; the selected assessment is loaded in full below
+    assessment_titles = {a['id']: a.get('title') for a in data.list_summaries('assessments', ASSESSMENT_SUMMARY_FIELDS)}
     
     if assessment_titles:
         selected_id = st.selectbox("Select Assessment", list(assessment_titles.keys()), 
                                    format_func=lambda x: f"{x}: {assessment_titles[x]}")
         
         if selected_id:
-            doc = db.collection('assessments').document(selected_id).get()
-            assessment = doc.to_dict()
+            assessment = data.get_document('assessments', selected_id)
             
             st.subheader(f"Editing: {assessment['title']}")
             
-            questions = assessment.get('questions', [])
+            edit_mode = st.radio("Editing mode", ["Per question", "Grid (bulk)"], horizontal=True,
+                                 key="edit_mode")
             
-            for i, q in enumerate(questions):
-                with st.expander(f"Question {i+1}: {q['text'][:50]}..."):
-                    new_text = st.text_area("Question Text", value=q['text'], key=f"edit_text_{i}")
+            if edit_mode == "Grid (bulk)":
+                render_grid_editor('assessments', selected_id, assessment)
+            else:
+                questions = store.load('assessments', selected_id, parent=assessment)
+                
+                for i, q in enumerate(questions):
+                    with st.expander(f"Question {i+1}: {q['text'][:50]}..."):
+                        new_text = st.text_area("Question Text", value=q['text'], key=f"edit_text_{i}")
+                        
+                        col1, col2 = st.columns(2)
+                        new_opts = []
+                        new_opts.append(col1.text_input("Option A", value=q['options'][0], key=f"edit_opt1_{i}"))
+                        new_opts.append(col2.text_input("Option B", value=q['options'][1], key=f"edit_opt2_{i}"))
+                        new_opts.append(col1.text_input("Option C", value=q['options'][2], key=f"edit_opt3_{i}"))
+                        new_opts.append(col2.text_input("Option D", value=q['options'][3], key=f"edit_opt4_{i}"))
+                        
+                        correct_idx = st.selectbox("Correct Answer", [0, 1, 2, 3], 
+                                                  index=q['correctOptionIndex'],
+                                                  format_func=lambda x, opts=new_opts: f"{chr(65+x)}: {opts[x]}",
+                                                  key=f"edit_correct_{i}")
+                        
+                        new_concept = st.text_input("Concept", value=q['concept'], key=f"edit_concept_{i}")
+                        new_diff = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], 
+                                               index=["Easy", "Medium", "Hard"].index(q['difficulty']),
+                                               key=f"edit_diff_{i}")
+                        
+                        col_update, col_delete = st.columns(2)
+                        if col_update.button(f"Update Question {i+1}", key=f"update_{i}"):
+                            updated_question = schemas.question(q['id'], new_text, new_opts, correct_idx,
+                                                                new_concept, new_diff, q['section'])
+                            
+                            try:
+                                store.update_question('assessments', selected_id, assessment, questions, i,
+                                                      updated_question)
+                            except ConcurrentEditError:
+                                st.error("❌ Someone else changed this assessment since it was loaded. "
+                                         "The page now shows the latest version; re-apply your edit.")
+                            else:
+                                st.success(f"✅ Question {i+1} updated!")
+                                st.rerun()
+                        
+                        if col_delete.button(f"🗑️ Delete", key=f"delete_{i}"):
+                            try:
+                                store.delete_question('assessments', selected_id, assessment, questions, i)
+                            except ConcurrentEditError:
+                                st.error("❌ Someone else changed this assessment since it was loaded. "
+                                         "The page now shows the latest version; re-apply your edit.")
+                            else:
+                                st.success(f"✅ Question {i+1} deleted!")
+                                st.rerun()
+                
+                # Add New Question Section
+                st.markdown("---")
+                st.subheader("➕ Add New Question")
+                
+                with st.form(f"add_question_{selected_id}"):
+                    new_q_text = st.text_area("Question Text", placeholder="Enter your question here...")
                     
                     col1, col2 = st.columns(2)
-                    new_opts = []
-                    new_opts.append(col1.text_input("Option A", value=q['options'][0], key=f"edit_opt1_{i}"))
-                    new_opts.append(col2.text_input("Option B", value=q['options'][1], key=f"edit_opt2_{i}"))
-                    new_opts.append(col1.text_input("Option C", value=q['options'][2], key=f"edit_opt3_{i}"))
-                    new_opts.append(col2.text_input("Option D", value=q['options'][3], key=f"edit_opt4_{i}"))
+                    new_opt1 = col1.text_input("Option A")
+                    new_opt2 = col2.text_input("Option B")
+                    new_opt3 = col1.text_input("Option C")
+                    new_opt4 = col2.text_input("Option D")
                     
-                    correct_idx = st.selectbox("Correct Answer", [0, 1, 2, 3], 
-                                              index=q['correctOptionIndex'],
-                                              format_func=lambda x: f"{chr(65+x)}: {new_opts[x]}",
-                                              key=f"edit_correct_{i}")
+                    new_correct = st.selectbox("Correct Answer", ["A", "B", "C", "D"])
+                    new_concept = st.text_input("Concept")
+                    new_difficulty = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"])
+                    new_section = st.text_input("Section", value=assessment['category'])
+                    allow_duplicate = st.checkbox("Add even if it duplicates an existing question")
                     
-                    new_concept = st.text_input("Concept", value=q['concept'], key=f"edit_concept_{i}")
-                    new_diff = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], 
-                                           index=["Easy", "Medium", "Hard"].index(q['difficulty']),
-                                           key=f"edit_diff_{i}")
+                    add_submitted = st.form_submit_button("Add Question")
                     
-                    col_update, col_delete = st.columns(2)
-                    if col_update.button(f"Update Question {i+1}", key=f"update_{i}"):
-                        questions[i] = {
-                            'id': q['id'],
-                            'text': new_text,
-                            'options': new_opts,
-                            'correctOptionIndex': correct_idx,
-                            'concept': new_concept,
-                            'difficulty': new_diff,
-                            'section': q['section']
-                        }
-                        
-                        db.collection('assessments').document(selected_id).update({'questions': questions})
-                        st.success(f"✅ Question {i+1} updated!")
-                        st.rerun()
-                    
-                    if col_delete.button(f"🗑️ Delete", key=f"delete_{i}"):
-                        questions.pop(i)
-                        db.collection('assessments').document(selected_id).update({'questions': questions})
-                        st.success(f"✅ Question {i+1} deleted!")
-                        st.rerun()
-            
-            # Add New Question Section
-            st.markdown("---")
-            st.subheader("➕ Add New Question")
-            
-            with st.form(f"add_question_{selected_id}"):
-                new_q_text = st.text_area("Question Text", placeholder="Enter your question here...")
-                
-                col1, col2 = st.columns(2)
-                new_opt1 = col1.text_input("Option A")
-                new_opt2 = col2.text_input("Option B")
-                new_opt3 = col1.text_input("Option C")
-                new_opt4 = col2.text_input("Option D")
-                
-                new_correct = st.selectbox("Correct Answer", ["A", "B", "C", "D"])
-                new_concept = st.text_input("Concept")
-                new_difficulty = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"])
-                new_section = st.text_input("Section", value=assessment['category'])
-                
-                add_submitted = st.form_submit_button("Add Question")
-                
-                if add_submitted:
-                    if new_q_text and new_opt1 and new_opt2 and new_opt3 and new_opt4:
-                        new_question = {
-                            'id': f'q_{selected_id}_{len(questions)+1}',
-                            'text': new_q_text,
-                            'options': [new_opt1, new_opt2, new_opt3, new_opt4],
-                            'correctOptionIndex': ord(new_correct) - ord('A'),
-                            'concept': new_concept,
-                            'difficulty': new_difficulty,
-                            'section': new_section
-                        }
-                        
-                        questions.append(new_question)
-                        db.collection('assessments').document(selected_id).update({'questions': questions})
-                        st.success(f"✅ New question added! Total questions: {len(questions)}")
-                        st.balloons()
-                        st.rerun()
-                    else:
-                        st.error("Please fill in all fields!")
+                    if add_submitted:
+                        if new_q_text and new_opt1 and new_opt2 and new_opt3 and new_opt4:
+                            new_question = schemas.question(new_question_id(f'q_{selected_id}', questions),
+                                                            new_q_text, [new_opt1, new_opt2, new_opt3, new_opt4],
+                                                            new_correct, new_concept, new_difficulty, new_section)
+                            
+                            with st.spinner("Checking for duplicates..."):
+                                duplicate = init_duplicate_index().check_question(new_question)
+                            if duplicate and not allow_duplicate:
+                                kind, similarity, duplicate_of = duplicate
+                                st.warning(f"⚠️ {'Exact' if kind == 'exact' else 'Near'} duplicate "
+                                           f"({similarity:.0%} similar) of {duplicate_of}. "
+                                           "Tick the box above to add it anyway.")
+                            else:
+                                try:
+                                    store.add_question('assessments', selected_id, assessment, questions,
+                                                       new_question)
+                                except ConcurrentEditError:
+                                    st.error("❌ Someone else changed this assessment since it was loaded. "
+                                             "Reload the page and add the question again.")
+                                else:
+                                    st.success(f"✅ New question added! Total questions: {len(questions) + 1}")
+                                    st.balloons()
+                                    st.rerun()
+                        else:
+                            st.error("Please fill in all fields!")
     else:
         st.info("No assessments found.")
 
@@ -403,59 +699,79 @@ elif page == "📊 Upload CSV":
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
     
     if uploaded_file:
-        df = pd.read_csv(uploaded_file)
-        st.dataframe(df)
+        import pandas as pd
+        from csv_ingest import ingest_csv
         
-        if st.button("Upload to Firebase"):
-            # Group by assessment_id
-            for assessment_id in df['assessment_id'].unique():
-                assessment_df = df[df['assessment_id'] == assessment_id]
-                
-                questions = []
-                for idx, row in assessment_df.iterrows():
-                    questions.append({
-                        'id': f'q_{assessment_id}_{idx}',
-                        'text': row['question_text'],
-                        'options': [row['option_a'], row['option_b'], row['option_c'], row['option_d']],
-                        'correctOptionIndex': ord(row['correct_answer'].upper()) - ord('A'),
-                        'concept': row['concept'],
-                        'difficulty': row['difficulty'],
-                        'section': row['section']
-                    })
-                
-                # Check if assessment exists
-                doc_ref = db.collection('assessments').document(str(assessment_id))
-                doc = doc_ref.get()
-                
-                if doc.exists:
-                    # Update questions
-                    doc_ref.update({'questions': questions})
-                    st.success(f"✅ Updated assessment {assessment_id}")
+        # Preview only the first rows; the full file is streamed in chunks on upload
+        preview = pd.read_csv(uploaded_file, nrows=CSV_PREVIEW_ROWS)
+        uploaded_file.seek(0)
+        st.caption(f"Preview of the first {len(preview)} rows")
+        st.dataframe(preview)
+        
+        skip_duplicates = st.checkbox("Skip duplicate questions", value=False,
+                                      help="Drop rows repeating an earlier row or a question already in the bank "
+                                           "(ignoring case, punctuation and option order, or nearly identical). "
+                                           "The check holds every valid row in memory; unticked, the file is "
+                                           "streamed and duplicates are not looked for.")
+        
+        col_check, col_upload = st.columns(2)
+        check_clicked = col_check.button("🔍 Check for duplicates", key="check_csv")
+        upload_clicked = col_upload.button("Upload to Firebase", key="upload_csv")
+        
+        if check_clicked or upload_clicked:
+            progress = st.progress(0.0, text="Validating rows...")
+            
+            def show_progress(phase, done, total):
+                if phase == 'read':
+                    progress.progress(0.0, text=f"Validated {done:,} rows...")
+                elif phase == 'dedup':
+                    progress.progress(0.0, text="Checking for duplicates...")
                 else:
-                    st.warning(f"⚠️ Assessment {assessment_id} doesn't exist. Create it first in 'Add Assessment' page.")
+                    progress.progress(done / max(total, 1), text=f"Committed {done:,} of {total:,} queued writes")
             
-            st.balloons()
+            # The duplicate check holds the whole file, so it only runs when asked for
+            duplicates = init_duplicate_index() if check_clicked or skip_duplicates else None
+            try:
+                report = ingest_csv(uploaded_file, store, on_progress=show_progress,
+                                    duplicates=duplicates, skip_duplicates=skip_duplicates,
+                                    dry_run=check_clicked)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                st.stop()
+            
+            progress.progress(1.0, text="Done")
+            st.info(f"Processed {report.rows:,} rows: {report.valid_rows:,} valid, {report.invalid_rows:,} skipped.")
+            if report.duplicates:
+                action = "skipped" if report.skipped_duplicates else "uploaded anyway"
+                if check_clicked:
+                    action = "would be skipped" if skip_duplicates else "would be uploaded anyway"
+                with st.expander(f"⚠️ {len(report.duplicates):,} duplicate rows {action}", expanded=check_clicked):
+                    st.dataframe(report.duplicate_frame())
+            elif check_clicked:
+                st.success("✅ No duplicates found")
+            for assessment_id in report.updated:
+                st.success(f"✅ Updated assessment {assessment_id}")
+            for assessment_id in report.missing:
+                st.warning(f"⚠️ Assessment {assessment_id} doesn't exist. Create it first in 'Add Assessment' page.")
+            if report.errors:
+                with st.expander(f"⚠️ {report.invalid_rows:,} invalid rows skipped"):
+                    st.dataframe(report.error_frame())
+            
+            if upload_clicked:
+                st.balloons()
 
 elif page == "💼 Manage Jobs":
     st.header("Job Postings Manager")
+    from jobs import import_jobs, parse_linkedin_url
     
-    tab1, tab2 = st.tabs(["📋 View Jobs", "➕ Add Job"])
+    tab1, tab2, tab3 = st.tabs(["📋 View Jobs", "➕ Add Job", "📥 Bulk Import"])
     
     with tab1:
         st.subheader("Current Job Openings")
-        jobs_ref = db.collection('jobs')
-        docs = jobs_ref.stream()
-        
-        jobs = []
-        for doc in docs:
-            j_data = doc.to_dict()
-            j_data['id'] = doc.id
-            jobs.append(j_data)
+        # Newest first, ordered on the server, one page at a time
+        jobs = paged_listing("jobs", 'jobs', 'timestamp', descending=True)
         
         if jobs:
-            # Sort by timestamp if available
-            jobs.sort(key=lambda x: x.get('timestamp', datetime.now()), reverse=True)
-            
             for job in jobs:
                 with st.expander(f"🏢 {job.get('title')} at {job.get('company')}"):
                     col1, col2 = st.columns(2)
@@ -472,7 +788,7 @@ elif page == "💼 Manage Jobs":
                     st.write(job.get('description'))
                     
                     if st.button(f"🗑️ Delete Job", key=f"del_job_{job['id']}"):
-                        db.collection('jobs').document(job['id']).delete()
+                        data.delete_document('jobs', job['id'])
                         st.success("Job deleted!")
                         st.rerun()
         else:
@@ -490,22 +806,14 @@ elif page == "💼 Manage Jobs":
             if li_url_input:
                 st.warning("LinkedIn often blocks direct fetching. I'll attempt to extract basic info from the URL.")
                 # Basic parsing from URL slugs if possible
-                # Example: https://www.linkedin.com/jobs/view/software-engineer-at-company-12345/
-                if "linkedin.com/jobs/view/" in li_url_input:
-                    try:
-                        slug = li_url_input.split("/view/")[1].split("/")[0]
-                        parts = slug.split("-at-")
-                        if len(parts) > 1:
-                            st.session_state['auto_title'] = parts[0].replace("-", " ").title()
-                            st.session_state['auto_company'] = parts[1].replace("-", " ").title()
-                            st.success(f"Extracted: {st.session_state['auto_title']} at {st.session_state['auto_company']}")
-                        else:
-                            # Try other format: software-engineer-company-12345
-                            title_parts = parts[0].split("-")
-                            st.session_state['auto_title'] = " ".join(title_parts[:-1]).title()
-                            st.success(f"Extracted: {st.session_state['auto_title']}")
-                    except Exception as e:
-                        st.error(f"Error parsing URL: {str(e)}")
+                auto_title, auto_company = parse_linkedin_url(li_url_input)
+                if auto_title and auto_company:
+                    st.session_state['auto_title'] = auto_title
+                    st.session_state['auto_company'] = auto_company
+                    st.success(f"Extracted: {auto_title} at {auto_company}")
+                elif auto_title:
+                    st.session_state['auto_title'] = auto_title
+                    st.success(f"Extracted: {auto_title}")
                 else:
                     st.error("Could not auto-fill. Please enter manually.")
             else:
@@ -520,8 +828,8 @@ elif page == "💼 Manage Jobs":
             j_location = st.text_input("Location", placeholder="e.g., Mountain View, CA")
             
             c1, c2 = st.columns(2)
-            j_type = c1.selectbox("Job Type", ["Full-time", "Part-time", "Contract", "Internship"])
-            j_mode = c2.selectbox("Work Mode", ["Remote", "On-site", "Hybrid"])
+            j_type = c1.selectbox("Job Type", schemas.JOB_TYPES)
+            j_mode = c2.selectbox("Work Mode", schemas.WORK_MODES)
             
             j_link = st.text_input("Application Link", value=li_url_input)
             j_desc = st.text_area("Job Description", height=200, placeholder="Paste the job description or highlights here...")
@@ -530,18 +838,8 @@ elif page == "💼 Manage Jobs":
             
             if j_submit:
                 if j_title and j_company:
-                    new_job = {
-                        "title": j_title,
-                        "company": j_company,
-                        "location": j_location,
-                        "type": j_type,
-                        "mode": j_mode,
-                        "link": j_link,
-                        "description": j_desc,
-                        "postedDate": datetime.now().strftime("%d %b %Y"),
-                        "timestamp": datetime.now()
-                    }
-                    db.collection('jobs').add(new_job)
+                    new_job = schemas.job(j_title, j_company, j_location, j_type, j_mode, j_link, j_desc)
+                    data.add_document('jobs', new_job)
                     st.success(f"✅ Job '{j_title}' at '{j_company}' added!")
                     # Clear session state
                     if 'auto_title' in st.session_state: del st.session_state['auto_title']
@@ -551,6 +849,219 @@ elif page == "💼 Manage Jobs":
                 else:
                     st.error("Title and Company are required!")
 
+    with tab3:
+        st.subheader("Import Job Postings")
+        st.markdown("""
+        Upload a CSV or JSON-lines feed with the fields of the **Add Job** form:
+        `title`, `company`, `location`, `type`, `mode`, `link`, `description` and optionally `postedDate`.
+        A missing title or company is taken from the LinkedIn URL when possible. Postings already
+        on the board (same link, or same company and title) are skipped, so a feed can be re-imported safely.
+        """)
+        
+        feed = st.file_uploader("Choose a feed", type=["csv", "jsonl", "json"], key="job_feed")
+        
+        if feed:
+            col_check, col_import = st.columns(2)
+            check_clicked = col_check.button("🔍 Check feed", key="check_jobs")
+            import_clicked = col_import.button("Import Jobs", key="import_jobs")
+            
+            if check_clicked or import_clicked:
+                progress = st.progress(0.0, text="Reading postings...")
+                
+                def show_progress(phase, done, total):
+                    if phase == 'read':
+                        progress.progress(0.0, text=f"Checked {done:,} postings...")
+                    else:
+                        progress.progress(done / max(total, 1), text=f"Added {done:,} of {total:,} postings")
+                
+                with st.spinner("Indexing current jobs..."):
+                    index = init_job_index()
+                report = import_jobs(feed, data, index, dry_run=check_clicked, on_progress=show_progress)
+                progress.progress(1.0, text="Done")
+                
+                verb = "would be added" if check_clicked else "added"
+                st.info(f"Processed {report.rows:,} postings: {len(report.added):,} {verb}, "
+                        f"{len(report.duplicates):,} duplicates, {len(report.errors):,} invalid.")
+                if report.duplicates:
+                    with st.expander(f"⚠️ {len(report.duplicates):,} duplicate postings skipped", expanded=check_clicked):
+                        st.dataframe(report.duplicate_rows())
+                if report.errors:
+                    with st.expander(f"⚠️ {len(report.errors):,} invalid postings skipped"):
+                        st.dataframe(report.error_rows())
+                if import_clicked and report.added:
+                    st.success(f"✅ Imported {len(report.added):,} job postings")
+
+elif page == "🔎 Search Questions":
+    st.header("Search the Question Bank")
+    
+    query = st.text_input("Search questions, options and concepts", placeholder="e.g. pyth loop, capital france")
+    scope = st.multiselect("Look in", list(COLLECTION_LABELS), default=list(COLLECTION_LABELS),
+                           format_func=COLLECTION_LABELS.get)
+    
+    if query:
+        index = init_search_index()
+        with st.spinner("Indexing the question bank..."):
+            index.refresh()
+        
+        started = time.perf_counter()
+        results = index.search(query, limit=SEARCH_LIMIT, collections=scope)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.caption(f"{len(results)} results in {elapsed_ms:.1f} ms · {len(index):,} questions indexed")
+        
+        for r in results:
+            q = r.question
+            st.markdown(f"**{q.get('text', '')}**")
+            st.write(f"📝 {r.parent_title} ({COLLECTION_LABELS[r.collection]}, Q{r.position}) | "
+                     f"📌 Concept: {q.get('concept')} | Difficulty: {q.get('difficulty')}")
+            options = q.get('options', [])
+            correct = q.get('correctOptionIndex')
+            st.write(f"Options: {', '.join(map(str, options))}"
+                     + (f" | ✅ {options[correct]}" if isinstance(correct, int) and correct < len(options) else ""))
+            st.markdown("---")
+        if not results:
+            st.info("No questions match every search term.")
+
+elif page == "🧭 Question Explorer":
+    st.header("Explore the Question Bank")
+    from bank_frame import DIFFICULTIES, coverage, select, under_covered
+    from question_table import page_count, page_slice
+    
+    with st.spinner("Loading the question bank..."):
+        frame = init_bank_frame().frame()
+    
+    scope = st.multiselect("Look in", list(COLLECTION_LABELS), default=list(COLLECTION_LABELS),
+                           format_func=COLLECTION_LABELS.get, key="explore_scope")
+    filter_cols = st.columns(3)
+    selected = {dimension: col.multiselect(dimension.title(), sorted(frame[dimension].cat.categories),
+                                           key=f"explore_{dimension}")
+                for col, dimension in zip(filter_cols, ['concept', 'difficulty', 'section'])}
+    
+    # Vectorized masks over categorical codes; no per-question Python loop
+    started = time.perf_counter()
+    in_scope = select(frame, collections=scope)
+    matching = select(in_scope, **selected)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    page_size = col_size.selectbox("Rows per page", QUESTION_PAGE_SIZES, key="explore_rows")
+    pages = page_count(len(matching), page_size)
+    if st.session_state.get("explore_page", 1) > pages:
+        st.session_state["explore_page"] = pages
+    page_number = col_page.number_input("Page", min_value=1, max_value=pages, step=1, key="explore_page")
+    col_info.caption(f"{len(matching):,} of {len(frame):,} questions · filtered in {elapsed_ms:.1f} ms")
+    st.dataframe(page_slice(matching, page_number, page_size)[
+        ['title', 'position', 'text', 'concept', 'difficulty', 'section']], hide_index=True)
+    
+    st.subheader("Coverage")
+    st.caption("Questions per concept and difficulty in the selected collections and sections")
+    st.dataframe(coverage(select(in_scope, section=selected['section'])))
+    
+    col_min, col_diff = st.columns(2)
+    minimum = col_min.number_input("Fewer than", min_value=1, value=5, step=1, key="explore_minimum")
+    difficulty = col_diff.selectbox("questions of difficulty", ["Any"] + DIFFICULTIES, key="explore_thin_difficulty")
+    # Only concepts that occur in the selected collections and sections are checked
+    thin = under_covered(select(in_scope, section=selected['section']), minimum,
+                         difficulty=[] if difficulty == "Any" else [difficulty])
+    if len(thin):
+        st.dataframe(thin.rename("questions").rename_axis("concept").reset_index(), hide_index=True)
+    else:
+        st.success(f"✅ Every concept has at least {minimum} such questions")
+
+elif page == "📈 Bank Statistics":
+    st.header("Question Bank Statistics")
+    import pandas as pd
+    from bank_stats import DIMENSIONS, drift, live_counts, load_summary, recompute
+    
+    if st.button("🔄 Recompute from scratch", key="recompute_stats",
+                 help="Scan every assessment and scheduled test to rebuild the counts"):
+        with st.spinner("Scanning the question bank..."):
+            recompute(store)
+        st.success("✅ Statistics rebuilt")
+    
+    # One batched read of the summary shards, whatever the size of the bank
+    summary = load_summary(data)
+    
+    if summary is None:
+        st.info("No question statistics yet. Click **Recompute from scratch** to build them.")
+    else:
+        tests = summary.get('upcoming_tests', {})
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Assessments", summary.get('assessments', {}).get('documents', 0))
+        col2.metric("Scheduled tests", tests.get('documents', 0))
+        col3.metric("🟢 Published", tests.get('published', 0))
+        col4.metric("🔴 Drafts", tests.get('draft', 0))
+        
+        if st.button("🔍 Verify", key="verify_stats",
+                     help="Compare the document counts with count() aggregations (a read per 1000 documents)"):
+            live = live_counts(data)
+            mismatched = drift(summary, live)
+            if mismatched:
+                st.warning(f"⚠️ Question statistics are out of date ({', '.join(mismatched)} differ from live "
+                           "counts), probably because of changes made outside the panel. Recompute to repair them.")
+            else:
+                st.success(f"✅ Document counts match the live counts ({live['jobs']} jobs)")
+        
+        scope = st.multiselect("Count questions in", list(COLLECTION_LABELS), default=list(COLLECTION_LABELS),
+                               format_func=COLLECTION_LABELS.get, key="stats_scope")
+        sections = [summary.get(collection, {}) for collection in scope]
+        st.metric("Questions", f"{sum(section.get('questions', 0) for section in sections):,}")
+        
+        chart_columns = st.columns(2)
+        for i, dimension in enumerate(DIMENSIONS + ('category',)):
+            totals = pd.Series(dtype='int64')
+            for section in sections:
+                totals = totals.add(pd.Series(section.get(dimension, {}), dtype='int64'), fill_value=0)
+            totals = totals[totals > 0].sort_values(ascending=False)
+            with chart_columns[i % 2]:
+                st.subheader(f"By {dimension}")
+                if totals.empty:
+                    st.caption("No questions")
+                else:
+                    st.bar_chart(totals.rename("questions"))
+        
+        recomputed = summary.get('recomputedAt')
+        st.caption(f"Last full recompute: {recomputed.astimezone().strftime('%d %b %Y, %H:%M')}"
+                   if hasattr(recomputed, 'astimezone') else "Never fully recomputed")
+
+elif page == "📦 Export Data":
+    st.header("Export Data")
+    from export import DATASETS, MIME_TYPES, PARQUET, export, formats
+    
+    st.write("Snapshot a collection for backup or analysis. Assessments are exported one row per question "
+             "in the Upload CSV format, so the file can be uploaded again as is.")
+    dataset = st.selectbox("Collection", list(DATASETS), key="export_dataset")
+    fmt = st.radio("Format", formats(), horizontal=True, key="export_format")
+    if PARQUET not in formats():
+        st.caption("Install `pyarrow` to export Parquet.")
+    
+    def build_export():
+        # Runs only when the button is clicked; rows are spooled to disk in chunks
+        spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+        export(store, dataset, spool, fmt=fmt)
+        spool.seek(0)
+        return spool
+    
+    st.download_button("⬇️ Download export", build_export, file_name=f"{dataset}.{fmt}",
+                       mime=MIME_TYPES[fmt], on_click="ignore", key="export_download")
+    st.caption("For very large banks, `python export.py` writes the same file without going through the browser.")
+
 # Footer
 st.sidebar.markdown("---")
 st.sidebar.info("💡 Tip: Changes are instant and reflect in the app immediately!")
+
+rerun_cost = tracer.end_rerun()
+if startup.rendered():
+    tracer.event('startup', **startup.as_dict())
+    # Page modules load in the background now that the first page is out
+    preload(startup)
+# Include widgets first rendered by this rerun, so a click on them is recognized next time
+st.session_state['_trace_widgets'] = widget_snapshot()
+if show_costs and rerun_cost:
+    # Writes usually happen in a rerun cut short by st.rerun(); show it too
+    interrupted = tracer.interrupted(session_id)
+    if interrupted:
+        render_cost_panel(interrupted)
+        st.sidebar.markdown("---")
+    render_cost_panel(rerun_cost)
+    phases = ", ".join(f"{name} {ms:.0f} ms" for name, ms in startup.as_dict()['phases'].items())
+    st.sidebar.caption(f"🚀 Process start: first page in {startup.first_render_ms:.0f} ms ({phases})")
@@ -0,0 +1,126 @@
+"""Whole-bank helpers shared by the indexes built over every question.
+
+The question bank is every question of every document in ``assessments``
+and ``upcoming_tests``, whatever storage layout each document uses.
+"""
+import os
+import threading
+import time
+from itertools import islice
+
+BANK_COLLECTIONS = ('assessments', 'upcoming_tests')
+# Parents whose question subcollections are listed concurrently during a scan
+LOAD_CHUNK = 100
+DEFAULT_INDEX_MAX_AGE = 600
+
+
+def index_max_age():
+    """Seconds before the app's bank views rescan, for writes no listener reported; ``0`` never rescans."""
+    max_age = float(os.environ.get("INTELLITRAIN_INDEX_MAX_AGE", DEFAULT_INDEX_MAX_AGE))
+    return max_age or None
+
+
+def bank_parent(path, doc_id):
+    """Map a written document to the ``(collection, parent_id)`` whose questions it affects."""
+    parts = path.split('/')
+    if len(parts) == 1 and path in BANK_COLLECTIONS:
+        return path, str(doc_id)
+    if len(parts) == 3 and parts[0] in BANK_COLLECTIONS and parts[2] == 'questions':
+        return parts[0], parts[1]
+    return None
+
+
+def iter_bank(store, collections=BANK_COLLECTIONS, chunk_size=LOAD_CHUNK, page_size=500):
+    """Yield ``(collection, parent, questions)`` for every document in the bank."""
+    for collection in collections:
+        parents = iter(store.data.iter_documents(collection, page_size=page_size))
+        while True:
+            chunk = {parent['id']: parent for parent in islice(parents, chunk_size)}
+            if not chunk:
+                break
+            for doc_id, questions in store.load_many(collection, chunk).items():
+                yield collection, chunk[doc_id], questions
+
+
+class BankView:
+    """Base for in-memory structures derived from the whole question bank.
+
+    The first ``refresh()`` scans the bank once. After that, writes reported
+    by the DataLayer only mark their parent document dirty, and the next
+    ``refresh()`` re-reads just those parents. Writes made by other
+    processes are only reported when a live mirror or local snapshot feeds
+    the DataLayer, so with ``max_age`` the first ``refresh()`` after that
+    many seconds scans the bank again; ``expire()`` forces that rescan.
+    Subclasses implement ``_reset()``, ``_add(key, parent, questions)`` and
+    ``_remove(key)``, where ``key`` is ``(collection, parent_id)``.
+    """
+
+    def __init__(self, store, max_age=None, timer=time.monotonic):
+        self.store = store
+        self.max_age = max_age
+        self._timer = timer
+        self._lock = threading.RLock()
+        # Separate lock so writers never wait for a rebuild in progress
+        self._dirty_lock = threading.Lock()
+        self._dirty = set()
+        self._built = False
+        self._built_at = None
+        store.data.subscribe(self._on_write)
+
+    def _on_write(self, path, doc_id):
+        key = bank_parent(path, doc_id)
+        if key is not None:
+            with self._dirty_lock:
+                self._dirty.add(key)
+
+    def refresh(self):
+        with self._lock:
+            if self._built and self.max_age is not None and self._timer() - self._built_at >= self.max_age:
+                self._built = False
+            if not self._built:
+                with self._dirty_lock:
+                    self._dirty.clear()
+                self._reset()
+                for collection, parent, questions in iter_bank(self.store):
+                    self._add((collection, parent['id']), parent, questions)
+                self._finish_build()
+                self._built = True
+                self._built_at = self._timer()
+                return
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            by_collection = {}
+            for collection, parent_id in dirty:
+                by_collection.setdefault(collection, []).append(parent_id)
+            # One get_all per collection, both collections at once
+            collections = list(by_collection)
+            fetched = self.store.data.gather(
+                lambda c=c: self.store.data.get_documents(c, by_collection[c]) for c in collections)
+            for collection, parents in zip(collections, fetched):
+                loaded = self.store.load_many(collection, parents)
+                for parent_id, parent in parents.items():
+                    self._remove((collection, parent_id))
+                    if parent is not None:
+                        self._add((collection, parent_id), parent, loaded[parent_id])
+
+    def rebuild(self):
+        with self._lock:
+            self._built = False
+            self.refresh()
+
+    def expire(self):
+        """Make the next ``refresh()`` scan the whole bank again."""
+        with self._lock:
+            self._built = False
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _finish_build(self):
+        """Hook run once after the initial full scan."""
+
+    def _add(self, key, parent, questions):
+        raise NotImplementedError
+
+    def _remove(self, key):
+        raise NotImplementedError
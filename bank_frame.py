@@ -0,0 +1,158 @@
+"""Columnar frame of the whole question bank for cross-assessment filters.
+
+Every question of every assessment and scheduled test is one row of a
+DataFrame carrying its parent's id, title and category. Repeated strings
+(concept, difficulty, section, parent fields) are categoricals, so a column
+costs one small integer code per row; filters such as "all Hard SQL
+questions" are vectorized masks over those codes and coverage questions
+("concepts with fewer than 5 Easy questions") are group counts.
+
+The frame is a BankView: built by one scan, then kept current by re-reading
+only the parents that writes touched. Changes are buffered and applied in
+one vectorized step the next time the frame is read.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from bank import BankView
+
+COLUMNS = ['collection', 'parent_id', 'title', 'category', 'position', 'question_id', 'text',
+           'concept', 'difficulty', 'section']
+CATEGORICAL = ['collection', 'parent_id', 'title', 'category', 'concept', 'difficulty', 'section']
+DIMENSIONS = ['concept', 'difficulty', 'section']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def rows_for(collection, parent, questions):
+    """Column lists for the questions of one parent document."""
+    n = len(questions)
+    return {
+        'collection': [collection] * n,
+        'parent_id': [parent['id']] * n,
+        'title': [_text(parent.get('title'))] * n,
+        'category': [_text(parent.get('category'))] * n,
+        'position': list(range(1, n + 1)),
+        'question_id': [_text(q.get('id')) for q in questions],
+        'text': [_text(q.get('text')) for q in questions],
+        **{dimension: [_text(q.get(dimension)) for q in questions] for dimension in DIMENSIONS},
+    }
+
+
+def to_frame(columns):
+    frame = pd.DataFrame({column: columns.get(column, []) for column in COLUMNS})
+    for column in CATEGORICAL:
+        frame[column] = frame[column].astype('category')
+    frame['position'] = frame['position'].astype('int32')
+    return frame
+
+
+def concat(frames):
+    """Row-wise concatenation keeping categorical columns categorical."""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return to_frame({})
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    # pd.concat falls back to object columns when category sets differ
+    return pd.DataFrame({
+        column: (union_categoricals([frame[column] for frame in frames], ignore_order=True)
+                 if column in CATEGORICAL else np.concatenate([frame[column].to_numpy() for frame in frames]))
+        for column in COLUMNS
+    })
+
+
+def parent_mask(frame, keys):
+    """Boolean mask of the rows belonging to any ``(collection, parent_id)`` in ``keys``."""
+    collections, parents = frame['collection'].cat, frame['parent_id'].cat
+    # Compare integer codes of both columns at once instead of the strings
+    wanted = [parent * len(collections.categories) + collection for collection, parent in zip(
+        collections.categories.get_indexer([key[0] for key in keys]),
+        parents.categories.get_indexer([key[1] for key in keys])) if collection >= 0 and parent >= 0]
+    combined = parents.codes.to_numpy(np.int64) * len(collections.categories) + collections.codes.to_numpy()
+    return np.isin(combined, wanted)
+
+
+def select(frame, collections=None, **filters):
+    """Rows of ``frame`` matching every non-empty filter, e.g. ``select(frame, concept=['SQL'], difficulty=['Hard'])``."""
+    mask = np.ones(len(frame), dtype=bool)
+    if collections:
+        mask &= frame['collection'].isin(collections).to_numpy()
+    for column, values in filters.items():
+        if values:
+            mask &= frame[column].isin(values).to_numpy()
+    return frame[mask]
+
+
+def coverage(frame, rows='concept', columns='difficulty'):
+    """Question counts with one row per ``rows`` value and one column per ``columns`` value."""
+    counts = frame.groupby([rows, columns], observed=True).size().unstack(fill_value=0)
+    if columns == 'difficulty':
+        # Easy, Medium, Hard first, then anything else
+        counts = counts.reindex(columns=[d for d in DIFFICULTIES if d in counts.columns]
+                                + [c for c in counts.columns if c not in DIFFICULTIES])
+    return counts.astype('int64')
+
+
+def under_covered(frame, minimum, dimension='concept', values=None, **filters):
+    """Values of ``dimension`` with fewer than ``minimum`` questions matching ``filters``.
+
+    ``values`` are the targets to check, by default those present in
+    ``frame`` (not every category the bank has ever had). Targets with no
+    matching question count as zero. Returns counts, lowest first.
+    """
+    if values is None:
+        values = frame[dimension].cat.remove_unused_categories().cat.categories
+    counts = select(frame, **filters)[dimension].value_counts().reindex(values, fill_value=0)
+    return counts[counts < minimum].sort_values(kind='stable')
+
+
+class BankFrame(BankView):
+    """The bank as a categorical DataFrame, one row per question, kept current through BankView."""
+
+    def __init__(self, store, max_age=None):
+        super().__init__(store, max_age=max_age)
+        self._reset()
+
+    def _reset(self):
+        self._frame = to_frame({})
+        self._added = {}  # parent key -> column lists, not yet in the frame
+        self._removed = set()
+
+    def _add(self, key, parent, questions):
+        if questions:
+            self._added[key] = rows_for(key[0], parent, questions)
+
+    def _remove(self, key):
+        self._added.pop(key, None)
+        self._removed.add(key)
+
+    def _finish_build(self):
+        self._apply()
+
+    def _apply(self):
+        frame = self._frame
+        if self._removed and len(frame):
+            frame = frame[~parent_mask(frame, self._removed)]
+        added = {column: [value for rows in self._added.values() for value in rows[column]] for column in COLUMNS}
+        frame = concat([frame, to_frame(added)])
+        if self._removed:
+            # Values only the removed questions used would linger as empty categories
+            for column in CATEGORICAL:
+                frame[column] = frame[column].cat.remove_unused_categories()
+        self._frame, self._added, self._removed = frame, {}, set()
+
+    def frame(self):
+        """The current frame; treat it as read-only, it is replaced rather than changed on writes."""
+        self.refresh()
+        with self._lock:
+            if self._added or self._removed:
+                self._apply()
+            return self._frame
+
+    def __len__(self):
+        return len(self.frame())
@@ -0,0 +1,186 @@
+"""Precomputed question-bank statistics for the "📈 Bank Statistics" page.
+
+Question counts by concept, difficulty, section and parent category, plus
+document counts and published/draft counts of scheduled tests, are kept in
+a summary split over ``SHARD_COUNT`` documents, ``bank_stats/summary`` and
+``bank_stats/summary_1`` onwards, each shaped like::
+
+    {'assessments': {'documents': 12, 'questions': 480,
+                     'concept': {'Python': 200, ...}, 'difficulty': {...},
+                     'section': {...}, 'category': {...}},
+     'upcoming_tests': {..., 'published': 3, 'draft': 1},
+     'updatedAt': ..., 'recomputedAt': ...}
+
+Every write the panel makes to the bank carries the change in these counts
+as ``Increment`` transforms in the same batch (see ``queue_stats``), so the
+summary stays current without rescans. Each batch increments one shard
+picked at random, so parallel importers, the scheduler and the panel do not
+all contend for a single document; ``load_summary`` adds the shards up in
+one batched read. Document counts can be cross-checked with ``count()``
+aggregations, and ``recompute`` rebuilds the summary from a full scan to
+repair drift, e.g. after writes made outside the panel.
+"""
+import random
+from collections import Counter
+
+from google.cloud.firestore import SERVER_TIMESTAMP, Increment
+
+from bank import BANK_COLLECTIONS, iter_bank
+
+STATS_COLLECTION = 'bank_stats'
+SUMMARY_ID = 'summary'
+# Spreads the Increments of concurrent writers; each shard takes about one write per second
+SHARD_COUNT = 8
+SHARD_IDS = (SUMMARY_ID,) + tuple(f'{SUMMARY_ID}_{n}' for n in range(1, SHARD_COUNT))
+DIMENSIONS = ('concept', 'difficulty', 'section')
+# Firestore field names cannot be empty
+NONE_KEY = '(none)'
+
+
+def stat_key(value):
+    key = str(value).strip() if value is not None else ''
+    if not key:
+        return NONE_KEY
+    # Names like __x__ are reserved by Firestore
+    if key.startswith('__') and key.endswith('__'):
+        return f"({key})"
+    return key
+
+
+def counts(collection, parent, questions):
+    """Summary entries contributed by one bank document, keyed by field path tuples."""
+    result = Counter()
+    if parent is None:
+        return result
+    result[('documents',)] += 1
+    if collection == 'upcoming_tests':
+        result[('published',) if parent.get('isPublished') else ('draft',)] += 1
+    category = stat_key(parent.get('category'))
+    for question in questions:
+        result[('questions',)] += 1
+        result[('category', category)] += 1
+        for dimension in DIMENSIONS:
+            result[(dimension, stat_key(question.get(dimension)))] += 1
+    return result
+
+
+def stats_delta(collection, before_parent, before_questions, after_parent, after_questions):
+    """Change in the summary when a document goes from ``before`` to ``after``.
+
+    Pass ``None`` as the parent for a document that does not exist on that side.
+    """
+    change = counts(collection, after_parent, after_questions)
+    change.subtract(counts(collection, before_parent, before_questions))
+    return change
+
+
+def increments(collection, change):
+    """``set(merge=True)`` payload applying ``change``; None when nothing changes."""
+    section = {}
+    for path, n in change.items():
+        if not n:
+            continue
+        if len(path) == 1:
+            section[path[0]] = Increment(n)
+        else:
+            section.setdefault(path[0], {})[path[1]] = Increment(n)
+    if not section:
+        return None
+    return {collection: section, 'updatedAt': SERVER_TIMESTAMP}
+
+
+def random_shard():
+    return random.choice(SHARD_IDS)
+
+
+def queue_stats(writer, collection, change):
+    """Queue ``change`` on a BatchWriter so it commits with the write it describes."""
+    payload = increments(collection, change)
+    if payload is not None:
+        writer.set(STATS_COLLECTION, random_shard(), payload, merge=True)
+
+
+def queue_pending(collection, change):
+    """``before_flush`` hook queuing ``change`` (a Counter) with each batch, then clearing it.
+
+    Bulk writers that span several batches add each item's change after
+    queuing its writes, so every batch carries the statistics of exactly
+    the writes committed with it.
+    """
+    def hook(writer):
+        queue_stats(writer, collection, change)
+        change.clear()
+    return hook
+
+
+def add_shards(total, shard):
+    """Add the counts of ``shard`` into ``total``; timestamps keep the latest."""
+    for key, value in shard.items():
+        if isinstance(value, dict):
+            add_shards(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+        elif value is not None and (total.get(key) is None or value > total[key]):
+            total[key] = value
+    return total
+
+
+def load_summary(data):
+    """The summary added up over its shards, or None before any statistics were written."""
+    shards = [shard for shard in data.get_documents(STATS_COLLECTION, SHARD_IDS).values() if shard]
+    if not shards:
+        return None
+    total = {}
+    for shard in shards:
+        shard.pop('id', None)
+        add_shards(total, shard)
+    return total
+
+
+def live_counts(data):
+    """Document counts straight from ``count()`` aggregations (a read per 1000 documents)."""
+    return {
+        'assessments': data.count('assessments'),
+        'upcoming_tests': data.count('upcoming_tests'),
+        'published': data.count('upcoming_tests', [('isPublished', '==', True)]),
+        'jobs': data.count('jobs'),
+    }
+
+
+def drift(summary, live):
+    """Names of counts where the summary disagrees with ``live_counts``."""
+    summary = summary or {}
+    tests = summary.get('upcoming_tests', {})
+    expected = {
+        'assessments': summary.get('assessments', {}).get('documents', 0),
+        'upcoming_tests': tests.get('documents', 0),
+        'published': tests.get('published', 0),
+    }
+    return [name for name, value in expected.items() if live[name] != value]
+
+
+def recompute(store, collections=BANK_COLLECTIONS):
+    """Rebuild the summary from a full scan of the bank and overwrite it.
+
+    The totals go to the first shard and the other shards are emptied in the same batch.
+    """
+    totals = {collection: Counter() for collection in collections}
+    for collection, parent, questions in iter_bank(store, collections=collections):
+        totals[collection].update(counts(collection, parent, questions))
+    summary = {'updatedAt': SERVER_TIMESTAMP, 'recomputedAt': SERVER_TIMESTAMP}
+    for collection, total in totals.items():
+        section = {'documents': 0, 'questions': 0, **{dimension: {} for dimension in DIMENSIONS},
+                   'category': {}}
+        if collection == 'upcoming_tests':
+            section.update(published=0, draft=0)
+        for path, n in total.items():
+            if len(path) == 1:
+                section[path[0]] = n
+            else:
+                section[path[0]][path[1]] = n
+        summary[collection] = section
+    with store.data.batch_writer() as writer:
+        writer.set(STATS_COLLECTION, SUMMARY_ID, summary)
+        for shard_id in SHARD_IDS[1:]:
+            writer.delete(STATS_COLLECTION, shard_id)
+    return summary
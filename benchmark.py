@@ -0,0 +1,312 @@
+"""Benchmark page reruns of the panel against an in-memory Firestore.
+
+Drives ``app.py`` headlessly with Streamlit's ``AppTest``; the client that
+``init_firebase()`` returns is swapped for a FakeFirestore seeded with a
+synthetic bank. For every bank size and scenario it records, per rerun,
+wall time, document reads/writes/deletes, bytes read and written, round
+trips and the size of the rendered element tree, plus the peak Python
+memory of one extra traced rerun. Results are written as JSON.
+
+    python benchmark.py                                  # 10, 1k, 10k and 100k questions
+    python benchmark.py --sizes 1000 --scenarios search --reruns 5 --output bench.json
+
+Settings read from the environment by the app (cache TTL, live mirror,
+question storage) apply here too and are recorded in the output.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+QUESTIONS_PER_ASSESSMENT = 50
+QUESTIONS_PER_TEST = 20
+# One scheduled test per this many assessments, one job per this many questions
+ASSESSMENTS_PER_TEST = 4
+QUESTIONS_PER_JOB = 100
+CONCEPTS = ['Python', 'SQL', 'Algorithms', 'Networks', 'Probability', 'Grammar', 'Logic', 'Statistics']
+WORDS = ('list tuple dict loop index join query table graph tree node edge packet route ratio '
+         'average percent series pattern clause verb noun tense syntax memory stack heap').split()
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+ENV_SETTINGS = ['INTELLITRAIN_CACHE_TTL', 'INTELLITRAIN_CACHE_SIZE', 'INTELLITRAIN_LIVE_MIRROR',
+                'INTELLITRAIN_QUESTION_STORAGE']
+
+
+# Synthetic bank
+
+def synthetic_question(rng, question_id, section):
+    words = rng.sample(WORDS, 8)
+    return {
+        'id': question_id,
+        'text': f"Which {words[0]} {' '.join(words[1:6])}?",
+        'options': [f"{w} {rng.randint(1, 999)}" for w in words[4:8]],
+        'correctOptionIndex': rng.randrange(4),
+        'concept': rng.choice(CONCEPTS),
+        'difficulty': rng.choice(DIFFICULTIES),
+        'section': section,
+    }
+
+
+def seed_bank(db, questions, seed=0, now=None):
+    """Seed ``db`` with ``questions`` assessment questions plus proportional tests and jobs."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    assessment_count = max(1, -(-questions // QUESTIONS_PER_ASSESSMENT))
+    assessments = {}
+    for a in range(1, assessment_count + 1):
+        count = min(QUESTIONS_PER_ASSESSMENT, questions - (a - 1) * QUESTIONS_PER_ASSESSMENT)
+        category = rng.choice(['Technical', 'Aptitude', 'Reasoning', 'Verbal'])
+        qs = [synthetic_question(rng, f'q_{a}_{i}', category) for i in range(1, count + 1)]
+        assessments[str(a)] = {'title': f"Assessment {a}", 'category': category, 'durationMinutes': 60,
+                               'questions': qs, 'questionCount': len(qs)}
+    tests = {}
+    for t in range(max(1, assessment_count // ASSESSMENTS_PER_TEST)):
+        start = now + timedelta(days=rng.randint(-30, 60), hours=rng.randint(0, 23))
+        qs = [synthetic_question(rng, f'uq_{t}_{i}', 'Technical') for i in range(1, QUESTIONS_PER_TEST + 1)]
+        tests[f'test_{t}'] = {'title': f"Scheduled test {t}", 'category': 'Technical', 'description': '',
+                              'startTime': start, 'endTime': start + timedelta(hours=2),
+                              'durationMinutes': 30, 'topics': rng.sample(CONCEPTS, 2),
+                              'isPublished': rng.random() < 0.7, 'questions': qs, 'questionCount': len(qs)}
+    jobs = {}
+    for j in range(max(1, questions // QUESTIONS_PER_JOB)):
+        jobs[f'job_{j}'] = {'title': f"Engineer {j}", 'company': f"Company {j % 50}",
+                            'location': 'Remote', 'type': 'Full-time',
+                            'link': f"https://www.linkedin.com/jobs/view/{1000000 + j}",
+                            'postedDate': 'Just now', 'timestamp': now - timedelta(minutes=j)}
+    db.seed('assessments', assessments)
+    db.seed('upcoming_tests', tests)
+    db.seed('jobs', jobs)
+    # The panel keeps the statistics summary current on every write; start from a recompute
+    from bank_stats import recompute
+    from data_layer import DataLayer
+    from question_store import QuestionStore
+    recompute(QuestionStore(DataLayer(db, ttl=0)))
+    return {'assessments': len(assessments), 'upcoming_tests': len(tests), 'jobs': len(jobs),
+            'questions': questions + len(tests) * QUESTIONS_PER_TEST}
+
+
+# Scenarios: sidebar page plus the interactions that put it in the state to measure
+
+def _open_first_assessment(at):
+    for checkbox in at.checkbox:
+        if checkbox.key and checkbox.key.startswith('show_questions_'):
+            checkbox.check()
+            return
+
+
+def _search(at):
+    at.text_input[0].input("which list")
+
+
+def _explore(at):
+    at.multiselect(key="explore_difficulty").set_value(["Hard"])
+
+
+SCENARIOS = {
+    'view_assessments': ("📋 View Assessments", None),
+    'view_questions': ("📋 View Assessments", _open_first_assessment),
+    'add_assessment': ("➕ Add Assessment", None),
+    'upcoming_tests': ("⏰ Upcoming Tests", None),
+    'edit_questions': ("✏️ Edit Questions", None),
+    'upload_csv': ("📊 Upload CSV", None),
+    'manage_jobs': ("💼 Manage Jobs", None),
+    'search': ("🔎 Search Questions", _search),
+    'explorer': ("🧭 Question Explorer", _explore),
+    'bank_stats': ("📈 Bank Statistics", None),
+}
+
+
+# Measurement
+
+def payload_bytes(node):
+    """Serialized size of the rendered element tree, a proxy for the websocket payload."""
+    size = 0
+    proto = getattr(node, 'proto', None)
+    if proto is not None and hasattr(proto, 'ByteSize'):
+        size += proto.ByteSize()
+    for child in getattr(node, 'children', {}).values():
+        size += payload_bytes(child)
+    return size
+
+
+def measure(db, at):
+    db.stats.reset()
+    started = time.perf_counter()
+    at.run()
+    wall_ms = (time.perf_counter() - started) * 1000
+    return {'wall_ms': round(wall_ms, 2), **db.stats.as_dict(),
+            'payload_bytes': payload_bytes(at._tree), 'exceptions': len(at.exception)}
+
+
+def run_scenario(db, page, setup, reruns, timeout):
+    """Cold run (fresh caches) then ``reruns`` warm reruns; returns per-run rows and traced peak memory."""
+    import firebase_client
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    runs = []
+    with mock.patch.object(firebase_client, 'resolve_credentials', return_value={'benchmark': True}), \
+            mock.patch.object(firebase_client, 'create_client', return_value=db):
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        # Navigate and interact, then measure the rerun those inputs trigger
+        at.run()
+        at.sidebar.radio[0].set_value(page)
+        if setup:
+            at.run()
+            setup(at)
+        # Cold: the client, data layer and indexes are rebuilt from scratch
+        st.cache_resource.clear()
+        runs.append({'run': 'cold', **measure(db, at)})
+        for i in range(reruns):
+            runs.append({'run': f'warm_{i + 1}', **measure(db, at)})
+        tracemalloc.start()
+        try:
+            at.run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return runs, peak
+
+
+def summarize(runs):
+    warm = [r for r in runs if r['run'] != 'cold'] or runs
+    return {
+        'cold_ms': runs[0]['wall_ms'],
+        'warm_median_ms': round(statistics.median(r['wall_ms'] for r in warm), 2),
+        'warm_reads': round(statistics.mean(r['reads'] for r in warm), 1),
+        'warm_bytes_read': round(statistics.mean(r['bytes_read'] for r in warm)),
+        'payload_bytes': warm[-1]['payload_bytes'],
+    }
+
+
+def startup_probe():
+    """Run in a fresh interpreter: time imports and the first run of the app, print JSON."""
+    started = time.perf_counter()
+    import firebase_client
+    from streamlit.testing.v1 import AppTest
+    from fake_firestore import FakeFirestore
+    imported = time.perf_counter()
+
+    db = FakeFirestore()
+    seed_bank(db, 10)
+    log_path = os.path.join(os.path.dirname(APP_PATH), f'.startup_probe_{os.getpid()}.jsonl')
+    os.environ['INTELLITRAIN_TRACE_LOG'] = log_path
+    try:
+        with mock.patch.object(firebase_client, 'resolve_credentials', return_value={'benchmark': True}), \
+                mock.patch.object(firebase_client, 'create_client', return_value=db):
+            at = AppTest.from_file(APP_PATH, default_timeout=600)
+            first = time.perf_counter()
+            at.run()
+            finished = time.perf_counter()
+        with open(log_path) as f:
+            report = next((r for r in map(json.loads, f) if r['type'] == 'startup'), {})
+    finally:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+    print(json.dumps({
+        'import_harness_ms': round((imported - started) * 1000, 2),
+        'first_run_ms': round((finished - first) * 1000, 2),
+        'app_first_render_ms': report.get('first_render_ms'),
+        'phases': report.get('phases', {}),
+        # Modules the first page loaded on its own, before background warm-up finished
+        'loaded_after_first_run': {m: m in sys.modules for m in ('pandas', 'numpy', 'firebase_admin')},
+        'exceptions': len(at.exception),
+    }))
+
+
+def run_startup(runs, log=print):
+    """Cold-start the app ``runs`` times, each in a fresh interpreter."""
+    results = []
+    for i in range(runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--startup-probe'],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        log(f"startup run {i + 1}: first run {result['first_run_ms']:.1f} ms "
+            f"(app {result['app_first_render_ms']} ms), phases {result['phases']}")
+        results.append(result)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP_PATH), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, scenarios, reruns=3, timeout=600, log=print):
+    from fake_firestore import FakeFirestore
+
+    results = []
+    for size in sizes:
+        for name in scenarios:
+            page, setup = SCENARIOS[name]
+            db = FakeFirestore()
+            counts = seed_bank(db, size)
+            runs, peak = run_scenario(db, page, setup, reruns, timeout)
+            summary = summarize(runs)
+            log(f"{size:>7} questions  {name:<17} cold {summary['cold_ms']:>9.1f} ms  "
+                f"warm {summary['warm_median_ms']:>9.1f} ms  reads {summary['warm_reads']:>8}  "
+                f"peak {peak / 1024:>9.0f} KiB")
+            results.append({'questions': size, 'scenario': name, 'page': page, 'bank': counts,
+                            'runs': runs, 'peak_memory_bytes': peak, 'summary': summary})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="question bank sizes to seed")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--reruns', type=int, default=3, help="warm reruns after the cold run")
+    parser.add_argument('--timeout', type=float, default=600, help="seconds allowed per script run")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    parser.add_argument('--startup', type=int, default=0, metavar='RUNS',
+                        help="instead of page reruns, cold-start the app RUNS times in fresh processes")
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.startup_probe:
+        startup_probe()
+        return
+
+    log = (lambda line: print(line, file=sys.stderr))
+    if args.startup:
+        results = {'startup': run_startup(args.startup, log=log)}
+        results['summary'] = {
+            'first_run_median_ms': statistics.median(r['first_run_ms'] for r in results['startup']),
+        }
+    else:
+        results = run_benchmarks(args.sizes, args.scenarios, reruns=args.reruns, timeout=args.timeout,
+                                 log=log)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'env': {name: os.environ[name] for name in ENV_SETTINGS if name in os.environ},
+            'reruns': args.reruns,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
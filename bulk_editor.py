@@ -0,0 +1,186 @@
+"""Grid-based bulk editing of an assessment's questions.
+
+The grid is a DataFrame with one row per question. Edits are staged in the
+grid, diffed against the snapshot that was loaded, and committed as a single
+atomic batch guarded by the parent document's ``update_time``, so an edit
+made by someone else in the meantime makes the commit fail instead of
+being overwritten.
+"""
+import pandas as pd
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+from bank_stats import STATS_COLLECTION, increments, random_shard, stats_delta
+from data_layer import stamp
+from question_store import (ConcurrentEditError, is_subcollection, new_question_id, question_doc_id,
+                            questions_path, strip_order)
+
+OPTION_COLUMNS = ['option_a', 'option_b', 'option_c', 'option_d']
+ANSWERS = ['A', 'B', 'C', 'D']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+GRID_COLUMNS = ['position', 'id', 'text'] + OPTION_COLUMNS + ['correct', 'concept', 'difficulty', 'section']
+# Firestore caps a batch at 500 writes; two are reserved for the statistics and parent documents
+MAX_DIFF_WRITES = 498
+
+
+class QuestionDiff:
+    def __init__(self, added, updated, deleted, reordered, questions):
+        self.added = added
+        self.updated = updated
+        self.deleted = deleted
+        self.reordered = reordered
+        self.questions = questions
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.deleted or self.reordered)
+
+    def summary(self):
+        parts = [f"{len(self.added)} added", f"{len(self.updated)} edited", f"{len(self.deleted)} deleted"]
+        if self.reordered:
+            parts.append("reordered")
+        return ", ".join(parts)
+
+
+def questions_to_frame(questions):
+    rows = []
+    for position, q in enumerate(questions, 1):
+        options = list(q.get('options', [])) + [''] * 4
+        rows.append({
+            'position': position,
+            'id': q.get('id'),
+            'text': q.get('text', ''),
+            **dict(zip(OPTION_COLUMNS, options[:4])),
+            'correct': ANSWERS[q.get('correctOptionIndex', 0)],
+            'concept': q.get('concept', ''),
+            'difficulty': q.get('difficulty', 'Easy'),
+            'section': q.get('section', ''),
+        })
+    return pd.DataFrame(rows, columns=GRID_COLUMNS)
+
+
+def _text(value):
+    return '' if pd.isna(value) else str(value).strip()
+
+
+def frame_to_questions(frame, id_prefix, default_section=''):
+    """Turn the edited grid back into question dicts, ordered by ``position``.
+
+    Returns ``(questions, errors)``. Rows left completely blank are ignored;
+    rows without an ID are new questions and get a fresh one.
+    """
+    frame = frame.copy()
+    frame['position'] = pd.to_numeric(frame['position'], errors='coerce')
+    # Rows without a position (typically just added) go to the end in grid order
+    frame['_row'] = range(len(frame))
+    frame = frame.sort_values(['position', '_row'], na_position='last')
+
+    questions, errors = [], []
+    for row in frame.to_dict('records'):
+        text = _text(row['text'])
+        options = [_text(row[c]) for c in OPTION_COLUMNS]
+        if not text and not any(options):
+            continue
+        label = _text(row['id']) or f"new row {row['_row'] + 1}"
+        if not text or not all(options):
+            errors.append(f"{label}: question text and all four options are required")
+        correct = _text(row['correct']).upper()
+        if correct not in ANSWERS:
+            errors.append(f"{label}: correct answer must be A, B, C or D")
+            correct = 'A'
+        difficulty = _text(row['difficulty'])
+        if difficulty not in DIFFICULTIES:
+            errors.append(f"{label}: difficulty must be Easy, Medium or Hard")
+        questions.append({
+            'id': _text(row['id']) or None,
+            'text': text,
+            'options': options,
+            'correctOptionIndex': ANSWERS.index(correct),
+            'concept': _text(row['concept']),
+            'difficulty': difficulty,
+            'section': _text(row['section']) or default_section,
+        })
+    for q in questions:
+        if q['id'] is None:
+            q['id'] = new_question_id(id_prefix, questions)
+    return questions, errors
+
+
+def compute_diff(original, edited):
+    """Minimal set of question changes turning ``original`` into ``edited``.
+
+    Fields the grid does not show are carried over from the original question.
+    """
+    before = {q['id']: q for q in original}
+    edited = [{**before.get(q['id'], {}), **q} for q in edited]
+    after_ids = [q['id'] for q in edited]
+    added = [q for q in edited if q['id'] not in before]
+    updated = [q for q in edited if q['id'] in before and q != before[q['id']]]
+    deleted = [qid for qid in before if qid not in set(after_ids)]
+    kept_before = [q['id'] for q in original if q['id'] in set(after_ids)]
+    kept_after = [qid for qid in after_ids if qid in before]
+    return QuestionDiff(added, updated, deleted, kept_before != kept_after, edited)
+
+
+class Baseline:
+    """Snapshot the grid is edited against: parent, questions, stored orders and update time."""
+
+    def __init__(self, parent, update_time, questions, orders):
+        self.parent = parent
+        self.update_time = update_time
+        self.questions = questions
+        self.orders = orders
+
+
+def load_baseline(store, collection, doc_id):
+    """Read the parent and its questions fresh, bypassing cached copies."""
+    parent, update_time = store.data.get_snapshot(collection, doc_id)
+    store.data.invalidate(questions_path(collection, doc_id))
+    raw = store.load(collection, doc_id, parent=parent, keep_order=True)
+    orders = {q['id']: q.get('order', i) for i, q in enumerate(raw)}
+    return Baseline(parent, update_time, [strip_order(q) for q in raw], orders)
+
+
+def commit_diff(data, collection, doc_id, baseline, diff):
+    """Apply ``diff`` in one batch, failing if the parent changed since ``baseline``.
+
+    Raises ConcurrentEditError when the update-time precondition fails and
+    ValueError when the diff does not fit in a single batch.
+    """
+    db = data.db
+    batch = db.batch()
+    parent_ref = db.collection(collection).document(str(doc_id))
+    precondition = db.write_option(last_update_time=baseline.update_time)
+
+    if not is_subcollection(baseline.parent):
+        parent_update = {'questions': diff.questions, 'questionCount': len(diff.questions)}
+    else:
+        path = questions_path(collection, doc_id)
+        changed = {q['id'] for q in diff.added + diff.updated}
+        writes = 0
+        for order, q in enumerate(diff.questions):
+            # Unchanged questions are rewritten only if their stored order must move
+            if q['id'] in changed or baseline.orders.get(q['id']) != order:
+                batch.set(db.collection(path).document(question_doc_id(q['id'])), {**q, 'order': order})
+                writes += 1
+        for qid in diff.deleted:
+            batch.delete(db.collection(path).document(question_doc_id(qid)))
+            writes += 1
+        if writes > MAX_DIFF_WRITES:
+            raise ValueError(f"{writes} question writes exceed one batch; commit in smaller steps")
+        parent_update = {'questionCount': len(diff.questions), 'questionsUpdatedAt': SERVER_TIMESTAMP}
+    stats = increments(collection, stats_delta(collection, baseline.parent, baseline.questions,
+                                               baseline.parent, diff.questions))
+    if stats is not None:
+        shard = random_shard()
+        batch.set(db.collection(STATS_COLLECTION).document(shard), stats, merge=True)
+    batch.update(parent_ref, stamp(collection, parent_update), option=precondition)
+    try:
+        results = batch.commit()
+    except FailedPrecondition as e:
+        data.invalidate(collection, doc_id)
+        raise ConcurrentEditError(str(e)) from e
+    # The parent write is always last in the batch
+    data.written(collection, doc_id, getattr(results[-1], 'update_time', None))
+    data.invalidate(questions_path(collection, doc_id))
+    if stats is not None:
+        data.written(STATS_COLLECTION, shard)
@@ -0,0 +1,236 @@
+"""Chunked, vectorized CSV ingestion for the "📊 Upload CSV" page.
+
+The file is read in chunks and each chunk is validated with column-wise
+operations. Every row is validated before anything is written, so the file
+is read twice: the first pass reports errors and notes the line of each
+assessment's last valid row, and the second pass buffers an assessment's
+rows only until that line, then queues its question array on a BatchWriter.
+Memory is bounded by the chunk size plus the assessments whose rows are
+still being read, not by the file.
+
+The duplicate check compares every row with every other row of the upload,
+so with a duplicate index all valid rows are held in memory at once (about
+the size of the valid part of the file as pandas strings).
+"""
+from collections import Counter
+
+import pandas as pd
+
+from bank_stats import queue_pending
+from question_store import is_subcollection, questions_path
+
+REQUIRED_COLUMNS = ['assessment_id', 'question_text', 'option_a', 'option_b', 'option_c',
+                    'option_d', 'correct_answer', 'concept', 'difficulty', 'section']
+OPTION_COLUMNS = ['option_a', 'option_b', 'option_c', 'option_d']
+VALID_ANSWERS = ['A', 'B', 'C', 'D']
+VALID_DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+DEFAULT_CHUNKSIZE = 10000
+
+
+class IngestReport:
+    def __init__(self):
+        self.rows = 0
+        self.valid_rows = 0
+        self.errors = []  # (csv line number, message)
+        self.updated = []
+        self.missing = []
+        self.duplicates = []  # (csv line number, kind, similarity, duplicate of)
+        self.skipped_duplicates = 0
+
+    @property
+    def invalid_rows(self):
+        """Rows skipped as invalid; a row can have several errors."""
+        return len({line for line, _ in self.errors})
+
+    def error_frame(self):
+        return pd.DataFrame(self.errors, columns=['line', 'error'])
+
+    def duplicate_frame(self):
+        return pd.DataFrame(self.duplicates, columns=['line', 'kind', 'similarity', 'duplicate_of'])
+
+
+def read_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    # Read everything as text so IDs like "04" and answers keep their exact form
+    return pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def check_columns(columns):
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+
+def validate_chunk(chunk):
+    """Normalize ``chunk`` and split it into ``(valid_rows, errors)``.
+
+    ``errors`` is a list of ``(line, message)`` pairs where ``line`` is the
+    1-based line in the CSV file (the header is line 1).
+    """
+    check_columns(chunk.columns)
+    chunk = chunk.copy()
+    for col in REQUIRED_COLUMNS:
+        chunk[col] = chunk[col].str.strip()
+    chunk['correct_answer'] = chunk['correct_answer'].str.upper()
+    chunk['difficulty'] = chunk['difficulty'].str.capitalize()
+
+    checks = [
+        (chunk['assessment_id'].eq(''), "assessment_id is empty"),
+        (chunk['question_text'].eq(''), "question_text is empty"),
+        (chunk[OPTION_COLUMNS].eq('').any(axis=1), "one or more options are empty"),
+        (~chunk['correct_answer'].isin(VALID_ANSWERS), "correct_answer must be A, B, C or D"),
+        (~chunk['difficulty'].isin(VALID_DIFFICULTIES), "difficulty must be Easy, Medium or Hard"),
+    ]
+    invalid = pd.Series(False, index=chunk.index)
+    errors = []
+    for mask, message in checks:
+        invalid |= mask
+        errors.extend((int(idx) + 2, message) for idx in chunk.index[mask])
+    errors.sort()
+    return chunk[~invalid], errors
+
+
+def questions_for_group(assessment_id, group):
+    correct_idx = group['correct_answer'].map(VALID_ANSWERS.index)
+    return [
+        {
+            'id': f'q_{assessment_id}_{idx}',
+            'text': text,
+            'options': [a, b, c, d],
+            'correctOptionIndex': int(correct),
+            'concept': concept,
+            'difficulty': difficulty,
+            'section': section,
+        }
+        for idx, text, a, b, c, d, correct, concept, difficulty, section in zip(
+            group.index, group['question_text'], group['option_a'], group['option_b'],
+            group['option_c'], group['option_d'], correct_idx, group['concept'],
+            group['difficulty'], group['section'])
+    ]
+
+
+def rewind(source):
+    """Ready ``source`` (a path or a seekable file) for another pass."""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def scan_rows(source, report, chunksize=DEFAULT_CHUNKSIZE, on_progress=None):
+    """First pass: validate ``source`` into ``report``; returns ``{assessment_id: index of its last valid row}``.
+
+    Assessments appear in the order of their first valid row.
+    """
+    last = {}
+    for chunk in read_chunks(source, chunksize=chunksize):
+        valid, errors = validate_chunk(chunk)
+        report.rows += len(chunk)
+        report.valid_rows += len(valid)
+        report.errors.extend(errors)
+        ends = valid.drop_duplicates('assessment_id', keep='last')
+        last.update(zip(ends['assessment_id'], ends.index))
+        if on_progress:
+            on_progress('read', report.rows, None)
+    return last
+
+
+def complete_groups(source, last, chunksize=DEFAULT_CHUNKSIZE):
+    """Second pass: yield ``(assessment_id, rows)`` once the last row of an assessment in ``last`` is read."""
+    pending = {}
+    for chunk in read_chunks(source, chunksize=chunksize):
+        valid, _ = validate_chunk(chunk)
+        valid = valid[valid['assessment_id'].isin(last.keys())]
+        for assessment_id, group in valid.groupby('assessment_id', sort=False):
+            pending.setdefault(assessment_id, []).append(group)
+            if group.index[-1] == last[assessment_id]:
+                yield assessment_id, pd.concat(pending.pop(assessment_id))
+
+
+def load_valid_rows(source, report, chunksize=DEFAULT_CHUNKSIZE, on_progress=None):
+    """Read and validate ``source`` chunk by chunk, keeping only valid rows."""
+    valid_chunks = []
+    for chunk in read_chunks(source, chunksize=chunksize):
+        valid, errors = validate_chunk(chunk)
+        report.rows += len(chunk)
+        report.valid_rows += len(valid)
+        report.errors.extend(errors)
+        valid_chunks.append(valid)
+        if on_progress:
+            on_progress('read', report.rows, None)
+    if not valid_chunks:
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    return pd.concat(valid_chunks)
+
+
+def flag_duplicates(rows, duplicates, report, skip):
+    """Record rows that repeat an earlier row or the bank; drop them if ``skip``."""
+    # The questions of the assessments being replaced are about to go away
+    replaced = [('assessments', aid) for aid in rows['assessment_id'].unique()]
+    flags = duplicates.check(rows, exclude_parents=replaced, row_label=lambda idx: f"Line {int(idx) + 2}")
+    flagged = flags[flags['kind'].notna()]
+    report.duplicates = [(int(idx) + 2, kind, round(similarity, 2), match) for idx, kind, similarity, match
+                         in zip(flagged.index, flagged['kind'], flagged['similarity'], flagged['duplicate_of'])]
+    if not skip:
+        return rows
+    report.skipped_duplicates = len(flagged)
+    return rows[flags['kind'].isna()]
+
+
+def ingest_csv(source, store, chunksize=DEFAULT_CHUNKSIZE, on_progress=None, duplicates=None,
+               skip_duplicates=False, dry_run=False):
+    """Validate ``source`` and replace the questions of every referenced assessment.
+
+    Assessments that do not exist are reported in ``report.missing`` and are
+    not created, matching the page's "create it first" rule. Questions are
+    written in whichever layout each assessment uses (see question_store).
+    With a ``duplicates`` index (see dedup), rows repeating an earlier row
+    or a question elsewhere in the bank are reported, and dropped when
+    ``skip_duplicates`` is set. ``dry_run`` stops before writing anything.
+    ``on_progress(phase, done, total)`` is called as rows are read, before
+    the duplicate check and as batches commit. ``source`` is a path or a
+    seekable file; without ``duplicates`` it is read twice.
+    """
+    report = IngestReport()
+    if duplicates is None:
+        last = scan_rows(source, report, chunksize=chunksize, on_progress=on_progress)
+        assessment_ids = list(last)
+    else:
+        # Rows are compared with each other, so the whole valid upload is held
+        rows = load_valid_rows(source, report, chunksize=chunksize, on_progress=on_progress)
+        if len(rows):
+            if on_progress:
+                on_progress('dedup', 0, None)
+            rows = flag_duplicates(rows, duplicates, report, skip_duplicates)
+        assessment_ids = list(rows['assessment_id'].unique())
+
+    data = store.data
+    # One get_all for every referenced assessment instead of a get() per ID
+    parents = data.get_documents('assessments', assessment_ids)
+    existing = {aid: parent for aid, parent in parents.items() if parent is not None}
+    report.missing = [aid for aid in assessment_ids if aid not in existing]
+    if dry_run:
+        return report
+    if duplicates is None:
+        groups = complete_groups(rewind(source), {aid: last[aid] for aid in existing}, chunksize=chunksize)
+    else:
+        groups = rows[rows['assessment_id'].isin(existing.keys())].groupby('assessment_id', sort=False)
+
+    # Question subcollections being replaced are listed concurrently up front
+    nested = [aid for aid, parent in existing.items() if is_subcollection(parent)]
+    listed = data.gather(lambda aid=aid: data.list_collection(questions_path('assessments', aid))
+                         for aid in nested)
+    current = dict(zip(nested, listed))
+
+    def committed(done, queued):
+        if on_progress:
+            on_progress('write', done, queued)
+
+    # Each batch carries the statistics of the assessments it completes
+    change = Counter()
+    with data.batch_writer(on_commit=committed, before_flush=queue_pending('assessments', change)) as writer:
+        for assessment_id, group in groups:
+            change.update(store.replace_questions(writer, 'assessments', assessment_id,
+                                                  existing[assessment_id],
+                                                  questions_for_group(assessment_id, group),
+                                                  current=current.get(assessment_id)))
+            report.updated.append(assessment_id)
+    return report
@@ -0,0 +1,596 @@
+"""Cached data-access layer around the Firestore client.
+
+Every page used to call ``db.collection(...).stream()`` on each rerun. The
+DataLayer keeps collection listings and single-document reads in a shared,
+TTL-bounded cache and drops exactly the affected entries whenever the app
+writes through it. Several documents are read with one ``get_all`` call, and
+independent loads can run side by side on a small shared thread pool.
+"""
+import contextvars
+import copy
+import operator
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from google.api_core import exceptions as gexc
+    TRANSIENT_ERRORS = (gexc.Aborted, gexc.DeadlineExceeded, gexc.ServiceUnavailable,
+                        gexc.ResourceExhausted, gexc.InternalServerError)
+    # Errors that can arrive after the commit was applied
+    AMBIGUOUS_ERRORS = (gexc.DeadlineExceeded, gexc.ServiceUnavailable, gexc.InternalServerError)
+except ImportError:  # pragma: no cover - google-cloud-firestore pulls this in
+    TRANSIENT_ERRORS = AMBIGUOUS_ERRORS = ()
+
+try:
+    from google.cloud.firestore import SERVER_TIMESTAMP, FieldFilter, Increment
+except ImportError:  # pragma: no cover
+    FieldFilter = SERVER_TIMESTAMP = Increment = None
+
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_FETCH_WORKERS = 8
+
+# Writes to these collections are stamped with ``updatedAt`` and deletes leave
+# a tombstone, so local snapshots (see local_snapshot) can sync incrementally
+SYNCED_COLLECTIONS = ('assessments', 'upcoming_tests', 'jobs')
+TOMBSTONE_COLLECTION = 'deleted_documents'
+
+# Documents requested per get_all call; larger sets are split and fetched concurrently
+MAX_GET_ALL = 300
+
+# Firestore rejects batches above 500 writes or 10 MiB; stay well inside both
+MAX_BATCH_OPS = 400
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+
+_MISSING = object()
+
+# Comparisons the live mirror can evaluate in memory for ``DataLayer.query``
+MIRROR_OPS = {'==': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Set inside pool threads so nested gather() calls run inline rather than
+# waiting for workers that are busy running their callers
+_in_fetch_pool = contextvars.ContextVar('intellitrain_fetch_pool', default=False)
+
+
+def _pooled(loader):
+    _in_fetch_pool.set(True)
+    return loader()
+
+
+def cache_settings():
+    # Tunable through the environment so deployments can trade freshness for reads
+    ttl = float(os.environ.get("INTELLITRAIN_CACHE_TTL", DEFAULT_CACHE_TTL))
+    size = int(os.environ.get("INTELLITRAIN_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    return ttl, size
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            expires, value = entry
+            if expires <= self._timer():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._timer() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def snapshot_to_dict(doc):
+    data = doc.to_dict() or {}
+    data['id'] = doc.id
+    return data
+
+
+def with_question_count(data):
+    # Listings project summary fields only, so keep a count next to the array
+    if isinstance(data.get('questions'), list):
+        return {**data, 'questionCount': len(data['questions'])}
+    return data
+
+
+def stamp(path, data):
+    """``data`` as written to ``path``: question count alongside the array, ``updatedAt`` when synced."""
+    data = with_question_count(data)
+    if path in SYNCED_COLLECTIONS:
+        data = {**data, 'updatedAt': SERVER_TIMESTAMP}
+    return data
+
+
+def tombstone(path, doc_id):
+    """``(tombstone_id, payload)`` recording the delete of ``path/doc_id``."""
+    return f"{path}:{doc_id}", {'collection': path, 'docId': str(doc_id), 'deletedAt': SERVER_TIMESTAMP}
+
+
+class DataLayer:
+    """Read-through cache over a Firestore client with write-through invalidation.
+
+    Cache keys are tuples whose first two items are the entry kind and the
+    collection path, e.g. ``('list', 'jobs')`` or ``('doc', 'assessments', '4')``.
+    Any write to a collection drops its listings and the written document only.
+    Returned values are copies, so callers may mutate them freely.
+
+    With a ``mirror`` (see live_mirror), reads of mirrored collections are
+    served from memory whenever the mirror is current, costing no reads.
+
+    ``subscribe(callback)`` registers ``callback(path, doc_id)`` to run after
+    every write made through the layer (and every change the mirror sees),
+    which lets derived in-memory indexes stay in sync incrementally.
+
+    ``get_documents`` reads many documents in one round trip, and
+    ``gather`` runs independent loads concurrently on at most
+    ``fetch_workers`` threads.
+    """
+
+    def __init__(self, db, ttl=DEFAULT_CACHE_TTL, maxsize=DEFAULT_CACHE_SIZE, mirror=None,
+                 fetch_workers=DEFAULT_FETCH_WORKERS):
+        self.db = db
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.mirror = mirror
+        self.fetch_workers = fetch_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._subscribers = []
+        if mirror is not None:
+            mirror.subscribe(self._notify)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _notify(self, path, doc_id):
+        for callback in list(self._subscribers):
+            callback(path, str(doc_id))
+
+    def _mirrored(self, path):
+        return self.mirror is not None and self.mirror.is_current(path)
+
+    # Concurrency
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.fetch_workers,
+                                                thread_name_prefix='intellitrain-fetch')
+            return self._pool
+
+    def gather(self, loaders):
+        """Run independent zero-argument ``loaders`` concurrently; results keep their order.
+
+        Each loader runs in a copy of the caller's context, so traced calls
+        are still attributed to the caller's rerun. Loaders that call
+        ``gather`` themselves run their inner loaders inline.
+        """
+        loaders = list(loaders)
+        if len(loaders) <= 1 or self.fetch_workers <= 1 or _in_fetch_pool.get():
+            return [loader() for loader in loaders]
+        pool = self._executor()
+        futures = [pool.submit(contextvars.copy_context().run, _pooled, loader) for loader in loaders]
+        return [future.result() for future in futures]
+
+    # Reads
+
+    def _cached(self, key, loader):
+        value = self.cache.get(key)
+        if value is _MISSING:
+            value = loader()
+            self.cache.set(key, value)
+        return copy.deepcopy(value)
+
+    def list_collection(self, path):
+        if self._mirrored(path):
+            return self.mirror.list(path)
+        def load():
+            return [snapshot_to_dict(doc) for doc in self.db.collection(path).stream()]
+        return self._cached(('list', path), load)
+
+    def iter_documents(self, path, page_size=500, filters=(), order_field='__name__'):
+        """Stream every document of ``path`` page by page without caching.
+
+        Meant for whole-collection scans (index builds, exports, snapshot
+        syncs) where keeping the full listing in the shared cache would
+        double memory use. ``filters`` and ``order_field`` narrow the scan
+        to e.g. documents changed since a point in time; pages then follow
+        ``order_field`` and are always read from Firestore.
+        """
+        filters = tuple(filters)
+        if self._mirrored(path) and not filters:
+            yield from self.mirror.list(path)
+            return
+        collection = self.db.collection(path)
+        base = collection
+        for field, op, value in filters:
+            base = base.where(filter=FieldFilter(field, op, value))
+        if order_field != '__name__':
+            base = base.order_by(order_field)
+        base = base.order_by('__name__')
+        cursor = None
+        while True:
+            query = base.limit(page_size)
+            if cursor is not None:
+                query = query.start_after(cursor)
+            rows = [snapshot_to_dict(doc) for doc in query.stream()]
+            yield from rows
+            if len(rows) < page_size:
+                return
+            cursor = [collection.document(rows[-1]['id'])]
+            if order_field != '__name__':
+                cursor.insert(0, rows[-1][order_field])
+
+    def list_summaries(self, path, fields):
+        """List ``path`` fetching only ``fields`` via a projection query."""
+        fields = tuple(fields)
+        if self._mirrored(path):
+            return self.mirror.list_summaries(path, fields)
+        def load():
+            query = self.db.collection(path).select(list(fields))
+            return [snapshot_to_dict(doc) for doc in query.stream()]
+        return self._cached(('select', path, fields), load)
+
+    def query_page(self, path, order_field, descending=False, page_size=20, cursor=None, fields=None):
+        """Fetch one page of ``path`` ordered server-side by ``order_field``.
+
+        ``cursor`` is the ``(value, doc_id)`` pair of the last row on the
+        previous page. Returns ``(rows, next_cursor)``; ``next_cursor`` is
+        None on the last page. Documents lacking ``order_field`` are skipped
+        by Firestore ordering; ``admin_cli.py backfill-order-fields`` gives
+        older jobs the field their listing uses and lists tests without one.
+        """
+        fields = tuple(fields) if fields else None
+        if self._mirrored(path):
+            return self.mirror.query_page(path, order_field, descending=descending,
+                                          page_size=page_size, cursor=cursor, fields=fields)
+        def load():
+            collection = self.db.collection(path)
+            direction = 'DESCENDING' if descending else 'ASCENDING'
+            query = collection
+            if fields:
+                query = query.select(list(fields))
+            if order_field != '__name__':
+                query = query.order_by(order_field, direction=direction)
+            query = query.order_by('__name__', direction=direction)
+            if cursor is not None:
+                value, doc_id = cursor
+                values = [collection.document(doc_id)]
+                if order_field != '__name__':
+                    values.insert(0, value)
+                query = query.start_after(values)
+            # One extra row tells us whether another page exists
+            rows = [snapshot_to_dict(doc) for doc in query.limit(page_size + 1).stream()]
+            next_cursor = None
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                last = rows[-1]
+                next_cursor = (last.get(order_field), last['id'])
+            return rows, next_cursor
+        return self._cached(('page', path, order_field, descending, page_size, cursor, fields), load)
+
+    def query(self, path, filters=(), order_field=None, limit=None):
+        """Fresh, uncached query: documents of ``path`` matching ``(field, op, value)`` filters.
+
+        Meant for work queues (e.g. the scheduler) that must see the latest
+        state. Documents lacking a filtered or ordered field never match.
+        """
+        filters = tuple(filters)
+        if self._mirrored(path) and self.mirror.live and all(op in MIRROR_OPS for _, op, _ in filters):
+            def matches(row):
+                try:
+                    return all(field in row and MIRROR_OPS[op](row[field], value)
+                               for field, op, value in filters)
+                except TypeError:
+                    return False
+            rows = [row for row in self.mirror.list(path) if matches(row)]
+            if order_field:
+                rows = sorted((row for row in rows if row.get(order_field) is not None),
+                              key=lambda row: (row[order_field], row['id']))
+            return rows[:limit] if limit is not None else rows
+        query = self.db.collection(path)
+        for field, op, value in filters:
+            query = query.where(filter=FieldFilter(field, op, value))
+        if order_field:
+            query = query.order_by(order_field).order_by('__name__')
+        if limit is not None:
+            query = query.limit(limit)
+        return [snapshot_to_dict(doc) for doc in query.stream()]
+
+    def count(self, path, filters=()):
+        """Number of documents in ``path`` matching ``(field, '==', value)`` filters.
+
+        Runs a server-side ``count()`` aggregation, billed one read per 1000
+        documents counted, and caches it like a listing.
+        """
+        filters = tuple(filters)
+        if self._mirrored(path):
+            return sum(1 for row in self.mirror.list(path)
+                       if all(row.get(field) == value for field, _, value in filters))
+        def load():
+            query = self.db.collection(path)
+            for field, op, value in filters:
+                query = query.where(filter=FieldFilter(field, op, value))
+            return query.count().get()[0][0].value
+        return self._cached(('count', path, filters), load)
+
+    def get_document(self, path, doc_id):
+        if self._mirrored(path):
+            return self.mirror.get(path, doc_id)
+        def load():
+            doc = self.db.collection(path).document(str(doc_id)).get()
+            return snapshot_to_dict(doc) if doc.exists else None
+        return self._cached(('doc', path, str(doc_id)), load)
+
+    def get_documents(self, path, doc_ids):
+        """Read several documents of ``path``; returns ``{doc_id: data or None}``.
+
+        Cached (or mirrored) documents cost nothing. The rest are fetched with
+        ``get_all``, one call per ``MAX_GET_ALL`` IDs, and cached one by one
+        so later ``get_document`` calls hit the cache.
+        """
+        doc_ids = list(dict.fromkeys(str(doc_id) for doc_id in doc_ids))
+        if self._mirrored(path):
+            return {doc_id: self.mirror.get(path, doc_id) for doc_id in doc_ids}
+        found = {}
+        missing = []
+        for doc_id in doc_ids:
+            value = self.cache.get(('doc', path, doc_id))
+            if value is _MISSING:
+                missing.append(doc_id)
+            else:
+                found[doc_id] = copy.deepcopy(value)
+        collection = self.db.collection(path)
+
+        def load(chunk):
+            loaded = dict.fromkeys(chunk)
+            for doc in self.db.get_all([collection.document(doc_id) for doc_id in chunk]):
+                if doc.exists:
+                    loaded[doc.id] = snapshot_to_dict(doc)
+            return loaded
+
+        chunks = [missing[i:i + MAX_GET_ALL] for i in range(0, len(missing), MAX_GET_ALL)]
+        for loaded in self.gather(lambda chunk=chunk: load(chunk) for chunk in chunks):
+            for doc_id, value in loaded.items():
+                self.cache.set(('doc', path, doc_id), value)
+                found[doc_id] = copy.deepcopy(value)
+        return {doc_id: found[doc_id] for doc_id in doc_ids}
+
+    def get_snapshot(self, path, doc_id):
+        """Fresh, uncached read returning ``(data, update_time)``.
+
+        Used where a write needs an ``update_time`` precondition. The result
+        also refreshes the cached copy of the document.
+        """
+        doc = self.db.collection(path).document(str(doc_id)).get()
+        value = snapshot_to_dict(doc) if doc.exists else None
+        self.cache.set(('doc', path, str(doc_id)), value)
+        return copy.deepcopy(value), (doc.update_time if doc.exists else None)
+
+    # Writes
+
+    def set_document(self, path, doc_id, data, merge=False):
+        result = self.db.collection(path).document(str(doc_id)).set(stamp(path, data), merge=merge)
+        self.written(path, doc_id, getattr(result, 'update_time', None))
+
+    def update_document(self, path, doc_id, data):
+        result = self.db.collection(path).document(str(doc_id)).update(stamp(path, data))
+        self.written(path, doc_id, getattr(result, 'update_time', None))
+
+    def add_document(self, path, data):
+        update_time, doc_ref = self.db.collection(path).add(stamp(path, data))
+        self.written(path, doc_ref.id, update_time)
+        return doc_ref.id
+
+    def new_document_id(self, path):
+        # Auto-generated ID for writes that must be batched instead of add()
+        return self.db.collection(path).document().id
+
+    def delete_document(self, path, doc_id):
+        # Batched so the tombstone commits with the delete
+        with self.batch_writer() as writer:
+            writer.delete(path, doc_id)
+
+    # Invalidation
+
+    def written(self, path, doc_id, update_time=None, deleted=False):
+        """Bookkeeping after a committed write: drop cached copies, hold back the mirror."""
+        self.invalidate(path, doc_id)
+        if self.mirror is not None:
+            self.mirror.expect(path, doc_id, update_time=update_time, deleted=deleted)
+        self._notify(path, doc_id)
+
+    def invalidate(self, path, doc_id=None):
+        """Drop every listing of ``path`` and, if given, the cached ``doc_id``."""
+        doc_key = ('doc', path, str(doc_id)) if doc_id is not None else None
+        self.cache.invalidate_where(
+            lambda key: key == doc_key or (key[0] != 'doc' and key[1] == path)
+        )
+
+    def batch_writer(self, **kwargs):
+        return BatchWriter(self, **kwargs)
+
+
+def has_increment(value):
+    """Whether a write payload carries an ``Increment`` transform anywhere."""
+    if Increment is not None and isinstance(value, Increment):
+        return True
+    if isinstance(value, dict):
+        return any(has_increment(v) for v in value.values())
+    return False
+
+
+def estimate_size(value):
+    """Rough serialized size of a Firestore value, used to keep batches under the limit."""
+    if isinstance(value, dict):
+        return sum(len(str(k)) + estimate_size(v) for k, v in value.items()) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 2
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    return 8
+
+
+class BatchWriter:
+    """BulkWriter-style helper that groups writes into WriteBatch commits.
+
+    Operations are queued and committed whenever the pending batch reaches
+    ``max_ops`` writes or ``max_bytes`` of payload. Transient failures are
+    retried with exponential backoff and jitter by replaying the same
+    operations. Plain set/update/delete are idempotent, but ``Increment``
+    transforms (bank statistics, ``questionCount``) are not: a batch holding
+    one is only retried after errors that prove it was not applied, and an
+    ambiguous error (deadline, unavailable, internal) is raised instead, after
+    invalidating every document of the batch. Cache entries for every
+    committed document are invalidated through the layer.
+
+    ``before_flush(writer)`` is called before each commit and may queue more
+    writes into that batch, e.g. the statistics change of the writes already
+    in it (see bank_stats.queue_pending). ``on_commit(committed, queued)`` is
+    called after each successful commit and can be used to drive a progress
+    bar. ``max_rate`` caps the average
+    writes per second by pausing before a commit that would exceed it. With
+    ``dry_run`` nothing is committed.
+    """
+
+    def __init__(self, data, max_ops=MAX_BATCH_OPS, max_bytes=MAX_BATCH_BYTES,
+                 max_retries=5, base_delay=0.5, on_commit=None, dry_run=False, max_rate=None,
+                 before_flush=None, sleep=time.sleep, timer=time.monotonic):
+        self.data = data
+        self.max_ops = max_ops
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.on_commit = on_commit
+        self.before_flush = before_flush
+        self._in_hook = False
+        self.dry_run = dry_run
+        self.max_rate = max_rate
+        self._sleep = sleep
+        self._timer = timer
+        self._started = None
+        self._pending = []
+        self._pending_bytes = 0
+        self.queued = 0
+        self.committed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def set(self, path, doc_id, payload, merge=False):
+        self._queue(('set', path, str(doc_id), stamp(path, payload), merge))
+
+    def update(self, path, doc_id, payload, last_update_time=None):
+        """Queue an update; with ``last_update_time`` the batch fails with FailedPrecondition if the document changed."""
+        self._queue(('update', path, str(doc_id), stamp(path, payload), last_update_time))
+
+    def delete(self, path, doc_id):
+        ops = [('delete', path, str(doc_id), None, None)]
+        if path in SYNCED_COLLECTIONS:
+            ops.append(('set', TOMBSTONE_COLLECTION, *tombstone(path, doc_id), False))
+        # A delete and its tombstone always commit in the same batch
+        self._queue(*ops)
+
+    def _queue(self, *ops):
+        size = sum(estimate_size(op[3]) for op in ops if op[3] is not None)
+        # Writes queued by before_flush join the batch being flushed; MAX_BATCH_OPS leaves room
+        if self._pending and not self._in_hook and (len(self._pending) + len(ops) > self.max_ops
+                                                    or self._pending_bytes + size > self.max_bytes):
+            self.flush()
+        self._pending.extend(ops)
+        self._pending_bytes += size
+        self.queued += len(ops)
+
+    def _build_batch(self, ops):
+        db = self.data.db
+        batch = db.batch()
+        for kind, path, doc_id, payload, extra in ops:
+            ref = db.collection(path).document(doc_id)
+            if kind == 'set':
+                batch.set(ref, payload, merge=extra)
+            elif kind == 'update' and extra is not None:
+                batch.update(ref, payload, option=db.write_option(last_update_time=extra))
+            elif kind == 'update':
+                batch.update(ref, payload)
+            else:
+                batch.delete(ref)
+        return batch
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.before_flush:
+            self._in_hook = True
+            try:
+                self.before_flush(self)
+            finally:
+                self._in_hook = False
+        ops, self._pending, self._pending_bytes = self._pending, [], 0
+        if self.dry_run:
+            return
+        if self.max_rate:
+            if self._started is None:
+                self._started = self._timer()
+            delay = self._started + self.committed / self.max_rate - self._timer()
+            if delay > 0:
+                self._sleep(delay)
+        replayable = not any(has_increment(op[3]) for op in ops)
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = self._build_batch(ops).commit()
+                break
+            except TRANSIENT_ERRORS as e:
+                if not replayable and isinstance(e, AMBIGUOUS_ERRORS):
+                    # The batch may have been applied: forget cached copies and let views re-read
+                    for _, path, doc_id, _, _ in ops:
+                        self.data.invalidate(path, doc_id)
+                        self.data._notify(path, doc_id)
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                delay = self.base_delay * (2 ** attempt)
+                self._sleep(delay + random.uniform(0, delay))
+        for (kind, path, doc_id, _, _), result in zip(ops, results):
+            self.data.written(path, doc_id, getattr(result, 'update_time', None), deleted=kind == 'delete')
+        self.committed += len(ops)
+        if self.on_commit:
+            self.on_commit(self.committed, self.queued)
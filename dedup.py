@@ -0,0 +1,330 @@
+"""Exact and near-duplicate detection for questions.
+
+Question text and options are normalized (case, punctuation, whitespace and
+option order) and hashed to find exact duplicates. Near-duplicates are found
+with MinHash signatures over word shingles and locality-sensitive hashing:
+each signature is cut into bands, and only questions sharing a band bucket
+are compared, so no step compares every pair of questions. Every step works
+column-wise over a DataFrame with one row per question.
+"""
+import numpy as np
+import pandas as pd
+
+from bank import BankView
+from csv_ingest import OPTION_COLUMNS
+
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a bucket
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Bounds the candidates taken from one bucket, so a question copied many times stays cheap
+MAX_BUCKET_CANDIDATES = 32
+EXACT = 'exact'
+NEAR = 'near'
+# Punctuation that does not change a question; symbols like + and # are kept ("C" vs "C++")
+PUNCTUATION_RE = r"[.,;:!?'\"`()\[\]{}]"
+
+# One multiply-add hash per permutation; odd multipliers keep it a bijection mod 2**64
+_rng = np.random.default_rng(9001)
+_MULTIPLIERS = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+_HIGH_BITS = np.uint64(32)
+
+
+def _mix(values):
+    # MurmurHash3 finalizer; uint64 array arithmetic wraps around
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xff51afd7ed558ccd)
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xc4ceb9fe1a85ec53)
+    return values ^ (values >> np.uint64(33))
+
+
+def normalize(series):
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return (series.fillna('').astype(str).str.lower()
+            .str.replace(PUNCTUATION_RE, ' ', regex=True)
+            .str.replace(r'\s+', ' ', regex=True).str.strip())
+
+
+def question_frame(questions):
+    """Question dicts as a frame with the upload columns the fingerprints read."""
+    rows = [[q.get('text', '')] + (list(q.get('options', [])) + [''] * 4)[:4] for q in questions]
+    return pd.DataFrame(rows, columns=['question_text'] + OPTION_COLUMNS)
+
+
+def fingerprints(frame):
+    """Exact-match hashes ``(n,)`` and MinHash signatures ``(n, NUM_PERM)`` of ``frame``'s rows."""
+    text = normalize(frame['question_text']).reset_index(drop=True)
+    # Options are compared as a set, so shuffled options are still a duplicate
+    options = pd.DataFrame(np.sort(np.column_stack(
+        [normalize(frame[c]).to_numpy(dtype=object) for c in OPTION_COLUMNS]), axis=1))
+    key = text.str.cat([options[i] for i in range(len(OPTION_COLUMNS))], sep='\x1f')
+    hashes = pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+    # Shingles: words and word pairs of the text, plus the option set as one shingle
+    words = text.str.split().explode().dropna()
+    pairs = (words + ' ' + words.groupby(level=0).shift(-1)).dropna()
+    option_set = '\x1f' + options[0].str.cat([options[i] for i in range(1, len(OPTION_COLUMNS))], sep='\x1f')
+    shingles = pd.concat([words, pairs, option_set])
+    rows = shingles.index.to_numpy(dtype=np.int64)
+    hashed = pd.util.hash_array(shingles.to_numpy(dtype=object), categorize=False)
+    order = np.argsort(rows, kind='stable')
+    rows, hashed = rows[order], hashed[order]
+
+    signatures = np.empty((len(text), NUM_PERM), dtype=np.uint32)
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    for i in range(NUM_PERM):
+        permuted = hashed * _MULTIPLIERS[i] + _OFFSETS[i]
+        signatures[:, i] = np.minimum.reduceat(permuted, starts) >> _HIGH_BITS
+    return hashes, signatures
+
+
+def lookup_keys(hashes, signatures):
+    """The exact hash followed by one LSH key per band, shape ``(n, 1 + BANDS)``."""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    keys = np.zeros((len(signatures), BANDS), dtype=np.uint64)
+    for r in range(ROWS_PER_BAND):
+        keys = _mix(keys ^ bands[:, :, r])
+    return np.column_stack([hashes, keys])
+
+
+class SignatureIndex:
+    """Hashes and signatures of a set of questions, looked up through sorted key tables.
+
+    Rows are numbered in insertion order. Discarded rows stay in the arrays
+    but never match; ``compact()`` drops them. The sorted tables are rebuilt
+    lazily on the first match after rows were appended.
+    """
+
+    def __init__(self):
+        self._chunks = []  # (hashes, signatures, keys) appended since the last consolidation
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._keys = np.empty((0, 1 + BANDS), dtype=np.uint64)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._tables = None
+
+    @property
+    def size(self):
+        return self._size
+
+    def dead(self):
+        self._consolidate()
+        return int((~self._alive).sum())
+
+    def append(self, hashes, signatures):
+        start = self._size
+        self._chunks.append((hashes, signatures, lookup_keys(hashes, signatures)))
+        self._size += len(hashes)
+        self._tables = None
+        return range(start, self._size)
+
+    def discard(self, rows):
+        self._consolidate()
+        self._alive[np.asarray(rows, dtype=np.int64)] = False
+
+    def compact(self):
+        """Drop discarded rows; returns the old row number of every kept row."""
+        self._consolidate()
+        kept = np.flatnonzero(self._alive)
+        self._hashes = self._hashes[kept]
+        self._signatures = self._signatures[kept]
+        self._keys = self._keys[kept]
+        self._alive = np.ones(len(kept), dtype=bool)
+        self._size = len(kept)
+        self._tables = None
+        return kept
+
+    def _consolidate(self):
+        if not self._chunks:
+            return
+        hashes, signatures, keys = zip(*self._chunks)
+        added = sum(len(h) for h in hashes)
+        self._hashes = np.concatenate([self._hashes, *hashes])
+        self._signatures = np.concatenate([self._signatures, *signatures])
+        self._keys = np.concatenate([self._keys, *keys])
+        self._alive = np.concatenate([self._alive, np.ones(added, dtype=bool)])
+        self._chunks = []
+
+    def _lookup_tables(self):
+        self._consolidate()
+        if self._tables is None:
+            self._tables = []
+            for column in self._keys.T:
+                order = np.argsort(column, kind='stable')
+                self._tables.append((order, column[order]))
+        return self._tables
+
+    def match(self, hashes, signatures, skip=None, earlier_only=False):
+        """Best indexed match of each query row.
+
+        Returns ``(rows, similarity, exact)`` arrays, with ``rows`` -1 where
+        nothing reaches NEAR_DUPLICATE_THRESHOLD. ``skip`` masks indexed rows
+        to ignore; ``earlier_only`` keeps only rows numbered below the query
+        row, for matching a set of questions against itself.
+        """
+        n = len(hashes)
+        best = np.full(n, -1, dtype=np.int64)
+        best_similarity = np.zeros(n)
+        best_exact = np.zeros(n, dtype=bool)
+        if not n or not self._size:
+            return best, best_similarity, best_exact
+
+        # Candidate pairs: any query/row sharing the exact hash or a band bucket
+        query_keys = lookup_keys(hashes, signatures)
+        found_q, found_r = [], []
+        for column, (order, sorted_keys) in enumerate(self._lookup_tables()):
+            left = np.searchsorted(sorted_keys, query_keys[:, column], 'left')
+            right = np.searchsorted(sorted_keys, query_keys[:, column], 'right')
+            counts = np.minimum(right - left, MAX_BUCKET_CANDIDATES)
+            total = int(counts.sum())
+            if not total:
+                continue
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            found_q.append(np.repeat(np.arange(n), counts))
+            found_r.append(order[np.repeat(left, counts) + within])
+        if not found_q:
+            return best, best_similarity, best_exact
+        q, r = np.divmod(np.unique(np.concatenate(found_q) * self._size + np.concatenate(found_r)),
+                         self._size)
+
+        keep = self._alive[r]
+        if skip is not None:
+            keep &= ~skip[r]
+        if earlier_only:
+            keep &= r < q
+        q, r = q[keep], r[keep]
+        exact = hashes[q] == self._hashes[r]
+        similarity = np.where(exact, 1.0, (signatures[q] == self._signatures[r]).mean(axis=1))
+        keep = exact | (similarity >= NEAR_DUPLICATE_THRESHOLD)
+        q, r, exact, similarity = q[keep], r[keep], exact[keep], similarity[keep]
+
+        # Per query: exact matches first, then the most similar, then the earliest row
+        order = np.lexsort((r, -similarity, ~exact, q))
+        q, r, exact, similarity = q[order], r[order], exact[order], similarity[order]
+        first = np.r_[True, q[1:] != q[:-1]] if len(q) else np.zeros(0, dtype=bool)
+        best[q[first]] = r[first]
+        best_similarity[q[first]] = similarity[first]
+        best_exact[q[first]] = exact[first]
+        return best, best_similarity, best_exact
+
+
+class DuplicateIndex(BankView):
+    """SignatureIndex over every question in the bank, kept current through BankView."""
+
+    def __init__(self, store, max_age=None):
+        super().__init__(store, max_age=max_age)
+        self._reset()
+
+    def _reset(self):
+        self._index = SignatureIndex()
+        self._refs = []  # row -> (collection, parent_id, position, parent title, question text)
+        self._rows_by_parent = {}
+        # The initial scan is fingerprinted in one vectorized pass at the end
+        self._pending = []
+        self._building = True
+
+    def __len__(self):
+        return self._index.size - self._index.dead()
+
+    def _add(self, key, parent, questions):
+        if not questions:
+            return
+        title = parent.get('title', key[1])
+        refs = [(key[0], key[1], position, title, q.get('text', ''))
+                for position, q in enumerate(questions, 1)]
+        if self._building:
+            self._pending.append((key, refs, questions))
+            return
+        self._append([(key, refs)], question_frame(questions))
+
+    def _finish_build(self):
+        pending, self._pending = self._pending, []
+        self._building = False
+        if pending:
+            self._append([(key, refs) for key, refs, _ in pending],
+                         question_frame([q for _, _, questions in pending for q in questions]))
+
+    def _append(self, groups, frame):
+        rows = self._index.append(*fingerprints(frame))
+        start = rows.start
+        for key, refs in groups:
+            self._rows_by_parent[key] = range(start, start + len(refs))
+            self._refs.extend(refs)
+            start += len(refs)
+
+    def _remove(self, key):
+        rows = self._rows_by_parent.pop(key, None)
+        if not rows:
+            return
+        self._index.discard(rows)
+        # Edited documents leave discarded rows behind; renumber once they dominate
+        if self._index.dead() > max(1000, self._index.size // 2):
+            kept = self._index.compact()
+            new_row = {old: new for new, old in enumerate(kept.tolist())}
+            self._refs = [self._refs[old] for old in kept.tolist()]
+            self._rows_by_parent = {
+                parent: range(new_row[r.start], new_row[r.start] + len(r))
+                for parent, r in self._rows_by_parent.items()
+            }
+
+    def check(self, frame, exclude_parents=(), row_label=str):
+        """Flag rows of ``frame`` that repeat an earlier row or a question already in the bank.
+
+        ``frame`` has the upload columns ``question_text`` and
+        ``option_a``..``option_d``. Returns a frame aligned with it with
+        ``kind`` (``'exact'``, ``'near'`` or None), ``similarity`` and
+        ``duplicate_of``. Questions of ``exclude_parents`` (``(collection,
+        parent_id)`` pairs) are ignored, e.g. the ones an upload replaces.
+        """
+        self.refresh()
+        result = pd.DataFrame({'kind': None, 'similarity': np.nan, 'duplicate_of': None},
+                              index=frame.index, dtype=object)
+        if frame.empty:
+            return result
+        hashes, signatures = fingerprints(frame)
+
+        own = SignatureIndex()
+        own.append(hashes, signatures)
+        file_rows, file_similarity, file_exact = own.match(hashes, signatures, earlier_only=True)
+
+        with self._lock:
+            skip = np.zeros(self._index.size, dtype=bool)
+            for parent in exclude_parents:
+                rows = self._rows_by_parent.get(parent)
+                if rows:
+                    skip[rows.start:rows.stop] = True
+            bank_rows, bank_similarity, bank_exact = self._index.match(hashes, signatures, skip=skip)
+            refs = {r: self._refs[r] for r in set(bank_rows[bank_rows >= 0].tolist())}
+
+        labels = frame.index.tolist()
+        kinds, similarities, matches = [], [], []
+        # A question already in the bank is reported against the bank copy
+        for i in range(len(frame)):
+            if bank_rows[i] >= 0:
+                collection, parent_id, position, title, text = refs[int(bank_rows[i])]
+                kinds.append(EXACT if bank_exact[i] else NEAR)
+                similarities.append(float(bank_similarity[i]))
+                matches.append(f"{collection}/{parent_id} ({title}) Q{position}: {text[:80]}")
+            elif file_rows[i] >= 0:
+                kinds.append(EXACT if file_exact[i] else NEAR)
+                similarities.append(float(file_similarity[i]))
+                matches.append(f"{row_label(labels[file_rows[i]])} of this upload")
+            else:
+                kinds.append(None)
+                similarities.append(np.nan)
+                matches.append(None)
+        result['kind'] = kinds
+        result['similarity'] = similarities
+        result['duplicate_of'] = matches
+        return result
+
+    def check_question(self, question):
+        """``(kind, similarity, duplicate_of)`` for one question, or None if it is new."""
+        row = self.check(question_frame([question])).iloc[0]
+        if row['kind'] is None:
+            return None
+        return row['kind'], float(row['similarity']), row['duplicate_of']
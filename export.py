@@ -0,0 +1,197 @@
+"""Streaming exports of the question bank, scheduled tests and jobs.
+
+Usage:
+    python export.py assessments --output bank.csv
+    python export.py jobs --format parquet --output jobs.parquet
+    python export.py upcoming_test_questions --output test_questions.csv
+
+Collections are read page by page with cursor queries and written
+``chunk_rows`` rows at a time, so memory stays bounded by one page and one
+chunk whatever the collection size. The ``assessments`` export has one row
+per question in the "📊 Upload CSV" column layout and can be uploaded again
+as is; ``upcoming_tests`` and ``jobs`` have one row per document, and
+``upcoming_test_questions`` one row per question of a scheduled test, keyed
+by ``test_id``, so tests can be restored with their questions. Parquet needs
+``pyarrow``.
+"""
+import argparse
+import csv
+import io
+from datetime import datetime, timezone
+from itertools import islice
+
+from bank import iter_bank
+from csv_ingest import REQUIRED_COLUMNS, VALID_ANSWERS
+from data_layer import DataLayer
+from firebase_client import client_from_environment
+from question_store import QuestionStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - Parquet is optional
+    pa = pq = None
+
+CSV = 'csv'
+PARQUET = 'parquet'
+DEFAULT_CHUNK_ROWS = 5000
+
+# Column -> kind; kinds decide the Parquet type and how values are normalized
+DATASETS = {
+    'assessments': {column: 'str' for column in REQUIRED_COLUMNS},
+    'upcoming_tests': {'id': 'str', 'title': 'str', 'category': 'str', 'description': 'str',
+                       'startTime': 'time', 'endTime': 'time', 'durationMinutes': 'int',
+                       'topics': 'str', 'isPublished': 'bool', 'questionCount': 'int'},
+    'upcoming_test_questions': {'test_id': 'str', 'question_id': 'str',
+                                **{column: 'str' for column in REQUIRED_COLUMNS if column != 'assessment_id'}},
+    'jobs': {'id': 'str', 'title': 'str', 'company': 'str', 'location': 'str', 'type': 'str',
+             'mode': 'str', 'link': 'str', 'description': 'str', 'postedDate': 'str',
+             'timestamp': 'time'},
+}
+MIME_TYPES = {CSV: 'text/csv', PARQUET: 'application/vnd.apache.parquet'}
+
+
+def formats():
+    return [CSV, PARQUET] if pq is not None else [CSV]
+
+
+def normalize(kind, value):
+    """Coerce a Firestore value to ``kind``; values that do not fit become None."""
+    if value is None:
+        return None
+    if kind == 'time':
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                return None
+        return value.astimezone(timezone.utc) if isinstance(value, datetime) else None
+    if kind == 'int':
+        return int(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    if kind == 'bool':
+        return bool(value)
+    if isinstance(value, (list, tuple)):
+        # Topics are entered comma separated, so export them the same way
+        return ', '.join(map(str, value))
+    return str(value)
+
+
+def question_row(assessment_id, question):
+    options = [str(o) for o in question.get('options', [])][:4]
+    options += [''] * (4 - len(options))
+    correct = question.get('correctOptionIndex')
+    return {
+        'assessment_id': assessment_id,
+        'question_text': question.get('text', ''),
+        'option_a': options[0],
+        'option_b': options[1],
+        'option_c': options[2],
+        'option_d': options[3],
+        'correct_answer': VALID_ANSWERS[correct] if isinstance(correct, int) and 0 <= correct < 4 else '',
+        'concept': question.get('concept', ''),
+        'difficulty': question.get('difficulty', ''),
+        'section': question.get('section', ''),
+    }
+
+
+def iter_rows(store, dataset, page_size=500):
+    """Yield the rows of ``dataset`` as dicts, reading one page at a time."""
+    if dataset == 'assessments':
+        for _, parent, questions in iter_bank(store, collections=('assessments',), page_size=page_size):
+            for question in questions:
+                yield question_row(parent['id'], question)
+        return
+    if dataset == 'upcoming_test_questions':
+        for _, parent, questions in iter_bank(store, collections=('upcoming_tests',), page_size=page_size):
+            for question in questions:
+                yield {'test_id': parent['id'], 'question_id': question.get('id', ''),
+                       **question_row(parent['id'], question)}
+        return
+    for doc in store.data.iter_documents(dataset, page_size=page_size):
+        if dataset == 'upcoming_tests' and 'questionCount' not in doc:
+            doc['questionCount'] = len(doc.get('questions', []))
+        yield doc
+
+
+class CsvSink:
+    def __init__(self, stream, columns):
+        self._stream = io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+        self._writer = csv.DictWriter(self._stream, fieldnames=list(columns), extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows({k: '' if v is None else v.isoformat() if isinstance(v, datetime) else v
+                                for k, v in row.items()} for row in rows)
+
+    def close(self):
+        # Leave the underlying stream open for the caller
+        self._stream.detach()
+
+
+class ParquetSink:
+    TYPES = {'str': 'string', 'int': 'int64', 'bool': 'bool'}
+
+    def __init__(self, stream, columns):
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self._schema = pa.schema([(column, pa.timestamp('us', tz='UTC') if kind == 'time'
+                                   else pa.type_for_alias(self.TYPES[kind]))
+                                  for column, kind in columns.items()])
+        self._writer = pq.ParquetWriter(stream, self._schema)
+
+    def write(self, rows):
+        # Each chunk becomes one row group
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def export(store, dataset, stream, fmt=CSV, chunk_rows=DEFAULT_CHUNK_ROWS, page_size=500, on_progress=None):
+    """Write ``dataset`` to the binary ``stream`` as ``fmt``; returns the row count.
+
+    ``on_progress(rows)`` is called after each chunk is written.
+    """
+    columns = DATASETS[dataset]
+    sink = (ParquetSink if fmt == PARQUET else CsvSink)(stream, columns)
+    rows = (
+        {column: normalize(kind, row.get(column)) for column, kind in columns.items()}
+        for row in iter_rows(store, dataset, page_size=page_size)
+    )
+    written = 0
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            sink.write(chunk)
+            written += len(chunk)
+            if on_progress:
+                on_progress(written)
+    finally:
+        sink.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("--format", dest="fmt", choices=[CSV, PARQUET], default=CSV)
+    parser.add_argument("--output", help="defaults to <dataset>.<format>")
+    parser.add_argument("--page-size", type=int, default=500, help="documents per cursor page")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows written at a time")
+    args = parser.parse_args(argv)
+    if args.fmt not in formats():
+        parser.error("Parquet export needs pyarrow: pip install pyarrow")
+
+    output = args.output or f"{args.dataset}.{args.fmt}"
+    # No caching: every document is read once
+    store = QuestionStore(DataLayer(client_from_environment(), ttl=0))
+    with open(output, 'wb') as f:
+        rows = export(store, args.dataset, f, fmt=args.fmt, chunk_rows=args.chunk_rows,
+                      page_size=args.page_size, on_progress=lambda n: print(f"{n:,} rows", end="\r"))
+    print(f"Wrote {rows:,} rows to {output}")
+
+
+if __name__ == "__main__":
+    main()
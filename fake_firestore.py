@@ -0,0 +1,622 @@
+"""In-process stand-in for ``google.cloud.firestore.Client``.
+
+Implements the subset of the client API the panel uses (collections,
+documents, queries with filters, ordering, projections, cursors and limits,
+batches with preconditions, ``get_all``, ``count()`` aggregations and
+``on_snapshot`` listeners) on top of plain dicts. Every operation is
+counted in ``stats`` so benchmarks can report reads, writes and bytes
+without a network. Listeners are notified synchronously on each commit.
+
+    db = FakeFirestore()
+    data = DataLayer(db)
+"""
+import copy
+import itertools
+import threading
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.api_core.exceptions import FailedPrecondition, NotFound
+except ImportError:  # pragma: no cover - keeps the fake importable on its own
+    class FailedPrecondition(Exception):
+        pass
+
+    class NotFound(Exception):
+        pass
+
+try:
+    from google.cloud.firestore_v1 import transforms as _transforms
+    _DELETE_FIELD = _transforms.DELETE_FIELD
+    _SERVER_TIMESTAMP = _transforms.SERVER_TIMESTAMP
+    _Increment = _transforms.Increment
+except ImportError:  # pragma: no cover
+    _DELETE_FIELD = _SERVER_TIMESTAMP = _Increment = None
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _size(value):
+    if isinstance(value, dict):
+        return sum(len(str(k)) + 1 + _size(v) for k, v in value.items()) + 32
+    if isinstance(value, (list, tuple)):
+        return sum(_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    return 8
+
+
+def _get_path(data, field_path):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _set_path(data, field_path, value):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    if value is _DELETE_FIELD and _DELETE_FIELD is not None:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = value
+
+
+def _resolve(value, old, now):
+    if _SERVER_TIMESTAMP is not None and value is _SERVER_TIMESTAMP:
+        return now
+    if _Increment is not None and isinstance(value, _Increment):
+        return (old if isinstance(old, (int, float)) else 0) + value.value
+    if isinstance(value, dict):
+        return {k: _resolve(v, None, now) for k, v in value.items() if v is not _DELETE_FIELD}
+    return copy.deepcopy(value)
+
+
+def _merge(old, value, now):
+    """Deep-merge ``value`` into ``old`` the way ``set(..., merge=True)`` does."""
+    if value is _DELETE_FIELD or not isinstance(value, dict) or not isinstance(old, dict):
+        return value if value is _DELETE_FIELD else _resolve(value, old, now)
+    merged = copy.deepcopy(old)
+    for key, item in value.items():
+        if item is _DELETE_FIELD:
+            merged.pop(key, None)
+        else:
+            merged[key] = _merge(old.get(key), item, now)
+    return merged
+
+
+class FakeStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.round_trips = 0
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in
+                ('reads', 'writes', 'deletes', 'bytes_read', 'bytes_written', 'round_trips')}
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None, create_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+        self.create_time = create_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        return copy.deepcopy(_get_path(self._data or {}, field_path))
+
+
+class FakeChange:
+    def __init__(self, kind, document, old_index=-1, new_index=-1):
+        self.type = _ChangeType(kind)
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeWatch:
+    def __init__(self, db, key):
+        self._db = db
+        self._key = key
+
+    def unsubscribe(self):
+        with self._db._lock:
+            self._db._listeners.pop(self._key, None)
+
+
+class FakeFieldFilter:
+    def __init__(self, field_path, op_string, value):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    'array_contains_any': lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or 'count'
+
+    def get(self, **kwargs):
+        db = self._query._db
+        n = len(self._query._matching())
+        # Firestore bills one read per 1000 index entries counted
+        db._record(reads=max(1, (n + 999) // 1000))
+        return [[FakeAggregationResult(self._alias, n)]]
+
+
+class FakeQuery:
+    def __init__(self, db, path, filters=(), orders=(), projection=None, limit=None,
+                 start=None, end=None):
+        self._db = db
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._projection = projection
+        self._limit = limit
+        self._start = start  # (values, inclusive)
+        self._end = end
+
+    def _copy(self, **changes):
+        fields = dict(filters=self._filters, orders=self._orders, projection=self._projection,
+                      limit=self._limit, start=self._start, end=self._end)
+        fields.update(changes)
+        return FakeQuery(self._db, self._path, **fields)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, str(direction).upper().endswith('DESCENDING')),))
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def _cursor(self, values):
+        if isinstance(values, FakeSnapshot):
+            snap = values
+            values = [snap.reference if f == '__name__' else _get_path(snap._data or {}, f)
+                      for f, _ in self._effective_orders()]
+        elif isinstance(values, dict):
+            values = [values[f] for f, _ in self._effective_orders() if f in values]
+        values = list(values)
+        return [v.id if isinstance(v, FakeDocumentReference) else v for v in values]
+
+    def start_at(self, values):
+        return self._copy(start=(self._cursor(values), True))
+
+    def start_after(self, values):
+        return self._copy(start=(self._cursor(values), False))
+
+    def end_before(self, values):
+        return self._copy(end=(self._cursor(values), False))
+
+    def end_at(self, values):
+        return self._copy(end=(self._cursor(values), True))
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self, alias)
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        if not any(f == '__name__' for f, _ in orders):
+            last_desc = orders[-1][1] if orders else False
+            orders.append(('__name__', last_desc))
+        return orders
+
+    def _sort_key(self, doc_id, data, orders):
+        key = []
+        for field, desc in orders:
+            value = doc_id if field == '__name__' else _get_path(data, field)
+            key.append(_Desc(value) if desc else value)
+        return key
+
+    def _matching(self):
+        docs = self._db._collection_docs(self._path)
+        orders = self._effective_orders()
+        rows = []
+        for doc_id, (data, _, _) in docs.items():
+            try:
+                if not all(_OPS[op](_get_path(data, f) if f != '__name__' else doc_id, v)
+                           for f, op, v in self._filters):
+                    continue
+                key = self._sort_key(doc_id, data, orders)
+            except (KeyError, TypeError):
+                continue
+            rows.append((key, doc_id))
+        rows.sort(key=lambda r: r[0])
+        if self._start is not None:
+            values, inclusive = self._start
+            rows = [r for r in rows if _cmp_cursor(r[0], values, orders) > (-1 if inclusive else 0)]
+        if self._end is not None:
+            values, inclusive = self._end
+            rows = [r for r in rows if _cmp_cursor(r[0], values, orders) < (1 if inclusive else 0)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [doc_id for _, doc_id in rows]
+
+    def stream(self, transaction=None):
+        ids = self._matching()
+        docs = self._db._collection_docs(self._path)
+        ref = FakeCollectionReference(self._db, self._path)
+        snaps = []
+        for doc_id in ids:
+            # Stored dicts are replaced, never mutated, on write; to_dict() copies
+            data, created, updated = docs[doc_id]
+            if self._projection is not None:
+                projected = {}
+                for field in self._projection:
+                    try:
+                        _set_path(projected, field, _get_path(data, field))
+                    except KeyError:
+                        pass
+                data = projected
+            snaps.append(FakeSnapshot(ref.document(doc_id), data, updated, created))
+        self._db._record(reads=max(1, len(snaps)), bytes_read=sum(_size(s._data) for s in snaps))
+        return iter(snaps)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._db._listen(self, callback)
+
+
+class _Desc:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _cmp_cursor(key, values, orders):
+    for (field, desc), k, v in zip(orders, key, values):
+        k = k.value if isinstance(k, _Desc) else k
+        if k == v:
+            continue
+        less = k < v
+        if desc:
+            less = not less
+        return -1 if less else 1
+    return 0
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._db, self._path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        result = ref.set(document_data)
+        return result.update_time, ref
+
+    def list_documents(self):
+        return [self.document(doc_id) for doc_id in self._db._collection_docs(self._path)]
+
+
+class FakeWriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection_path, document_id):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = str(document_id)
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._db, self._collection_path)
+
+    def collection(self, name):
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        snap = self._db._snapshot(self, field_paths)
+        self._db._record(reads=1, bytes_read=_size(snap._data or {}))
+        return snap
+
+    def set(self, document_data, merge=False):
+        batch = self._db.batch()
+        batch.set(self, document_data, merge=merge)
+        return batch.commit()[0]
+
+    def create(self, document_data):
+        batch = self._db.batch()
+        batch.create(self, document_data)
+        return batch.commit()[0]
+
+    def update(self, field_updates, option=None):
+        batch = self._db.batch()
+        batch.update(self, field_updates, option=option)
+        return batch.commit()[0]
+
+    def delete(self, option=None):
+        batch = self._db.batch()
+        batch.delete(self, option=option)
+        return batch.commit()[0]
+
+    def on_snapshot(self, callback):
+        query = FakeQuery(self._db, self._collection_path).where('__name__', '==', self.id)
+        return self._db._listen(query, lambda docs, changes, read_time: callback(docs, changes, read_time))
+
+
+class FakeWriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(('set', reference, document_data, merge, None))
+        return self
+
+    def create(self, reference, document_data):
+        self._ops.append(('create', reference, document_data, False, None))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._ops.append(('update', reference, field_updates, False, option))
+        return self
+
+    def delete(self, reference, option=None):
+        self._ops.append(('delete', reference, None, False, option))
+        return self
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self, **kwargs):
+        return self._db._commit(self._ops)
+
+
+class FakeTransaction(FakeWriteBatch):
+    pass
+
+
+class FakeFirestore:
+    """Dict-backed Firestore client. ``stats`` counts billable operations."""
+
+    def __init__(self, clock=_now):
+        self._docs = {}  # collection path -> {doc_id: (data, create_time, update_time)}
+        self._listeners = {}
+        self._listener_ids = itertools.count()
+        self._lock = threading.RLock()
+        self._clock = clock
+        self.stats = FakeStats()
+
+    # Client API
+
+    def collection(self, *path):
+        return FakeCollectionReference(self, '/'.join(path))
+
+    def document(self, *path):
+        full = '/'.join(path)
+        collection_path, doc_id = full.rsplit('/', 1)
+        return FakeDocumentReference(self, collection_path, doc_id)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    def write_option(self, last_update_time=None, exists=None):
+        return FakeWriteOption(last_update_time=last_update_time, exists=exists)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        snaps = [self._snapshot(ref, field_paths) for ref in references]
+        self._record(reads=len(snaps), bytes_read=sum(_size(s._data or {}) for s in snaps))
+        return iter(snaps)
+
+    def collections(self):
+        return [FakeCollectionReference(self, p) for p in self._docs if '/' not in p]
+
+    def close(self):
+        pass
+
+    # Seeding helpers (not billed)
+
+    def seed(self, path, documents):
+        """Bulk-load ``{doc_id: data}`` into ``path`` without counting writes."""
+        now = self._clock()
+        with self._lock:
+            docs = self._docs.setdefault(path, {})
+            for doc_id, data in documents.items():
+                docs[str(doc_id)] = (copy.deepcopy(data), now, now)
+
+    def dump(self, path):
+        with self._lock:
+            return {doc_id: copy.deepcopy(entry[0]) for doc_id, entry in self._docs.get(path, {}).items()}
+
+    # Internals
+
+    def _record(self, **counts):
+        with self.stats.lock:
+            self.stats.round_trips += 1
+            for name, n in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + n)
+
+    def _collection_docs(self, path):
+        with self._lock:
+            return dict(self._docs.get(path, {}))
+
+    def _snapshot(self, ref, field_paths=None):
+        entry = self._docs.get(ref._collection_path, {}).get(ref.id)
+        if entry is None:
+            return FakeSnapshot(ref, None)
+        data, created, updated = entry
+        data = copy.deepcopy(data)
+        if field_paths is not None:
+            projected = {}
+            for field in field_paths:
+                try:
+                    _set_path(projected, field, _get_path(data, field))
+                except KeyError:
+                    pass
+            data = projected
+        return FakeSnapshot(ref, data, updated, created)
+
+    def _commit(self, ops):
+        with self._lock:
+            now = self._clock()
+            # Validate preconditions before touching anything so the batch is atomic
+            for kind, ref, _, _, option in ops:
+                entry = self._docs.get(ref._collection_path, {}).get(ref.id)
+                if kind == 'update' and entry is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if kind == 'create' and entry is not None:
+                    raise FailedPrecondition(f"Document already exists: {ref.path}")
+                if option is not None and option.last_update_time is not None:
+                    if entry is None or entry[2] != option.last_update_time:
+                        raise FailedPrecondition(f"Document was modified: {ref.path}")
+            touched = set()
+            results = []
+            counts = {'writes': 0, 'deletes': 0, 'bytes_written': 0}
+            for kind, ref, payload, merge, _ in ops:
+                docs = self._docs.setdefault(ref._collection_path, {})
+                entry = docs.get(ref.id)
+                touched.add(ref._collection_path)
+                results.append(FakeWriteResult(now))
+                if kind == 'delete':
+                    docs.pop(ref.id, None)
+                    counts['deletes'] += 1
+                    continue
+                if kind == 'update' or merge:
+                    # Field-level write on top of the current document
+                    data = copy.deepcopy(entry[0]) if entry else {}
+                    for field, value in payload.items():
+                        try:
+                            old = _get_path(data, field)
+                        except KeyError:
+                            old = None
+                        if merge:
+                            value = _merge(old, value, now)
+                        elif value is not _DELETE_FIELD:
+                            value = _resolve(value, old, now)
+                        _set_path(data, field, value)
+                else:
+                    data = {k: _resolve(v, None, now) for k, v in payload.items() if v is not _DELETE_FIELD}
+                docs[ref.id] = (data, entry[1] if entry else now, now)
+                counts['writes'] += 1
+                counts['bytes_written'] += _size(data)
+            self._record(**counts)
+        self._notify(touched, now)
+        return results
+
+    def _listen(self, query, callback):
+        with self._lock:
+            key = next(self._listener_ids)
+            state = {'query': query, 'callback': callback, 'known': {}}
+            self._listeners[key] = state
+        self._fire(state, self._clock())
+        return FakeWatch(self, key)
+
+    def _notify(self, paths, now):
+        with self._lock:
+            listeners = [s for s in self._listeners.values() if s['query']._path in paths]
+        for state in listeners:
+            self._fire(state, now)
+
+    def _fire(self, state, now):
+        query = state['query']
+        with self._lock:
+            ids = query._matching()
+            docs = self._docs.get(query._path, {})
+            current = {doc_id: docs[doc_id] for doc_id in ids}
+        ref = FakeCollectionReference(self, query._path)
+        known = state['known']
+        changes = []
+        for doc_id, (data, created, updated) in current.items():
+            snap = FakeSnapshot(ref.document(doc_id), copy.deepcopy(data), updated, created)
+            if doc_id not in known:
+                changes.append(FakeChange('ADDED', snap, new_index=ids.index(doc_id)))
+            elif known[doc_id] != updated:
+                changes.append(FakeChange('MODIFIED', snap, new_index=ids.index(doc_id)))
+        for doc_id in known:
+            if doc_id not in current:
+                changes.append(FakeChange('REMOVED', FakeSnapshot(ref.document(doc_id), None)))
+        state['known'] = {doc_id: entry[2] for doc_id, entry in current.items()}
+        if not changes and known:
+            return
+        self._record(reads=max(1, len(changes)))
+        snaps = [FakeSnapshot(ref.document(doc_id), copy.deepcopy(entry[0]), entry[2], entry[1])
+                 for doc_id, entry in current.items()]
+        state['callback'](snaps, changes, now)
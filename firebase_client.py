@@ -0,0 +1,56 @@
+"""Credential resolution and Firestore client construction.
+
+Shared by the Streamlit app and the command-line tools so that all of them
+find credentials the same way and talk to the same database.
+"""
+import json
+import os
+
+CREDENTIALS_FILE = "firebase-admin-key.json"
+CREDENTIALS_ENV = "FIREBASE_SERVICE_ACCOUNT"
+DATABASE_NAME = 'intellitrain'
+
+
+def resolve_credentials(secrets=None):
+    """Return the service-account dict, or None when no source is configured.
+
+    Sources are tried in order: local key file, environment variable, then
+    ``secrets`` (Streamlit's ``st.secrets`` when running in the app).
+    """
+    # 1. Local file first (avoids Streamlit Secrets warning when running locally)
+    if os.path.exists(CREDENTIALS_FILE):
+        with open(CREDENTIALS_FILE) as f:
+            return json.load(f)
+
+    # 2. Env var
+    if CREDENTIALS_ENV in os.environ:
+        return json.loads(os.environ[CREDENTIALS_ENV])
+
+    # 3. Streamlit secrets (Cloud deployment only)
+    if secrets is not None:
+        try:
+            if "firebase" in secrets:
+                return dict(secrets["firebase"])
+        except Exception:
+            pass
+    return None
+
+
+def create_client(cred_dict):
+    from google.cloud import firestore as google_firestore
+    from google.oauth2 import service_account
+
+    google_creds = service_account.Credentials.from_service_account_info(cred_dict)
+    return google_firestore.Client(
+        credentials=google_creds,
+        project=google_creds.project_id,
+        database=DATABASE_NAME
+    )
+
+
+def client_from_environment():
+    """Build a client for headless tools, failing loudly if credentials are missing."""
+    cred_dict = resolve_credentials()
+    if not cred_dict:
+        raise SystemExit(f"Firebase credentials missing: add {CREDENTIALS_FILE} or set {CREDENTIALS_ENV}.")
+    return create_client(cred_dict)
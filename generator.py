@@ -0,0 +1,201 @@
+"""Random assessments and tests drawn from the question bank by quotas.
+
+A request such as "10 Medium Python, 5 Hard SQL, 5 Easy Aptitude" is a list
+of quotas: a count, an optional difficulty and a concept (or, when no
+concept has that name, a section). Questions are sampled without
+replacement from a QuotaIndex, which keeps every question of the bank in
+buckets keyed by concept or section and difficulty. Buckets are sorted, so
+the same seed over the same bank gives the same questions, and a quota of k
+questions costs O(k) random draws whatever the size of the bank.
+
+QuotaIndex is a BankView, so after its first scan a write costs a sorted
+insert per bucket of each question of the parent it touched.
+"""
+import random
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from bank import BankView
+from schemas import DIFFICULTIES, upcoming_question_id
+
+CONCEPT = 'concept'
+SECTION = 'section'
+QUOTA_RE = re.compile(r"^(\d+)\s+(.+)$")
+
+
+class Quota:
+    def __init__(self, count, name, difficulty=None):
+        self.count = count
+        self.name = name
+        self.difficulty = difficulty
+
+    def __str__(self):
+        return " ".join(str(part) for part in (self.count, self.difficulty, self.name) if part)
+
+    def __repr__(self):
+        return f"Quota({str(self)!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Quota) and vars(self) == vars(other)
+
+
+def parse_quotas(text):
+    """Quotas from ``"10 Medium Python, 5 Hard SQL"`` (commas, semicolons or new lines between them).
+
+    Raises ValueError naming the first entry that is not ``<count> [difficulty] <name>``.
+    """
+    quotas = []
+    for entry in re.split(r"[,;\n]", text):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = QUOTA_RE.match(entry)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"'{entry}' is not '<count> [difficulty] <concept or section>'")
+        count, rest = int(match.group(1)), match.group(2).strip()
+        first, _, name = rest.partition(" ")
+        difficulty = next((d for d in DIFFICULTIES if d.lower() == first.lower()), None)
+        if difficulty is None or not name.strip():
+            difficulty, name = None, rest
+        quotas.append(Quota(count, name.strip(), difficulty))
+    if not quotas:
+        raise ValueError("Enter at least one quota, e.g. '10 Medium Python'")
+    return quotas
+
+
+class QuotaIndex(BankView):
+    """Questions of the bank bucketed by ``(concept or section, value, difficulty)``.
+
+    Each question sits in four buckets: its concept and its section, each
+    with its difficulty and with any difficulty (``None``). Buckets hold
+    sorted ``(collection, parent_id, position)`` handles.
+    """
+
+    def __init__(self, store, max_age=None):
+        super().__init__(store, max_age=max_age)
+        self._reset()
+
+    def _reset(self):
+        self._buckets = defaultdict(list)
+        self._questions = {}  # handle -> question
+        self._by_parent = {}  # (collection, parent_id) -> its handles
+        # During the initial scan handles are appended and each bucket sorted once at the end
+        self._building = True
+
+    def _finish_build(self):
+        for bucket in self._buckets.values():
+            bucket.sort()
+        self._building = False
+
+    def __len__(self):
+        return len(self._questions)
+
+    @staticmethod
+    def _keys(question):
+        difficulty = question.get('difficulty')
+        for dimension in (CONCEPT, SECTION):
+            value = str(question.get(dimension) or '').strip().lower()
+            if value:
+                if difficulty:
+                    yield dimension, value, difficulty
+                yield dimension, value, None
+
+    def _add(self, key, parent, questions):
+        handles = []
+        for position, question in enumerate(questions, 1):
+            handle = (key[0], key[1], position)
+            self._questions[handle] = question
+            handles.append(handle)
+            for bucket_key in self._keys(question):
+                if self._building:
+                    self._buckets[bucket_key].append(handle)
+                else:
+                    insort(self._buckets[bucket_key], handle)
+        self._by_parent[key] = handles
+
+    def _remove(self, key):
+        for handle in self._by_parent.pop(key, ()):
+            question = self._questions.pop(handle)
+            for bucket_key in self._keys(question):
+                bucket = self._buckets[bucket_key]
+                del bucket[bisect_left(bucket, handle)]
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def bucket_for(self, quota):
+        """The bucket serving ``quota``: concepts take precedence over sections of the same name."""
+        name = quota.name.lower()
+        for dimension in (CONCEPT, SECTION):
+            if (dimension, name, None) in self._buckets:
+                return self._buckets.get((dimension, name, quota.difficulty), [])
+        return []
+
+    def available(self, quotas):
+        """Questions matching each quota, whatever the other quotas take."""
+        self.refresh()
+        with self._lock:
+            return [len(self.bucket_for(quota)) for quota in quotas]
+
+    def sample(self, quotas, seed=None):
+        """Questions meeting ``quotas``, no text twice; the same ``seed`` over the same bank repeats the draw.
+
+        Raises ValueError listing the quotas the bank cannot fill.
+        """
+        self.refresh()
+        rng = random.Random(seed)
+        chosen = set()
+        picked = []
+        short = []
+        with self._lock:
+            for quota in quotas:
+                bucket = self.bucket_for(quota)
+                drawn = self._draw(bucket, quota.count, rng, chosen)
+                if len(drawn) < quota.count:
+                    short.append(f"{quota} (only {len(drawn)} available)")
+                picked.extend(self._questions[handle] for handle in drawn)
+        if short:
+            raise ValueError("Not enough questions for: " + ", ".join(short))
+        return [dict(question) for question in picked]
+
+    def _draw(self, bucket, count, rng, chosen):
+        """Up to ``count`` handles of ``bucket`` whose text is not in ``chosen``, in random order.
+
+        A partial Fisher-Yates shuffle that records its swaps in a dict
+        instead of copying the bucket, so k draws cost O(k).
+        """
+        drawn = []
+        swapped = {}
+        for i in range(len(bucket)):
+            if len(drawn) == count:
+                break
+            j = rng.randrange(i, len(bucket))
+            index = swapped.get(j, j)
+            swapped[j] = swapped.get(i, i)
+            handle = bucket[index]
+            # Generated assessments copy their questions, so the same text can sit in several parents
+            text = ' '.join(str(self._questions[handle].get('text') or '').lower().split())
+            if text not in chosen:
+                chosen.add(text)
+                drawn.append(handle)
+        return drawn
+
+
+def number_questions(collection, doc_id, questions, now=None):
+    """Give sampled questions the IDs the pages would give them in ``collection/doc_id``."""
+    if collection == 'upcoming_tests':
+        return [{**q, 'id': upcoming_question_id(i, now)} for i, q in enumerate(questions, 1)]
+    return [{**q, 'id': f'q_{doc_id}_{i}'} for i, q in enumerate(questions, 1)]
+
+
+def generate(store, index, collection, doc_id, parent_data, quotas, seed=None):
+    """Sample ``quotas`` and create ``collection/doc_id`` with them in one batched write.
+
+    ``doc_id=None`` picks an ID. Returns ``(doc_id, questions)``.
+    """
+    sampled = index.sample(quotas, seed=seed)
+    if doc_id is None:
+        doc_id = store.data.new_document_id(collection)
+    questions = number_questions(collection, doc_id, sampled)
+    store.create(collection, doc_id, parent_data, questions)
+    return doc_id, questions
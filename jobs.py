@@ -0,0 +1,305 @@
+"""Job postings: LinkedIn URL parsing, duplicate index and bulk import.
+
+Usage:
+    python jobs.py feed.csv
+    python jobs.py feed.jsonl --dry-run
+
+Feeds are CSV or JSON lines with the fields of the "💼 Manage Jobs" form
+(``title``, ``company``, ``location``, ``type``, ``mode``, ``link``,
+``description`` and optionally ``postedDate``). Rows missing a title or
+company get them from the LinkedIn URL slug when the link has one.
+
+A posting is a duplicate when its normalized link, or its company and title,
+match an existing job or an earlier row of the feed. Links are normalized
+so that the many URLs LinkedIn uses for one posting (slugs, country hosts,
+tracking parameters) share a key. New postings are written through a
+rate-limited BatchWriter.
+"""
+import argparse
+import csv
+import io
+import json
+import re
+import threading
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import schemas
+from data_layer import DataLayer
+from firebase_client import client_from_environment
+
+JOBS_COLLECTION = 'jobs'
+JOB_FIELDS = ['title', 'company', 'location', 'type', 'mode', 'link', 'description']
+# Keeps bulk imports well under Firestore's sustained write rate for a new collection
+DEFAULT_MAX_RATE = 500
+DEFAULT_BATCH_SIZE = 200
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {'trk', 'trackingid', 'refid', 'ref', 'src', 'source', 'position', 'pagenum',
+                   'originalsubdomain', 'lipi', 'ebp', 'currentjobid'}
+LINK = 'link'
+COMPANY_TITLE = 'company+title'
+
+
+def parse_linkedin_url(url):
+    """``(title, company)`` from a LinkedIn job URL slug; either may be None.
+
+    Example: ``https://www.linkedin.com/jobs/view/software-engineer-at-company-12345/``
+    gives ``("Software Engineer", "Company")``.
+    """
+    if "linkedin.com/jobs/view/" not in url:
+        return None, None
+    slug = url.split("/view/")[1].split("/")[0].split("?")[0]
+    words = slug.split("-")
+    # Slugs end in the numeric job id
+    if words and words[-1].isdigit():
+        words = words[:-1]
+    title, at, company = "-".join(words).partition("-at-")
+    return (title.replace("-", " ").title() or None,
+            company.replace("-", " ").title() if at and company else None)
+
+
+def linkedin_job_id(url):
+    parts = urlsplit(url)
+    for key, value in parse_qsl(parts.query):
+        if key.lower() == 'currentjobid' and value.isdigit():
+            return value
+    match = re.search(r"/jobs/view/(?:[^/]*-)?(\d+)/?$", parts.path)
+    return match.group(1) if match else None
+
+
+def normalize_link(url):
+    """Key identifying the posting behind ``url``, ignoring scheme, ``www.`` and tracking parameters."""
+    url = (url or '').strip()
+    if not url:
+        return ''
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith('www.') else host
+    if host == 'linkedin.com' or host.endswith('.linkedin.com'):
+        job_id = linkedin_job_id(url)
+        if job_id:
+            return f"linkedin.com/jobs/view/{job_id}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query)
+                             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith('utm_')))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else '')
+
+
+def company_title_key(company, title):
+    words = lambda text: ' '.join(re.findall(r"\w+", (text or '').casefold()))
+    return f"{words(company)}|{words(title)}"
+
+
+def _choice(value, choices):
+    # Match the form's choices case-insensitively; anything else is kept as given
+    for choice in choices:
+        if value.casefold() == choice.casefold():
+            return choice
+    return value
+
+
+def posting_from_row(row, now):
+    """``(posting, error)`` for one feed row, built like the jobs of ``add_job_form`` (see schemas.job)."""
+    fields = {field: str(row.get(field) or '').strip() for field in JOB_FIELDS}
+    if fields['link'] and not (fields['title'] and fields['company']):
+        title, company = parse_linkedin_url(fields['link'])
+        fields['title'] = fields['title'] or title or ''
+        fields['company'] = fields['company'] or company or ''
+    if not (fields['title'] and fields['company']):
+        return None, "title and company are required"
+    fields['type'] = _choice(fields['type'], schemas.JOB_TYPES)
+    fields['mode'] = _choice(fields['mode'], schemas.WORK_MODES)
+    posted = str(row.get('postedDate') or '').strip()
+    return schemas.job(fields['title'], fields['company'], fields['location'], fields['type'], fields['mode'],
+                       fields['link'], fields['description'], posted_date=posted, now=now), None
+
+
+def read_feed(source, fmt=None):
+    """Yield ``(line, row)`` from a binary CSV or JSON-lines ``source``; ``fmt`` defaults from its name."""
+    if fmt is None:
+        fmt = 'jsonl' if str(getattr(source, 'name', '')).lower().endswith(('.jsonl', '.json')) else 'csv'
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            # The header is line 1
+            for line, row in enumerate(csv.DictReader(text), 2):
+                yield line, row
+            return
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                yield line, e
+                continue
+            yield line, row if isinstance(row, dict) else ValueError("expected a JSON object")
+    finally:
+        # Leave the underlying stream open for the caller
+        text.detach()
+
+
+class JobIndex:
+    """Existing postings keyed by normalized link and by company + title.
+
+    The first ``refresh()`` builds it from one projected listing of ``jobs``.
+    After that, writes reported by the DataLayer mark their job dirty and the
+    next ``refresh()`` re-reads only those.
+    """
+
+    FIELDS = ['title', 'company', 'link']
+
+    def __init__(self, data):
+        self.data = data
+        self._lock = threading.RLock()
+        self._dirty_lock = threading.Lock()
+        self._dirty = set()
+        self._built = False
+        self._by_key = {}  # (kind, key) -> job id
+        self._keys = {}  # job id -> its (kind, key) pairs
+        data.subscribe(self._on_write)
+
+    def _on_write(self, path, doc_id):
+        if path == JOBS_COLLECTION:
+            with self._dirty_lock:
+                self._dirty.add(doc_id)
+
+    def refresh(self):
+        with self._lock:
+            if not self._built:
+                with self._dirty_lock:
+                    self._dirty.clear()
+                self._by_key, self._keys = {}, {}
+                for job in self.data.list_summaries(JOBS_COLLECTION, self.FIELDS):
+                    self.add(job['id'], job)
+                self._built = True
+                return
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            for job_id, job in self.data.get_documents(JOBS_COLLECTION, dirty).items():
+                self.remove(job_id)
+                if job is not None:
+                    self.add(job_id, job)
+
+    @staticmethod
+    def keys(job):
+        keys = [(COMPANY_TITLE, company_title_key(job.get('company'), job.get('title')))]
+        link = normalize_link(job.get('link'))
+        if link:
+            keys.insert(0, (LINK, link))
+        return keys
+
+    def add(self, job_id, job):
+        with self._lock:
+            self.remove(job_id)
+            self._keys[job_id] = self.keys(job)
+            for key in self._keys[job_id]:
+                self._by_key.setdefault(key, job_id)
+
+    def remove(self, job_id):
+        with self._lock:
+            for key in self._keys.pop(job_id, ()):
+                if self._by_key.get(key) == job_id:
+                    del self._by_key[key]
+
+    def find(self, job):
+        """``(kind, job_id)`` of the posting ``job`` duplicates, or None."""
+        with self._lock:
+            for key in self.keys(job):
+                if key in self._by_key:
+                    return key[0], self._by_key[key]
+        return None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class JobImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.added = []
+        self.errors = []  # (line, message)
+        self.duplicates = []  # (line, matched on, duplicate of)
+
+    def error_rows(self):
+        return [{'line': line, 'error': message} for line, message in self.errors]
+
+    def duplicate_rows(self):
+        return [{'line': line, 'matched on': kind, 'duplicate of': job_id}
+                for line, kind, job_id in self.duplicates]
+
+
+def import_jobs(source, data, index, fmt=None, now=None, dry_run=False, batch_size=DEFAULT_BATCH_SIZE,
+                max_rate=DEFAULT_MAX_RATE, on_progress=None):
+    """Add the new postings of the feed ``source``, skipping duplicates; returns a JobImportReport.
+
+    Rows are checked against ``index`` (a JobIndex) and against earlier rows,
+    so a feed can be imported twice without creating copies. Writes commit
+    ``batch_size`` at a time at no more than ``max_rate`` per second.
+    ``on_progress(phase, done, total)`` is called as rows are read and as
+    batches commit. ``dry_run`` reports without writing.
+    """
+    now = now or datetime.now().astimezone()
+    report = JobImportReport()
+    index.refresh()
+    # Rows of this feed; the index itself only learns of them once committed
+    seen = {}
+
+    def committed(done, queued):
+        if on_progress:
+            on_progress('write', done, queued)
+
+    with data.batch_writer(max_ops=batch_size, max_rate=max_rate, on_commit=committed,
+                           dry_run=dry_run) as writer:
+        for line, row in read_feed(source, fmt):
+            report.rows += 1
+            if isinstance(row, Exception):
+                report.errors.append((line, f"invalid JSON: {row}"))
+                continue
+            posting, error = posting_from_row(row, now)
+            if error:
+                report.errors.append((line, error))
+                continue
+            match = index.find(posting) or next(((key[0], seen[key]) for key in JobIndex.keys(posting)
+                                                 if key in seen), None)
+            if match:
+                report.duplicates.append((line, *match))
+                continue
+            job_id = data.new_document_id(JOBS_COLLECTION)
+            for key in JobIndex.keys(posting):
+                seen.setdefault(key, f"line {line}")
+            writer.set(JOBS_COLLECTION, job_id, posting)
+            report.added.append(job_id)
+            if on_progress and report.rows % 1000 == 0:
+                on_progress('read', report.rows, None)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("feed", help="CSV or JSON-lines file")
+    parser.add_argument("--format", dest="fmt", choices=['csv', 'jsonl'], help="defaults from the file name")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be added without writing")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-rate", type=float, default=DEFAULT_MAX_RATE, help="writes per second")
+    args = parser.parse_args(argv)
+
+    data = DataLayer(client_from_environment(), ttl=0)
+    with open(args.feed, 'rb') as f:
+        report = import_jobs(f, data, JobIndex(data), fmt=args.fmt, dry_run=args.dry_run,
+                             batch_size=args.batch_size, max_rate=args.max_rate,
+                             on_progress=lambda phase, done, total: print(
+                                 f"{done:,} {'rows read' if phase == 'read' else f'of {total:,} written'}",
+                                 end="\r"))
+    for line, message in report.errors:
+        print(f"line {line}: {message}")
+    for line, kind, job_id in report.duplicates:
+        print(f"line {line}: duplicate of {job_id} ({kind})")
+    verb = "would be added" if args.dry_run else "added"
+    print(f"{report.rows:,} rows: {len(report.added):,} {verb}, {len(report.duplicates):,} duplicates, "
+          f"{len(report.errors):,} invalid")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Process-wide, listener-driven mirror of the top-level collections.
+
+One ``on_snapshot`` listener per collection keeps an in-memory copy of every
+document up to date from change events, so pages read from memory instead
+of re-streaming Firestore on each rerun. The DataLayer consults the mirror
+only while it is current: after the initial snapshot has arrived and with
+no write of this process still waiting to be echoed back by the listener.
+"""
+import copy
+import os
+import threading
+import time
+
+MIRRORED_COLLECTIONS = ('assessments', 'upcoming_tests', 'jobs')
+# How long a write may wait for its listener echo before the mirror stops
+# blocking reads of that collection (reads fall back to Firestore meanwhile)
+PENDING_TIMEOUT = 10.0
+
+
+def live_mirror_enabled():
+    return os.environ.get("INTELLITRAIN_LIVE_MIRROR", "").lower() in ("1", "true", "yes")
+
+
+def project(row, fields):
+    projected = {'id': row['id']}
+    for field in fields:
+        if field in row:
+            projected[field] = row[field]
+    return projected
+
+
+def page_rows(rows, order_field, descending=False, page_size=20, cursor=None):
+    """In-memory equivalent of DataLayer.query_page over already-loaded rows."""
+    if order_field == '__name__':
+        keyed = [((row['id'],), row) for row in rows]
+    else:
+        keyed = [((row[order_field], row['id']), row) for row in rows if row.get(order_field) is not None]
+    keyed.sort(key=lambda item: item[0], reverse=descending)
+    if cursor is not None:
+        value, doc_id = cursor
+        start = (doc_id,) if order_field == '__name__' else (value, doc_id)
+        if descending:
+            keyed = [item for item in keyed if item[0] < start]
+        else:
+            keyed = [item for item in keyed if item[0] > start]
+    page = [row for _, row in keyed[:page_size + 1]]
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = (page[-1].get(order_field), page[-1]['id'])
+    return page, next_cursor
+
+
+class LiveMirror:
+    # Changes arrive as they commit, so fresh queries may be answered from memory
+    live = True
+
+    def __init__(self, db, collections=MIRRORED_COLLECTIONS, timer=time.monotonic):
+        self.db = db
+        self.collections = tuple(collections)
+        self._timer = timer
+        self._lock = threading.RLock()
+        self._docs = {c: {} for c in self.collections}
+        self._update_times = {c: {} for c in self.collections}
+        self._ready = {c: threading.Event() for c in self.collections}
+        self._pending = {}  # (collection, doc_id) -> (expected update_time or None, deadline)
+        self._watches = []
+        self._subscribers = []
+
+    # Lifecycle
+
+    def start(self):
+        for collection in self.collections:
+            self._watches.append(self.db.collection(collection).on_snapshot(self._handler(collection)))
+        return self
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def wait_until_ready(self, timeout=None):
+        deadline = None if timeout is None else self._timer() + timeout
+        for event in self._ready.values():
+            remaining = None if deadline is None else max(0.0, deadline - self._timer())
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def subscribe(self, callback):
+        """Call ``callback(collection, doc_id)`` for every change the listeners deliver."""
+        self._subscribers.append(callback)
+
+    # Change events
+
+    def _handler(self, collection):
+        def on_snapshot(docs, changes, read_time):
+            changed = []
+            with self._lock:
+                store = self._docs[collection]
+                times = self._update_times[collection]
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == 'REMOVED':
+                        store.pop(doc.id, None)
+                        times.pop(doc.id, None)
+                    else:
+                        data = doc.to_dict() or {}
+                        data['id'] = doc.id
+                        store[doc.id] = data
+                        times[doc.id] = doc.update_time
+                    self._settle(collection, doc.id)
+                    changed.append(doc.id)
+            self._ready[collection].set()
+            for doc_id in changed:
+                for callback in self._subscribers:
+                    callback(collection, doc_id)
+        return on_snapshot
+
+    def _settle(self, collection, doc_id):
+        key = (collection, doc_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        expected, _ = pending
+        seen = self._update_times[collection].get(doc_id)
+        if expected is None or seen is None or seen >= expected:
+            del self._pending[key]
+
+    # Read-your-writes bookkeeping
+
+    def expect(self, collection, doc_id, update_time=None, deleted=False):
+        """Record a write so reads bypass the mirror until its listener echo arrives."""
+        if collection not in self._docs:
+            return
+        doc_id = str(doc_id)
+        with self._lock:
+            if deleted:
+                if doc_id not in self._docs[collection]:
+                    return
+            else:
+                seen = self._update_times[collection].get(doc_id)
+                if update_time is not None and seen is not None and seen >= update_time:
+                    return
+            self._pending[(collection, doc_id)] = (update_time, self._timer() + PENDING_TIMEOUT)
+
+    def is_current(self, collection):
+        if collection not in self._ready or not self._ready[collection].is_set():
+            return False
+        now = self._timer()
+        with self._lock:
+            for key, (_, deadline) in list(self._pending.items()):
+                if deadline <= now:
+                    del self._pending[key]
+                elif key[0] == collection:
+                    return False
+        return True
+
+    # Reads (return copies; callers may mutate them)
+
+    def list(self, collection):
+        with self._lock:
+            return copy.deepcopy(list(self._docs[collection].values()))
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            return copy.deepcopy(self._docs[collection].get(str(doc_id)))
+
+    def list_summaries(self, collection, fields):
+        with self._lock:
+            return [copy.deepcopy(project(row, fields)) for row in self._docs[collection].values()]
+
+    def query_page(self, collection, order_field, descending=False, page_size=20, cursor=None, fields=None):
+        with self._lock:
+            rows, next_cursor = page_rows(list(self._docs[collection].values()), order_field,
+                                          descending=descending, page_size=page_size, cursor=cursor)
+            if fields:
+                rows = [project(row, fields) for row in rows]
+            return copy.deepcopy(rows), next_cursor
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(docs) for docs in self._docs.values())
@@ -0,0 +1,287 @@
+"""Disk-backed snapshot of the top-level collections with incremental sync.
+
+The last-known state of ``assessments``, ``upcoming_tests`` and ``jobs`` is
+kept in a SQLite file together with each document's ``updatedAt`` and a
+per-collection sync watermark. On start the file is loaded into memory and
+served right away, the same way as the live mirror, while a background
+thread syncs: it reads only documents stamped ``updatedAt`` since the last
+sync (minus a small overlap) plus tombstones of deletes since then, and
+writes the changes back to disk. A full resync runs on first use and once
+the snapshot is older than ``FULL_SYNC_AFTER``, which also picks up writes
+made outside the panel (they carry no ``updatedAt``).
+
+Served data may lag Firestore by up to one sync interval; writes made
+through the panel wake the sync thread and bypass the snapshot until it has
+seen them.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from data_layer import SYNCED_COLLECTIONS, TOMBSTONE_COLLECTION, DataLayer
+from live_mirror import LiveMirror
+
+DEFAULT_SYNC_INTERVAL = 60
+# Re-read changes this far behind the watermark, in case commits become
+# visible slightly out of timestamp order
+SYNC_OVERLAP = timedelta(seconds=30)
+FULL_SYNC_AFTER = timedelta(hours=24)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (collection, doc_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at TEXT,
+    full_sync_at TEXT
+);
+"""
+SAVE_STATE = "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)"
+
+
+def local_snapshot_path():
+    return os.environ.get("INTELLITRAIN_LOCAL_SNAPSHOT") or None
+
+
+def sync_interval():
+    return float(os.environ.get("INTELLITRAIN_SNAPSHOT_SYNC_INTERVAL", DEFAULT_SYNC_INTERVAL))
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    # Anything else JSON cannot hold (references, geo points) is kept as text
+    return str(value)
+
+
+def _decode(obj):
+    if len(obj) == 1 and '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def dumps(data):
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+def _time(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def _text(value):
+    return value.isoformat() if value is not None else None
+
+
+def _latest(watermark, times):
+    return max([t for t in (watermark, *times) if t is not None], default=None)
+
+
+class LocalSnapshot(LiveMirror):
+    """Drop-in replacement for the live mirror, persisted to ``path``.
+
+    ``clock`` returns the current timezone-aware time; it only decides when
+    a full resync is due; watermarks come from the server-side ``updatedAt``.
+    """
+
+    # Served data can be up to one sync behind, so fresh queries skip it
+    live = False
+
+    def __init__(self, db, path, collections=SYNCED_COLLECTIONS, interval=DEFAULT_SYNC_INTERVAL,
+                 clock=utc_now, page_size=500, **kwargs):
+        super().__init__(db, collections=collections, **kwargs)
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self.page_size = page_size
+        # Uncached and unmirrored, so syncs always read Firestore
+        self.source = DataLayer(db, ttl=0)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._state = {}  # collection -> (watermark, synced_at, full_sync_at)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+
+    # Lifecycle
+
+    def start(self, background=True):
+        """Serve what is on disk, then keep syncing (in a daemon thread unless ``background`` is False)."""
+        self.load()
+        if not background:
+            self.sync()
+            return self
+        self._thread = threading.Thread(target=self._run, name="local-snapshot-sync", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._db_lock:
+            self._conn.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:  # keep serving the snapshot; retry next interval
+                self.last_error = e
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def expect(self, collection, doc_id, update_time=None, deleted=False):
+        super().expect(collection, doc_id, update_time=update_time, deleted=deleted)
+        # Sync now rather than at the next interval, so the write shows up promptly
+        self._wake.set()
+
+    # Disk
+
+    def load(self):
+        """Fill memory from disk; collections synced before are served immediately."""
+        with self._db_lock:
+            state = self._conn.execute(
+                "SELECT collection, watermark, synced_at, full_sync_at FROM sync_state").fetchall()
+            rows = self._conn.execute("SELECT collection, doc_id, data, updated_at FROM documents").fetchall()
+        with self._lock:
+            for collection, watermark, synced_at, full_sync_at in state:
+                if collection in self._docs or collection == TOMBSTONE_COLLECTION:
+                    self._state[collection] = (_time(watermark), _time(synced_at), _time(full_sync_at))
+            for collection, doc_id, data, updated_at in rows:
+                if collection in self._docs:
+                    self._docs[collection][doc_id] = {**loads(data), 'id': doc_id}
+                    self._update_times[collection][doc_id] = _time(updated_at)
+        for collection in self.collections:
+            if collection in self._state:
+                self._ready[collection].set()
+
+    def _save(self, collection, upserts, deletes, state, replace=False):
+        with self._db_lock, self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM documents WHERE collection = ?", (collection,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(collection, doc['id'], dumps({k: v for k, v in doc.items() if k != 'id'}),
+                  _text(doc.get('updatedAt'))) for doc in upserts])
+            self._conn.executemany("DELETE FROM documents WHERE collection = ? AND doc_id = ?",
+                                   [(collection, doc_id) for doc_id in deletes])
+            self._conn.execute(SAVE_STATE, (collection, *map(_text, state)))
+
+    # Sync
+
+    def sync(self):
+        """Bring every collection up to date; returns {collection: documents changed}."""
+        with self._sync_lock:
+            now = self.clock()
+            changed = {}
+            for collection in self.collections:
+                _, _, full_sync_at = self._state.get(collection, (None, None, None))
+                if full_sync_at is None or now - full_sync_at >= FULL_SYNC_AFTER:
+                    changed[collection] = self._full_sync(collection, now)
+                else:
+                    changed[collection] = self._incremental_sync(collection, now)
+            deleted = self._apply_tombstones(now)
+            for collection, count in deleted.items():
+                changed[collection] += count
+            return changed
+
+    def _full_sync(self, collection, now):
+        docs = {doc['id']: doc for doc in self.source.iter_documents(collection, page_size=self.page_size)}
+        watermark = _latest(None, (doc.get('updatedAt') for doc in docs.values()))
+        state = (watermark, now, now)
+        self._save(collection, docs.values(), (), state, replace=True)
+        with self._lock:
+            previous = self._docs[collection]
+            removed = [doc_id for doc_id in previous if doc_id not in docs]
+            changed = removed + [doc_id for doc_id, doc in docs.items() if previous.get(doc_id) != doc]
+            self._docs[collection] = docs
+            self._update_times[collection] = {doc_id: doc.get('updatedAt') for doc_id, doc in docs.items()}
+            self._state[collection] = state
+        self._applied(collection, changed)
+        return len(changed)
+
+    def _incremental_sync(self, collection, now):
+        watermark, _, full_sync_at = self._state[collection]
+        since = watermark - SYNC_OVERLAP if watermark is not None else EPOCH
+        docs = list(self.source.iter_documents(collection, page_size=self.page_size,
+                                               filters=[('updatedAt', '>=', since)], order_field='updatedAt'))
+        watermark = _latest(watermark, (doc['updatedAt'] for doc in docs))
+        state = (watermark, now, full_sync_at)
+        with self._lock:
+            current = self._docs[collection]
+            docs = [doc for doc in docs if current.get(doc['id']) != doc]
+            for doc in docs:
+                current[doc['id']] = doc
+                self._update_times[collection][doc['id']] = doc['updatedAt']
+            self._state[collection] = state
+        self._save(collection, docs, (), state)
+        self._applied(collection, [doc['id'] for doc in docs])
+        return len(docs)
+
+    def _apply_tombstones(self, now):
+        """Drop documents deleted since the last sync; returns {collection: documents removed}."""
+        watermark, _, _ = self._state.get(TOMBSTONE_COLLECTION, (None, None, None))
+        since = watermark - SYNC_OVERLAP if watermark is not None else self._oldest_full_sync()
+        tombstones = list(self.source.iter_documents(TOMBSTONE_COLLECTION, page_size=self.page_size,
+                                                     filters=[('deletedAt', '>=', since)],
+                                                     order_field='deletedAt'))
+        removed = {collection: [] for collection in self.collections}
+        with self._lock:
+            for tombstone in tombstones:
+                collection, doc_id = tombstone.get('collection'), tombstone.get('docId')
+                if collection not in removed or doc_id not in self._docs[collection]:
+                    continue
+                # A document recreated after its delete is newer than the tombstone
+                updated_at = self._update_times[collection].get(doc_id)
+                if updated_at is not None and updated_at > tombstone['deletedAt']:
+                    continue
+                del self._docs[collection][doc_id]
+                self._update_times[collection].pop(doc_id, None)
+                removed[collection].append(doc_id)
+            watermark = _latest(watermark, (t['deletedAt'] for t in tombstones))
+            state = (watermark, now, None)
+            self._state[TOMBSTONE_COLLECTION] = state
+        for collection, doc_ids in removed.items():
+            if doc_ids:
+                self._save(collection, (), doc_ids, self._state[collection])
+                self._applied(collection, doc_ids)
+        with self._db_lock, self._conn:
+            self._conn.execute(SAVE_STATE, (TOMBSTONE_COLLECTION, *map(_text, state)))
+        return {collection: len(doc_ids) for collection, doc_ids in removed.items()}
+
+    def _oldest_full_sync(self):
+        # Deletes before a collection's full sync are already reflected in it
+        times = [self._state[c][2] for c in self.collections if c in self._state]
+        return min(times) - SYNC_OVERLAP if times else EPOCH
+
+    def _applied(self, collection, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._settle(collection, doc_id)
+        self._ready[collection].set()
+        for doc_id in doc_ids:
+            for callback in self._subscribers:
+                callback(collection, doc_id)
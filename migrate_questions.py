@@ -0,0 +1,129 @@
+"""Convert assessments and upcoming tests between question storage layouts.
+
+Usage:
+    python migrate_questions.py --to subcollection
+    python migrate_questions.py --to embedded --collections upcoming_tests
+    python migrate_questions.py --backfill-counts
+
+Parents are processed in document-ID order, one page at a time, through
+batched writes. After every page the last processed ID is saved to the
+checkpoint file, so an interrupted run resumes where it stopped. Each
+conversion is idempotent, so reprocessing a page is harmless. Running
+``--to embedded`` on documents that are already embedded backfills their
+``questionCount``; ``--backfill-counts`` does only that, for both layouts,
+without converting anything. Listings show ``questionCount``, so documents
+written before it existed are counted on every view until backfilled.
+"""
+import argparse
+import json
+import os
+
+from data_layer import DataLayer, estimate_size
+from firebase_client import client_from_environment
+from question_store import (EMBEDDED, STORAGE_MODES, SUBCOLLECTION, QuestionStore, is_subcollection,
+                            to_embedded, to_subcollection)
+
+QUESTION_COLLECTIONS = ['assessments', 'upcoming_tests']
+DEFAULT_CHECKPOINT = ".question_migration.json"
+# Leave headroom under Firestore's 1 MiB document limit
+MAX_EMBEDDED_BYTES = 900 * 1024
+# Pseudo-target of --backfill-counts: keep the layout, add missing questionCount fields
+COUNTS = 'counts'
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def migrate_parent(store, writer, collection, parent, target):
+    """Queue the writes converting one parent; returns a short status label."""
+    if target == COUNTS:
+        if 'questionCount' in parent:
+            return 'skipped'
+        writer.update(collection, parent['id'],
+                      {'questionCount': len(store.load(collection, parent['id'], parent=parent))})
+        return 'backfilled'
+    if target == SUBCOLLECTION:
+        if is_subcollection(parent):
+            return 'skipped'
+        to_subcollection(store, writer, collection, parent)
+        return 'migrated'
+
+    if not is_subcollection(parent):
+        if 'questionCount' in parent:
+            return 'skipped'
+        writer.update(collection, parent['id'], {'questionCount': len(parent.get('questions', []))})
+        return 'backfilled'
+    if estimate_size(store.load(collection, parent['id'], parent=parent)) > MAX_EMBEDDED_BYTES:
+        return 'too large'
+    to_embedded(store, writer, collection, parent)
+    return 'migrated'
+
+
+def migrate(data, collections, target, checkpoint_path, page_size=50, dry_run=False, log=print):
+    store = QuestionStore(data, mode=target if target in STORAGE_MODES else EMBEDDED)
+    checkpoint = load_checkpoint(checkpoint_path)
+    totals = {}
+    for collection in collections:
+        state = checkpoint.get(collection, {})
+        if state.get('done') and state.get('target') == target:
+            log(f"{collection}: already migrated to {target}")
+            continue
+        cursor = state.get('cursor') if state.get('target') == target else None
+        if cursor:
+            log(f"{collection}: resuming after {cursor}")
+        while True:
+            page, next_cursor = data.query_page(
+                collection, '__name__', page_size=page_size,
+                cursor=(None, cursor) if cursor else None)
+            with data.batch_writer(dry_run=dry_run) as writer:
+                for parent in page:
+                    status = migrate_parent(store, writer, collection, parent, target)
+                    totals[status] = totals.get(status, 0) + 1
+                    log(f"{collection}/{parent['id']}: {status}")
+            if page:
+                cursor = page[-1]['id']
+            if not dry_run:
+                checkpoint[collection] = {'target': target, 'cursor': cursor,
+                                          'done': next_cursor is None}
+                save_checkpoint(checkpoint_path, checkpoint)
+            if next_cursor is None:
+                break
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument("--to", dest="target", choices=[EMBEDDED, SUBCOLLECTION])
+    targets.add_argument("--backfill-counts", dest="target", action="store_const", const=COUNTS,
+                         help="add questionCount to documents missing it, keeping their layout")
+    parser.add_argument("--collections", nargs="+", default=QUESTION_COLLECTIONS,
+                        choices=QUESTION_COLLECTIONS)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    # No caching: every page is read once and must reflect the previous commit
+    data = DataLayer(client_from_environment(), ttl=0)
+    totals = migrate(data, args.collections, args.target, args.checkpoint,
+                     page_size=args.page_size, dry_run=args.dry_run)
+    print(", ".join(f"{n} {status}" for status, n in sorted(totals.items())) or "nothing to do")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Question storage for assessments and upcoming tests.
+
+Questions can live in two layouts:
+
+* ``embedded`` (original): a ``questions`` array on the parent document.
+* ``subcollection``: one document per question under
+  ``{collection}/{id}/questions/{question_id}`` with an ``order`` field, and
+  ``questionStorage: 'subcollection'`` on the parent.
+
+Reads follow whatever layout each parent document is in, so the panel keeps
+working while ``migrate_questions.py`` converts documents. New parents are
+created in the layout chosen by ``INTELLITRAIN_QUESTION_STORAGE``.
+
+Every write also queues the change in the bank statistics (see bank_stats)
+in the same batch, so the summary document never disagrees with a commit.
+"""
+import os
+
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import DELETE_FIELD, SERVER_TIMESTAMP, Increment
+
+from bank_stats import queue_stats, stats_delta
+
+EMBEDDED = 'embedded'
+SUBCOLLECTION = 'subcollection'
+STORAGE_MODES = (EMBEDDED, SUBCOLLECTION)
+
+
+class ConcurrentEditError(Exception):
+    """The document changed after the questions being edited were loaded."""
+
+
+def storage_mode():
+    mode = os.environ.get("INTELLITRAIN_QUESTION_STORAGE", EMBEDDED)
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"INTELLITRAIN_QUESTION_STORAGE must be one of {', '.join(STORAGE_MODES)}")
+    return mode
+
+
+def questions_path(collection, doc_id):
+    return f"{collection}/{doc_id}/questions"
+
+
+def is_subcollection(parent):
+    return bool(parent) and parent.get('questionStorage') == SUBCOLLECTION
+
+
+def question_doc_id(question_id):
+    # Firestore document IDs cannot contain slashes
+    return str(question_id).replace('/', '_')
+
+
+def new_question_id(prefix, questions):
+    """Next ``{prefix}_{n}`` not already used by ``questions``."""
+    used = {q.get('id') for q in questions}
+    n = len(questions) + 1
+    while f'{prefix}_{n}' in used:
+        n += 1
+    return f'{prefix}_{n}'
+
+
+def strip_order(question):
+    question = dict(question)
+    question.pop('order', None)
+    return question
+
+
+class QuestionStore:
+    def __init__(self, data, mode=EMBEDDED):
+        self.data = data
+        self.mode = mode
+
+    # Reads
+
+    def load(self, collection, doc_id, parent=None, keep_order=False):
+        """Questions of ``collection/doc_id`` in display order, whatever the layout.
+
+        With ``keep_order`` subcollection questions keep their stored ``order`` field.
+        """
+        if parent is None:
+            parent = self.data.get_document(collection, doc_id)
+        if not parent:
+            return []
+        if not is_subcollection(parent):
+            return parent.get('questions', [])
+        docs = self.data.list_collection(questions_path(collection, doc_id))
+        docs.sort(key=lambda q: (q.get('order', 0), q['id']))
+        return docs if keep_order else [strip_order(q) for q in docs]
+
+    def load_many(self, collection, parents, keep_order=False):
+        """Questions of several documents, given as ``{doc_id: parent or None}``.
+
+        Subcollection layouts are listed concurrently (see DataLayer.gather)
+        instead of one after another. Returns ``{doc_id: questions}``.
+        """
+        nested = [doc_id for doc_id, parent in parents.items() if parent and is_subcollection(parent)]
+        listed = self.data.gather(
+            lambda doc_id=doc_id: self.load(collection, doc_id, parent=parents[doc_id], keep_order=keep_order)
+            for doc_id in nested)
+        loaded = dict(zip(nested, listed))
+        return {doc_id: loaded[doc_id] if doc_id in loaded else (parent or {}).get('questions', [])
+                for doc_id, parent in parents.items()}
+
+    # Writes
+
+    def create(self, collection, doc_id, parent_data, questions):
+        """Create a parent document with its questions; ``doc_id=None`` picks an ID.
+
+        Returns the document ID. Creating over an existing document replaces it.
+        """
+        previous = self.data.get_document(collection, doc_id) if doc_id is not None else None
+        before = self.load(collection, doc_id, parent=previous) if previous else []
+        if doc_id is None:
+            doc_id = self.data.new_document_id(collection)
+        with self.data.batch_writer() as writer:
+            queue_stats(writer, collection, self.queue_create(writer, collection, doc_id, parent_data, questions,
+                                                              previous=previous, before=before))
+        return doc_id
+
+    def queue_create(self, writer, collection, doc_id, parent_data, questions, previous=None, before=()):
+        """Queue the writes of ``create`` on ``writer``.
+
+        ``previous`` and ``before`` are the document being replaced and its
+        questions, if any; question documents ``previous`` no longer needs
+        are deleted in the same batch. Like ``replace_questions``, returns the
+        statistics change for the caller to queue.
+        """
+        # Question documents of the replaced parent that the new list does not overwrite
+        path = questions_path(collection, doc_id)
+        stale = []
+        if is_subcollection(previous):
+            keep = {question_doc_id(q['id']) for q in questions} if self.mode == SUBCOLLECTION else set()
+            stale = [q['id'] for q in before if question_doc_id(q['id']) not in keep]
+        if self.mode == EMBEDDED:
+            writer.set(collection, doc_id, {**parent_data, 'questions': questions})
+            # After the parent, as in to_embedded, so readers switch to the array first
+            for question_id in stale:
+                writer.delete(path, question_doc_id(question_id))
+        else:
+            for question_id in stale:
+                writer.delete(path, question_doc_id(question_id))
+            self._write_subcollection(writer, collection, doc_id, questions)
+            writer.set(collection, doc_id, {**parent_data,
+                                             'questionStorage': SUBCOLLECTION,
+                                             'questionCount': len(questions)})
+        return stats_delta(collection, previous, list(before), parent_data, questions)
+
+    def created_parent(self, parent_data):
+        """The parent document ``queue_create`` writes for ``parent_data``, minus questions and counts."""
+        return {**parent_data, 'questionStorage': SUBCOLLECTION} if self.mode == SUBCOLLECTION else parent_data
+
+    def delete(self, collection, doc_id, parent, questions):
+        """Delete a parent document together with its question documents."""
+        with self.data.batch_writer() as writer:
+            queue_stats(writer, collection, self.queue_delete(writer, collection, doc_id, parent, questions))
+
+    def queue_delete(self, writer, collection, doc_id, parent, questions):
+        """Queue the writes of ``delete`` on ``writer``.
+
+        Like ``replace_questions``, returns the statistics change for the caller to queue.
+        """
+        if is_subcollection(parent):
+            path = questions_path(collection, doc_id)
+            for question in questions:
+                writer.delete(path, question_doc_id(question['id']))
+        writer.delete(collection, doc_id)
+        return stats_delta(collection, parent, questions, None, [])
+
+    def add_question(self, collection, doc_id, parent, questions, question):
+        if not is_subcollection(parent):
+            self._edit_embedded(collection, doc_id, lambda current: current + [question])
+            return
+        change = stats_delta(collection, parent, [], parent, [question])
+        with self.data.batch_writer() as writer:
+            path = questions_path(collection, doc_id)
+            order = max((q.get('order', 0) for q in self.data.list_collection(path)), default=-1) + 1
+            writer.set(path, question_doc_id(question['id']), {**question, 'order': order})
+            writer.update(collection, doc_id, {'questionCount': Increment(1),
+                                               'questionsUpdatedAt': SERVER_TIMESTAMP})
+            queue_stats(writer, collection, change)
+
+    def update_question(self, collection, doc_id, parent, questions, index, question):
+        if not is_subcollection(parent):
+            def edit(current):
+                self._check_unchanged(current, questions, index)
+                return current[:index] + [question] + current[index + 1:]
+            self._edit_embedded(collection, doc_id, edit)
+            return
+        change = stats_delta(collection, parent, [questions[index]], parent, [question])
+        with self.data.batch_writer() as writer:
+            # Merge keeps the stored order field
+            writer.set(questions_path(collection, doc_id), question_doc_id(question['id']),
+                       question, merge=True)
+            writer.update(collection, doc_id, {'questionsUpdatedAt': SERVER_TIMESTAMP})
+            queue_stats(writer, collection, change)
+
+    def delete_question(self, collection, doc_id, parent, questions, index):
+        if not is_subcollection(parent):
+            def edit(current):
+                self._check_unchanged(current, questions, index)
+                return current[:index] + current[index + 1:]
+            self._edit_embedded(collection, doc_id, edit)
+            return
+        change = stats_delta(collection, parent, [questions[index]], parent, [])
+        with self.data.batch_writer() as writer:
+            writer.delete(questions_path(collection, doc_id), question_doc_id(questions[index]['id']))
+            writer.update(collection, doc_id, {'questionCount': Increment(-1),
+                                               'questionsUpdatedAt': SERVER_TIMESTAMP})
+            queue_stats(writer, collection, change)
+
+    def _edit_embedded(self, collection, doc_id, edit):
+        """Rewrite the ``questions`` array of an embedded parent as ``edit(current)``.
+
+        ``current`` comes from a fresh read, and the write is guarded by that
+        read's ``update_time`` like bulk_editor.commit_diff, so an edit made
+        in between raises ConcurrentEditError instead of being overwritten.
+        """
+        parent, update_time = self.data.get_snapshot(collection, doc_id)
+        if parent is None or is_subcollection(parent):
+            raise ConcurrentEditError(f"{collection}/{doc_id} was deleted or migrated")
+        current = parent.get('questions', [])
+        questions = edit(current)
+        try:
+            with self.data.batch_writer() as writer:
+                writer.update(collection, doc_id, {'questions': questions}, last_update_time=update_time)
+                queue_stats(writer, collection, stats_delta(collection, parent, current, parent, questions))
+        except FailedPrecondition as e:
+            self.data.invalidate(collection, doc_id)
+            raise ConcurrentEditError(str(e)) from e
+
+    @staticmethod
+    def _check_unchanged(current, loaded, index):
+        if index >= len(current) or current[index] != loaded[index]:
+            raise ConcurrentEditError(f"Question {index + 1} changed since it was loaded")
+
+    def replace_questions(self, writer, collection, doc_id, parent, questions, current=None):
+        """Queue writes on ``writer`` that make ``questions`` the full question list.
+
+        ``current`` is the already-listed question subcollection, if any.
+        Returns the change in bank statistics without queuing it, so bulk
+        callers can combine many replacements into one summary write.
+        """
+        if not is_subcollection(parent):
+            writer.update(collection, doc_id, {'questions': questions})
+            return stats_delta(collection, parent, parent.get('questions', []), parent, questions)
+        keep = {question_doc_id(q['id']) for q in questions}
+        path = questions_path(collection, doc_id)
+        if current is None:
+            current = self.data.list_collection(path)
+        for old in current:
+            if old['id'] not in keep:
+                writer.delete(path, old['id'])
+        self._write_subcollection(writer, collection, doc_id, questions)
+        writer.update(collection, doc_id, {'questionCount': len(questions),
+                                           'questionsUpdatedAt': SERVER_TIMESTAMP})
+        return stats_delta(collection, parent, current, parent, questions)
+
+    def _write_subcollection(self, writer, collection, doc_id, questions):
+        path = questions_path(collection, doc_id)
+        for order, question in enumerate(questions):
+            writer.set(path, question_doc_id(question['id']), {**question, 'order': order})
+
+
+def unique_question_ids(questions):
+    """Copy of ``questions`` with duplicate IDs suffixed so each maps to its own document."""
+    seen = set()
+    result = []
+    for question in questions:
+        base = question_doc_id(question.get('id') or 'q')
+        qid, n = base, 2
+        while qid in seen:
+            qid, n = f'{base}_{n}', n + 1
+        seen.add(qid)
+        result.append({**question, 'id': qid})
+    return result
+
+
+def to_subcollection(store, writer, collection, parent):
+    """Queue the conversion of an embedded ``parent`` to the subcollection layout.
+
+    Question documents are queued before the parent flips its marker, and the
+    writer commits in order, so readers never see a half-migrated document.
+    """
+    questions = unique_question_ids(parent.get('questions', []))
+    store._write_subcollection(writer, collection, parent['id'], questions)
+    writer.update(collection, parent['id'], {'questions': DELETE_FIELD,
+                                             'questionStorage': SUBCOLLECTION,
+                                             'questionCount': len(questions)})
+
+
+def to_embedded(store, writer, collection, parent):
+    """Queue the conversion of a subcollection ``parent`` back to an embedded array.
+
+    The parent is rewritten first so readers switch to the array before the
+    question documents are deleted.
+    """
+    questions = store.load(collection, parent['id'], parent=parent)
+    writer.update(collection, parent['id'], {'questions': questions,
+                                             'questionStorage': DELETE_FIELD})
+    path = questions_path(collection, parent['id'])
+    for question in questions:
+        writer.delete(path, question_doc_id(question['id']))
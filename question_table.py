@@ -0,0 +1,55 @@
+"""Paginated, filterable table view of a document's questions.
+
+Questions become one DataFrame row each; filters are column-wise ``isin``
+masks and only the visible page is handed to Streamlit, so the page costs
+the same number of elements however many questions a document has.
+"""
+import math
+
+import pandas as pd
+
+TABLE_COLUMNS = ['#', 'Question', 'Options', 'Correct', 'Concept', 'Difficulty', 'Section']
+FILTER_COLUMNS = ['Concept', 'Difficulty', 'Section']
+
+
+def display_frame(questions):
+    rows = []
+    for position, q in enumerate(questions, 1):
+        options = [str(o) for o in q.get('options', [])]
+        correct = q.get('correctOptionIndex')
+        rows.append((
+            position,
+            q.get('text', ''),
+            ' | '.join(options),
+            options[correct] if isinstance(correct, int) and 0 <= correct < len(options) else '',
+            q.get('concept', ''),
+            q.get('difficulty', ''),
+            q.get('section', ''),
+        ))
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
+
+
+def filter_options(frame):
+    """Distinct non-empty values of each filter column, sorted."""
+    return {column: sorted(v for v in frame[column].dropna().astype(str).unique() if v)
+            for column in FILTER_COLUMNS}
+
+
+def filter_frame(frame, selected):
+    """Rows matching every non-empty selection in ``selected`` (column -> values)."""
+    mask = pd.Series(True, index=frame.index)
+    for column, values in selected.items():
+        if values:
+            mask &= frame[column].astype(str).isin(values)
+    return frame[mask]
+
+
+def page_count(rows, page_size):
+    return max(1, math.ceil(rows / page_size))
+
+
+def page_slice(frame, page, page_size):
+    """Rows of 1-based ``page``; out-of-range pages are clamped."""
+    page = min(max(page, 1), page_count(len(frame), page_size))
+    start = (page - 1) * page_size
+    return frame.iloc[start:start + page_size]
@@ -0,0 +1,187 @@
+"""Auto-publishing and archiving of scheduled tests.
+
+Usage:
+    python scheduler.py             # archive expired tests, publish due drafts
+    python scheduler.py --dry-run
+
+Tests whose ``endTime`` has passed are moved, questions included and in
+their own storage layout, to ``archived_tests`` and removed from
+``upcoming_tests``, so the hot collection and the "⏰ Upcoming Tests"
+listing only hold active and future tests. Drafts carry a ``publishAt`` time that is cleared when they are
+published, so ``publishAt <= now`` finds exactly the drafts that are due.
+
+Both lookups are range queries on a single field, served by Firestore's
+automatic single-field indexes: a run reads only the tests it changes
+(plus one read per empty query). Published drafts are committed in
+batches and each archived test in a batch of its own. The clock is
+injected, so runs can be replayed against FakeFirestore (see the example in
+``publish_due``, runnable with ``python -m doctest scheduler.py``).
+"""
+import argparse
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from google.cloud.firestore import DELETE_FIELD
+
+from bank_stats import queue_pending, stats_delta
+from data_layer import DataLayer
+from firebase_client import client_from_environment
+from question_store import SUBCOLLECTION, QuestionStore, is_subcollection, storage_mode
+
+TESTS_COLLECTION = 'upcoming_tests'
+ARCHIVE_COLLECTION = 'archived_tests'
+# Minimum seconds between runs triggered by page visits
+DEFAULT_INTERVAL = 60
+DEFAULT_PAGE_SIZE = 200
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+class SchedulerRun:
+    def __init__(self, now):
+        self.now = now
+        self.published = []
+        self.archived = []
+        self.failed = []  # (test ID, exception)
+
+    def __bool__(self):
+        return bool(self.published or self.archived or self.failed)
+
+    def summary(self):
+        failed = f", {len(self.failed)} failed to archive" if self.failed else ""
+        return f"{len(self.archived)} archived, {len(self.published)} published{failed}"
+
+
+class Scheduler:
+    """Publishes due drafts and archives expired tests of ``store``.
+
+    ``clock`` returns the current timezone-aware time. ``run_if_due()`` is
+    cheap enough to call on every visit to the page: it runs at most once
+    per ``interval`` seconds.
+    """
+
+    def __init__(self, store, clock=utc_now, interval=DEFAULT_INTERVAL, page_size=DEFAULT_PAGE_SIZE):
+        self.store = store
+        self.clock = clock
+        self.interval = interval
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._last_run = None
+
+    def run_if_due(self):
+        """Run unless the last run was less than ``interval`` seconds ago; returns the run or None."""
+        now = self.clock()
+        with self._lock:
+            if self._last_run is not None and (now - self._last_run).total_seconds() < self.interval:
+                return None
+            self._last_run = now
+        return self.run(now)
+
+    def run(self, now=None, dry_run=False):
+        result = SchedulerRun(now or self.clock())
+        # Archive first, so drafts that expired unpublished are not published on the way out
+        self.archive_expired(result, dry_run=dry_run)
+        self.publish_due(result, dry_run=dry_run)
+        return result
+
+    def _due(self, field, op, result, dry_run):
+        """Pages of tests matching ``field op now``, until none are left.
+
+        Tests already yielded are dropped, so a test whose write failed
+        comes back in the next page only to be skipped.
+        """
+        data = self.store.data
+        seen = set()
+        while True:
+            page = data.query(TESTS_COLLECTION, [(field, op, result.now)], order_field=field,
+                              limit=self.page_size)
+            fresh = [test for test in page if test['id'] not in seen]
+            seen.update(test['id'] for test in fresh)
+            if fresh:
+                yield fresh
+            # A dry run changes nothing, so the same page would come back
+            if dry_run or len(page) < self.page_size or not fresh:
+                return
+
+    def archive_expired(self, result, dry_run=False):
+        """Move expired tests to ``archived_tests``, each in its own batched write.
+
+        Questions are written through ``QuestionStore.queue_create`` in the
+        test's own layout, so a large test keeps one document per question
+        instead of growing past Firestore's 1 MiB document limit. A test
+        that fails is recorded in ``result.failed`` and stays where it is
+        for the next run.
+        """
+        data = self.store.data
+        for expired in self._due('endTime', '<', result, dry_run):
+            questions = self.store.load_many(TESTS_COLLECTION, {test['id']: test for test in expired})
+            for test in expired:
+                archived = {k: v for k, v in test.items() if k not in ('id', 'questions', 'questionStorage')}
+                archived.update(questionCount=len(questions[test['id']]), archivedAt=result.now)
+                archive = QuestionStore(data, mode=SUBCOLLECTION if is_subcollection(test) else self.store.mode)
+                change = Counter()
+                try:
+                    with data.batch_writer(dry_run=dry_run,
+                                           before_flush=queue_pending(TESTS_COLLECTION, change)) as writer:
+                        # Queued before the delete, so an interrupted test is never lost
+                        archive.queue_create(writer, ARCHIVE_COLLECTION, test['id'], archived, questions[test['id']])
+                        change.update(self.store.queue_delete(writer, TESTS_COLLECTION, test['id'], test,
+                                                              questions[test['id']]))
+                except Exception as e:  # the other tests go on; this one is retried next run
+                    result.failed.append((test['id'], e))
+                    continue
+                result.archived.append(test['id'])
+
+    def publish_due(self, result, dry_run=False):
+        """Publish the drafts whose ``publishAt`` has passed; drafts without one are never touched.
+
+        >>> from fake_firestore import FakeFirestore
+        >>> from datetime import timedelta
+        >>> now = utc_now()
+        >>> store = QuestionStore(DataLayer(FakeFirestore(), ttl=0))
+        >>> test = {'title': 'T', 'endTime': now + timedelta(days=1), 'isPublished': False}
+        >>> store.create(TESTS_COLLECTION, 'manual', test, [])
+        'manual'
+        >>> store.create(TESTS_COLLECTION, 'timed', {**test, 'publishAt': now + timedelta(hours=1)}, [])
+        'timed'
+        >>> Scheduler(store, clock=lambda: now + timedelta(hours=2)).run().published
+        ['timed']
+        >>> store.data.get_document(TESTS_COLLECTION, 'manual')['isPublished']
+        False
+        """
+        data = self.store.data
+        for due in self._due('publishAt', '<=', result, dry_run):
+            change = Counter()
+            with data.batch_writer(dry_run=dry_run, before_flush=queue_pending(TESTS_COLLECTION, change)) as writer:
+                for test in due:
+                    writer.update(TESTS_COLLECTION, test['id'], {'isPublished': True, 'publishAt': DELETE_FIELD,
+                                                                 'publishedAt': result.now})
+                    change.update(stats_delta(TESTS_COLLECTION, test, [], {**test, 'isPublished': True}, []))
+                    result.published.append(test['id'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args(argv)
+
+    # No caching: each page must reflect the previous commit
+    store = QuestionStore(DataLayer(client_from_environment(), ttl=0), mode=storage_mode())
+    result = Scheduler(store, page_size=args.page_size).run(dry_run=args.dry_run)
+    for test_id in result.archived:
+        print(f"{TESTS_COLLECTION}/{test_id}: {'would be ' if args.dry_run else ''}archived")
+    for test_id in result.published:
+        print(f"{TESTS_COLLECTION}/{test_id}: {'would be ' if args.dry_run else ''}published")
+    for test_id, error in result.failed:
+        print(f"{TESTS_COLLECTION}/{test_id}: archiving failed: {error}")
+    print(result.summary())
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
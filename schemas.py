@@ -0,0 +1,98 @@
+"""Shapes of the documents the panel writes.
+
+The pages and the admin CLI build assessments, scheduled tests, questions and
+job postings through these helpers, so documents look the same whichever
+wrote them.
+"""
+from datetime import datetime
+
+ANSWER_LETTERS = ['A', 'B', 'C', 'D']
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+ASSESSMENT_CATEGORIES = ["Technical", "Aptitude", "Reasoning", "Verbal"]
+TEST_CATEGORIES = ["Technical", "General"]
+JOB_TYPES = ["Full-time", "Part-time", "Contract", "Internship"]
+WORK_MODES = ["Remote", "On-site", "Hybrid"]
+
+
+def correct_index(correct):
+    """Option index from a letter (``'B'``) or an index (``1``)."""
+    if isinstance(correct, str) and not correct.strip().isdigit():
+        return ANSWER_LETTERS.index(correct.strip().upper())
+    return int(correct)
+
+
+def question(question_id, text, options, correct, concept, difficulty, section):
+    return {
+        'id': question_id,
+        'text': text,
+        'options': list(options),
+        'correctOptionIndex': correct_index(correct),
+        'concept': concept,
+        'difficulty': difficulty,
+        'section': section,
+    }
+
+
+def question_errors(q):
+    """Reasons ``q`` cannot be stored, in the words the upload page uses."""
+    errors = []
+    if not str(q.get('text') or '').strip():
+        errors.append("question_text is empty")
+    options = q.get('options') or []
+    if len(options) != 4 or any(not str(o).strip() for o in options):
+        errors.append("one or more options are empty")
+    if q.get('correctOptionIndex') not in range(4):
+        errors.append("correct_answer must be A, B, C or D")
+    if q.get('difficulty') not in DIFFICULTIES:
+        errors.append("difficulty must be Easy, Medium or Hard")
+    return errors
+
+
+def assessment(title, category, duration_minutes):
+    return {'title': title, 'category': category, 'durationMinutes': int(duration_minutes)}
+
+
+def upcoming_question_id(position, now=None):
+    """ID of the ``position``-th (1-based) question of a test scheduled at ``now``."""
+    return f'uq_{position}_{(now or datetime.now()).strftime("%Y%m%d%H%M")}'
+
+
+def upcoming_test(title, category, description, start, end, duration_minutes, topics, published,
+                  publish_at=None):
+    """A scheduled test; ``topics`` is a list or the comma-separated form field.
+
+    Drafts with a ``publish_at`` time are published by the scheduler then;
+    drafts without one stay drafts until published by hand.
+    """
+    if isinstance(topics, str):
+        topics = [t.strip() for t in topics.split(",") if t.strip()]
+    test = {
+        "title": title,
+        "category": category,
+        "description": description,
+        "startTime": start,
+        "endTime": end,
+        "durationMinutes": int(duration_minutes),
+        "topics": list(topics),
+        "isPublished": published,
+    }
+    if not published and publish_at is not None:
+        test["publishAt"] = publish_at
+    return test
+
+
+def job(title, company, location, job_type, mode, link, description, posted_date=None, now=None):
+    """A job posting; ``postedDate`` defaults to the day of ``now``, which also orders the board."""
+    # Timezone-aware, like the test times, so Firestore stores the actual instant
+    now = now or datetime.now().astimezone()
+    return {
+        "title": title,
+        "company": company,
+        "location": location,
+        "type": job_type,
+        "mode": mode,
+        "link": link,
+        "description": description,
+        "postedDate": posted_date or now.strftime("%d %b %Y"),
+        "timestamp": now,
+    }
@@ -0,0 +1,181 @@
+"""In-process inverted index over every question in the bank.
+
+Question text, options and concept are tokenized into a postings map
+(token -> question -> field-weighted, BM25-saturated term frequency). Query terms match tokens
+by prefix through a sorted vocabulary, all terms must match, and results
+are ranked with a BM25-style score. The index is a BankView, so writes
+made through the DataLayer re-index only the documents they touched.
+"""
+import bisect
+import heapq
+import math
+import re
+from collections import defaultdict
+
+from bank import BankView
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to what which with".split())
+# Matches in the question text count more than matches in options or concept
+FIELD_WEIGHTS = {'text': 3.0, 'concept': 2.0, 'options': 1.0}
+# Prefixes shorter than this only match whole tokens
+MIN_PREFIX = 2
+MAX_PREFIX_EXPANSIONS = 64
+# Whole-token matches outrank prefix completions
+PREFIX_BOOST = 0.7
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+class SearchResult:
+    def __init__(self, score, entry):
+        self.collection, self.parent_id = entry['parent']
+        self.position = entry['position']
+        self.score = score
+        self.parent_title = entry['parent_title']
+        self.question = entry['question']
+
+
+class SearchIndex(BankView):
+    def __init__(self, store, max_age=None):
+        super().__init__(store, max_age=max_age)
+        self._reset()
+
+    def _reset(self):
+        # Questions are keyed by small ints, which hash far faster than tuples
+        self._postings = defaultdict(dict)  # token -> {question key: term weight}
+        self._vocab = []  # sorted tokens, for prefix lookup
+        self._entries = {}  # question key -> display info and length
+        self._next_key = 0
+        self._by_parent = defaultdict(list)
+        self._total_length = 0.0
+        # During the initial scan new tokens are appended and sorted once at the end
+        self._building = True
+
+    def _finish_build(self):
+        self._vocab.sort()
+        self._building = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Index maintenance
+
+    def _add(self, key, parent, questions):
+        collection, parent_id = key
+        title = parent.get('title', parent_id)
+        postings_map = self._postings
+        for position, question in enumerate(questions, 1):
+            qkey = self._next_key
+            self._next_key += 1
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                value = question.get(field, '')
+                if isinstance(value, list):
+                    value = ' '.join(map(str, value))
+                for token in tokenize(value):
+                    weights[token] = weights.get(token, 0.0) + weight
+            length = sum(weights.values())
+            self._total_length += length
+            avg_length = self._total_length / (len(self._entries) + 1)
+            # BM25 term saturation is folded in at index time (against the
+            # running average length) so queries only multiply by IDF
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            for token, tf in weights.items():
+                postings = postings_map[token]
+                if not postings:
+                    if self._building:
+                        self._vocab.append(token)
+                    else:
+                        bisect.insort(self._vocab, token)
+                postings[qkey] = tf * (BM25_K1 + 1) / (tf + norm)
+            self._entries[qkey] = {'parent': key, 'position': position, 'parent_title': title,
+                                   'question': question, 'length': length, 'tokens': list(weights)}
+            self._by_parent[key].append(qkey)
+
+    def _remove(self, key):
+        for qkey in self._by_parent.pop(key, []):
+            entry = self._entries.pop(qkey, None)
+            if entry is None:
+                continue
+            self._total_length -= entry['length']
+            for token in entry['tokens']:
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(qkey, None)
+                if not postings:
+                    del self._postings[token]
+                    i = bisect.bisect_left(self._vocab, token)
+                    if i < len(self._vocab) and self._vocab[i] == token:
+                        del self._vocab[i]
+
+    # Queries
+
+    def _expand(self, term):
+        if len(term) < MIN_PREFIX:
+            return [term] if term in self._postings else []
+        start = bisect.bisect_left(self._vocab, term)
+        matches = []
+        for token in self._vocab[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, query, limit=50, collections=None):
+        """Rank questions matching every term of ``query`` (each term as a prefix)."""
+        self.refresh()
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            n = len(self._entries)
+            expanded = [self._expand(term) for term in terms]
+            if not all(expanded):
+                return []
+
+            # Candidates must match every term; intersect from the most selective one
+            key_sets = []
+            for tokens in expanded:
+                keys = self._postings[tokens[0]].keys()
+                if len(tokens) > 1:
+                    keys = set().union(*(self._postings[t].keys() for t in tokens))
+                key_sets.append(keys)
+            key_sets.sort(key=len)
+            candidates = set(key_sets[0])
+            for keys in key_sets[1:]:
+                candidates &= keys
+            if collections:
+                entries = self._entries
+                candidates = {k for k in candidates if entries[k]['parent'][0] in collections}
+
+            total = dict.fromkeys(candidates, 0.0)
+            for term, tokens in zip(terms, expanded):
+                if len(tokens) == 1:
+                    postings = self._postings[tokens[0]]
+                    factor = self._idf(n, postings) * (1.0 if tokens[0] == term else PREFIX_BOOST)
+                    for k in candidates:
+                        total[k] += factor * postings[k]
+                    continue
+                # A prefix counts once per question, through its best completion
+                best = {}
+                for token in tokens:
+                    postings = self._postings[token]
+                    factor = self._idf(n, postings) * (1.0 if token == term else PREFIX_BOOST)
+                    for k in candidates.intersection(postings):
+                        score = factor * postings[k]
+                        if score > best.get(k, 0.0):
+                            best[k] = score
+                for k, score in best.items():
+                    total[k] += score
+            ranked = heapq.nlargest(limit, total, key=total.get)
+            return [SearchResult(total[k], self._entries[k]) for k in ranked]
+
+    @staticmethod
+    def _idf(n, postings):
+        return math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
@@ -0,0 +1,80 @@
+"""Cold-start timing and background warm-up.
+
+The first run in a new process builds the Firestore client and the shared
+caches. ``StartupReport`` times those phases. ``warm_up`` opens the
+connection on a background thread while the first page renders, and
+``preload`` imports the heavy page-specific modules once it has rendered,
+so later page switches find them ready without slowing the first page.
+"""
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Only the pages that need them import these; preloading loads them after the first render
+WARM_MODULES = ('pandas',)
+# A one-document read per collection opens the channel and fetches an auth token
+WARM_COLLECTIONS = ('assessments',)
+
+
+class StartupReport:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started = clock()
+        self.phases = {}
+        self.first_render_ms = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.record(name, (self._clock() - started) * 1000)
+
+    def record(self, name, ms):
+        with self._lock:
+            self.phases[name] = round(ms, 2)
+
+    def rendered(self):
+        """Mark the end of the first run; returns True only the first time."""
+        with self._lock:
+            if self.first_render_ms is not None:
+                return False
+            self.first_render_ms = round((self._clock() - self.started) * 1000, 2)
+            return True
+
+    def as_dict(self):
+        with self._lock:
+            return {'first_render_ms': self.first_render_ms, 'phases': dict(self.phases),
+                    'modules': {m: m in sys.modules for m in WARM_MODULES}}
+
+
+def _background(name, target):
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up(db, report, collections=WARM_COLLECTIONS):
+    """Open the Firestore connection on a daemon thread."""
+    def run():
+        with report.phase('warm_up'):
+            for collection in collections:
+                try:
+                    db.collection(collection).limit(1).get()
+                except Exception:
+                    # Warm-up is best effort; the page's own read reports real errors
+                    pass
+    return _background('intellitrain-warm-up', run)
+
+
+def preload(report, modules=WARM_MODULES):
+    """Import ``modules`` on a daemon thread (call after the first render)."""
+    def run():
+        with report.phase('preload'):
+            for module in modules:
+                importlib.import_module(module)
+    return _background('intellitrain-preload', run)
@@ -0,0 +1,401 @@
+"""Per-rerun Firestore instrumentation.
+
+``TracedClient`` wraps the Firestore client and times every call that
+reaches the server: query streams, document gets, ``get_all``, aggregation
+queries, single writes and batch commits. Each call becomes a span counted
+against its collection and attributed to the rerun that made it (page and
+triggering action, set with ``Tracer.begin_rerun``). Time spent turning
+snapshots into dicts is tracked separately as decoding. Spans and rerun
+summaries can also be appended to a JSON-lines file.
+
+Calls made outside a rerun (listener callbacks, background threads) are
+logged under the ``background`` page.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+_current_rerun = contextvars.ContextVar('intellitrain_rerun', default=None)
+
+BACKGROUND = 'background'
+
+
+def trace_log_path():
+    return os.environ.get("INTELLITRAIN_TRACE_LOG") or None
+
+
+def collection_group(path):
+    """``assessments/4/questions`` -> ``assessments/*/questions``."""
+    parts = path.split('/')
+    return '/'.join('*' if i % 2 else part for i, part in enumerate(parts))
+
+
+class RerunCost:
+    """Firestore costs accumulated by one rerun, broken down by collection."""
+
+    def __init__(self, rerun, session, page, action, started):
+        self.rerun = rerun
+        self.session = session
+        self.page = page
+        self.action = action
+        self.started = started
+        self.elapsed_ms = None
+        self.decode_ms = 0.0
+        self.by_collection = {}
+        self._lock = threading.Lock()
+
+    def add(self, collection, reads=0, writes=0, deletes=0, ms=0.0):
+        with self._lock:
+            totals = self.by_collection.setdefault(
+                collection, {'calls': 0, 'reads': 0, 'writes': 0, 'deletes': 0, 'ms': 0.0})
+            totals['calls'] += 1
+            totals['reads'] += reads
+            totals['writes'] += writes
+            totals['deletes'] += deletes
+            totals['ms'] += ms
+
+    def add_decode(self, ms):
+        # Decoding may happen on fetch-pool threads too
+        with self._lock:
+            self.decode_ms += ms
+
+    def total(self, field):
+        return sum(t[field] for t in self.by_collection.values())
+
+    def as_dict(self):
+        return {
+            'rerun': self.rerun, 'session': self.session, 'page': self.page, 'action': self.action,
+            'elapsed_ms': self.elapsed_ms, 'firestore_ms': round(self.total('ms'), 2),
+            'decode_ms': round(self.decode_ms, 2), 'calls': self.total('calls'),
+            'reads': self.total('reads'), 'writes': self.total('writes'), 'deletes': self.total('deletes'),
+            'collections': {c: {**t, 'ms': round(t['ms'], 2)} for c, t in self.by_collection.items()},
+        }
+
+
+class Tracer:
+    def __init__(self, log_path=None, clock=time.perf_counter):
+        self.log_path = log_path
+        self._clock = clock
+        self._reruns = 0
+        self._last_interrupted = {}
+        self._lock = threading.Lock()
+        self._log = open(log_path, 'a', buffering=1) if log_path else None
+
+    # Rerun context
+
+    def begin_rerun(self, session, page, action):
+        """Start attributing calls on this thread to a new rerun.
+
+        A rerun that never reached ``end_rerun`` (``st.rerun()`` or
+        ``st.stop()``) is closed here, and a rerun following ``st.rerun()``
+        is attributed to the action that triggered it.
+        """
+        previous = _current_rerun.get()
+        if previous is not None and previous.elapsed_ms is None and previous.session == session:
+            self.end_rerun()
+            self._last_interrupted[session] = previous
+            action = f"st.rerun() after {previous.action}"
+        else:
+            self._last_interrupted.pop(session, None)
+        with self._lock:
+            self._reruns += 1
+            rerun = self._reruns
+        cost = RerunCost(rerun, session, page, action, self._clock())
+        _current_rerun.set(cost)
+        return cost
+
+    def end_rerun(self):
+        """Close the current rerun, log its summary and return it (None outside a rerun)."""
+        cost = _current_rerun.get()
+        if cost is None:
+            return None
+        if cost.elapsed_ms is None:
+            cost.elapsed_ms = round((self._clock() - cost.started) * 1000, 2)
+            self._write({'type': 'rerun', **cost.as_dict()})
+        return cost
+
+    def interrupted(self, session):
+        """The rerun of ``session`` cut short right before the current one, if any."""
+        return self._last_interrupted.get(session)
+
+    def current(self):
+        return _current_rerun.get()
+
+    # Recording
+
+    def record(self, op, collection, started, reads=0, writes=0, deletes=0, docs=None, error=None):
+        ms = (self._clock() - started) * 1000
+        cost = _current_rerun.get()
+        if cost is not None:
+            cost.add(collection, reads=reads, writes=writes, deletes=deletes, ms=ms)
+        if self._log is not None:
+            self._write({
+                'type': 'span', 'op': op, 'collection': collection, 'ms': round(ms, 3),
+                'reads': reads, 'writes': writes, 'deletes': deletes, 'docs': docs, 'error': error,
+                'rerun': cost.rerun if cost else None, 'session': cost.session if cost else None,
+                'page': cost.page if cost else BACKGROUND, 'action': cost.action if cost else None,
+            })
+
+    def record_decode(self, started):
+        cost = _current_rerun.get()
+        if cost is not None:
+            cost.add_decode((self._clock() - started) * 1000)
+
+    def event(self, kind, **fields):
+        """Log a non-span record, e.g. the startup report."""
+        self._write({'type': kind, **fields})
+
+    def now(self):
+        return self._clock()
+
+    def _write(self, record):
+        if self._log is None:
+            return
+        record['ts'] = datetime.now(timezone.utc).isoformat()
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._log.write(line + '\n')
+
+
+# Client wrappers
+
+def _raw(value):
+    if isinstance(value, _Traced):
+        return value._target
+    if isinstance(value, list):
+        return [_raw(v) for v in value]
+    return value
+
+
+class _Traced:
+    def __init__(self, target, tracer):
+        self._target = target
+        self._tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class TracedSnapshot(_Traced):
+    def to_dict(self):
+        started = self._tracer.now()
+        try:
+            return self._target.to_dict()
+        finally:
+            self._tracer.record_decode(started)
+
+
+class TracedClient(_Traced):
+    """Drop-in wrapper for ``google.cloud.firestore.Client`` that reports to ``tracer``."""
+
+    def collection(self, *path):
+        return TracedCollection(self._target.collection(*path), self._tracer, '/'.join(path))
+
+    def document(self, *path):
+        full = '/'.join(path)
+        return TracedDocument(self._target.document(*path), self._tracer, full.rsplit('/', 1)[0])
+
+    def batch(self):
+        return TracedBatch(self._target.batch(), self._tracer)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        groups = {r._path for r in references if isinstance(r, TracedDocument)}
+        collection = collection_group(groups.pop()) if len(groups) == 1 else 'mixed'
+        started = self._tracer.now()
+        docs = 0
+        error = None
+        try:
+            for snapshot in self._target.get_all(_raw(references), field_paths=field_paths,
+                                                 transaction=transaction):
+                docs += 1
+                yield TracedSnapshot(snapshot, self._tracer)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._tracer.record('get_all', collection, started, reads=docs, docs=docs, error=error)
+
+
+class TracedQuery(_Traced):
+    def __init__(self, target, tracer, path):
+        super().__init__(target, tracer)
+        self._path = path
+
+    def _wrap(self, query):
+        return TracedQuery(query, self._tracer, self._path)
+
+    def where(self, *args, **kwargs):
+        return self._wrap(self._target.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._wrap(self._target.order_by(*args, **kwargs))
+
+    def select(self, field_paths):
+        return self._wrap(self._target.select(field_paths))
+
+    def limit(self, count):
+        return self._wrap(self._target.limit(count))
+
+    def offset(self, count):
+        return self._wrap(self._target.offset(count))
+
+    def start_at(self, values):
+        return self._wrap(self._target.start_at(_raw(values)))
+
+    def start_after(self, values):
+        return self._wrap(self._target.start_after(_raw(values)))
+
+    def end_at(self, values):
+        return self._wrap(self._target.end_at(_raw(values)))
+
+    def end_before(self, values):
+        return self._wrap(self._target.end_before(_raw(values)))
+
+    def stream(self, transaction=None):
+        started = self._tracer.now()
+        docs = 0
+        error = None
+        try:
+            for snapshot in self._target.stream(transaction=transaction):
+                docs += 1
+                yield TracedSnapshot(snapshot, self._tracer)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            # An empty result is still billed as one read
+            self._tracer.record('query', collection_group(self._path), started, reads=max(docs, 1),
+                                docs=docs, error=error)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def count(self, alias=None):
+        return TracedAggregation(self._target.count(alias=alias), self._tracer, self._path)
+
+    def on_snapshot(self, callback):
+        tracer, collection = self._tracer, collection_group(self._path)
+
+        def traced(docs, changes, read_time):
+            # Each delivered change is billed as a read
+            tracer.record('listen', collection, tracer.now(), reads=len(changes), docs=len(changes))
+            return callback(docs, changes, read_time)
+        return self._target.on_snapshot(traced)
+
+
+class TracedAggregation(_Traced):
+    def __init__(self, target, tracer, path):
+        super().__init__(target, tracer)
+        self._path = path
+
+    def get(self, *args, **kwargs):
+        started = self._tracer.now()
+        error = None
+        try:
+            return self._target.get(*args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._tracer.record('count', collection_group(self._path), started, reads=1, error=error)
+
+
+class TracedCollection(TracedQuery):
+    def document(self, document_id=None):
+        return TracedDocument(self._target.document(document_id), self._tracer, self._path)
+
+    def add(self, document_data, document_id=None):
+        started = self._tracer.now()
+        error = None
+        try:
+            return self._target.add(document_data, document_id=document_id)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._tracer.record('add', collection_group(self._path), started, writes=1, error=error)
+
+
+class TracedDocument(_Traced):
+    def __init__(self, target, tracer, path):
+        super().__init__(target, tracer)
+        self._path = path  # the collection path
+
+    def collection(self, name):
+        return TracedCollection(self._target.collection(name), self._tracer, f"{self._path}/{self.id}/{name}")
+
+    def _call(self, op, method, *args, reads=0, writes=0, deletes=0, **kwargs):
+        started = self._tracer.now()
+        error = None
+        try:
+            return getattr(self._target, method)(*args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._tracer.record(op, collection_group(self._path), started, reads=reads, writes=writes,
+                                deletes=deletes, error=error)
+
+    def get(self, *args, **kwargs):
+        return TracedSnapshot(self._call('get', 'get', *args, reads=1, **kwargs), self._tracer)
+
+    def set(self, *args, **kwargs):
+        return self._call('set', 'set', *args, writes=1, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._call('create', 'create', *args, writes=1, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._call('update', 'update', *args, writes=1, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', 'delete', *args, deletes=1, **kwargs)
+
+
+class TracedBatch(_Traced):
+    def __init__(self, target, tracer):
+        super().__init__(target, tracer)
+        self._counts = {}  # collection -> [writes, deletes]
+
+    def _queue(self, reference, deleted=False):
+        path = reference._path if isinstance(reference, TracedDocument) else 'unknown'
+        counts = self._counts.setdefault(collection_group(path), [0, 0])
+        counts[1 if deleted else 0] += 1
+
+    def set(self, reference, *args, **kwargs):
+        self._queue(reference)
+        return self._target.set(_raw(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        self._queue(reference)
+        return self._target.create(_raw(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._queue(reference)
+        return self._target.update(_raw(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._queue(reference, deleted=True)
+        return self._target.delete(_raw(reference), *args, **kwargs)
+
+    def __len__(self):
+        return len(self._target)
+
+    def commit(self, *args, **kwargs):
+        started = self._tracer.now()
+        error = None
+        try:
+            return self._target.commit(*args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            # One span per collection in the batch; the commit time goes to the first
+            for i, (collection, (writes, deletes)) in enumerate(self._counts.items()):
+                self._tracer.record('commit', collection, started if i == 0 else self._tracer.now(),
+                                    writes=writes, deletes=deletes, error=error)
+            self._counts = {}